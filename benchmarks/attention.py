@@ -0,0 +1,106 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import contextlib
+import io
+import time
+
+import nobuco
+from nobuco import ChannelOrder
+from nobuco.commons import CONVERTER_DICT
+from nobuco.converters.node_converter import converter_unregister
+
+import numpy as np
+import tensorflow as tf
+
+import torch
+from torch import nn
+
+
+class EncoderBlock(nn.Module):
+    """Pre-norm transformer encoder block, as in ViT (with ReLU in place of GELU)"""
+
+    def __init__(self, dim, num_heads, mlp_ratio=4):
+        super().__init__()
+        self.norm1 = nn.LayerNorm(dim)
+        self.attn = nn.MultiheadAttention(dim, num_heads)
+        self.norm2 = nn.LayerNorm(dim)
+        self.mlp = nn.Sequential(nn.Linear(dim, dim * mlp_ratio), nn.ReLU(), nn.Linear(dim * mlp_ratio, dim))
+
+    def forward(self, x):
+        y = self.norm1(x)
+        x = x + self.attn(y, y, y, need_weights=False)[0]
+        return x + self.mlp(self.norm2(x))
+
+
+class Encoder(nn.Module):
+    def __init__(self, dim=192, num_heads=3, depth=4):
+        super().__init__()
+        self.blocks = nn.Sequential(*[EncoderBlock(dim, num_heads) for _ in range(depth)])
+
+    def forward(self, x):
+        return self.blocks(x)
+
+
+def converter_unflatten(self, dim, sizes):
+    """Lets the traced attention ops convert, nobuco has no `unflatten` converter otherwise"""
+    def func(self, dim, sizes):
+        shape = list(self.shape)
+        dim = dim % len(shape)
+        return tf.reshape(self, shape[:dim] + list(sizes) + shape[dim + 1:])
+    return func
+
+
+def convert(pytorch_module, input):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return nobuco.pytorch_to_keras(
+            pytorch_module,
+            args=[input],
+            inputs_channel_order=ChannelOrder.PYTORCH,
+            outputs_channel_order=ChannelOrder.PYTORCH,
+        )
+
+
+def benchmark_tf(keras_model, x, n_runs=50):
+    func = tf.function(keras_model)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(keras_model, x, n_runs=50):
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    model_content = converter.convert()
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x)
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    latency = (time.perf_counter() - start) / n_runs * 1000
+    return latency, len(interpreter._get_ops_details()), len(model_content) / 1024
+
+
+# (seq, batch, embed), ViT-Ti/16 at 224x224
+pytorch_module = Encoder().eval()
+input = torch.normal(0, 1, size=(197, 1, 192))
+x = input.numpy()
+with torch.no_grad():
+    expected = pytorch_module(input).numpy()
+
+keras_model = convert(pytorch_module, input)
+
+converter_MultiheadAttention = CONVERTER_DICT.pop(nn.MultiheadAttention)
+nobuco.converter(torch.Tensor.unflatten, channel_ordering_strategy=nobuco.ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)(converter_unflatten)
+keras_model_traced = convert(pytorch_module, input)
+converter_unregister(torch.Tensor.unflatten)
+CONVERTER_DICT[nn.MultiheadAttention] = converter_MultiheadAttention
+
+print(f'{"Encoder, 4 blocks":<20} {"layers":>7} {"max diff":>9} {"TF, ms":>8} {"TFLite, ms":>11} {"TFLite ops":>11} {"TFLite, KiB":>12}')
+for name, model in [('traced ops', keras_model_traced), ('fused attention', keras_model)]:
+    diff = np.abs(model(x).numpy() - expected).max()
+    latency, num_ops, size = benchmark_tflite(model, x)
+    print(f'{name:<20} {len(model.layers):>7} {diff:>9.2e} {benchmark_tf(model, x):>8.3f} {latency:>11.3f} {num_ops:>11} {size:>12.1f}')
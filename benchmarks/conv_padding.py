@@ -0,0 +1,118 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import contextlib
+import io
+import time
+
+import nobuco
+from nobuco import ChannelOrder
+from nobuco.commons import CONVERTER_DICT
+from nobuco.node_converters.convolution import make_conv_layer
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+
+class BasicBlock(nn.Module):
+    def __init__(self, in_channels, out_channels, stride):
+        super().__init__()
+        self.conv1 = nn.Conv2d(in_channels, out_channels, 3, stride, 1, bias=False)
+        self.bn1 = nn.BatchNorm2d(out_channels)
+        self.conv2 = nn.Conv2d(out_channels, out_channels, 3, 1, 1, bias=False)
+        self.bn2 = nn.BatchNorm2d(out_channels)
+        self.downsample = None
+        if stride != 1 or in_channels != out_channels:
+            self.downsample = nn.Sequential(nn.Conv2d(in_channels, out_channels, 1, stride, bias=False), nn.BatchNorm2d(out_channels))
+
+    def forward(self, x):
+        identity = x if self.downsample is None else self.downsample(x)
+        x = F.relu(self.bn1(self.conv1(x)))
+        x = self.bn2(self.conv2(x))
+        return F.relu(x + identity)
+
+
+class ResNet18(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.stem = nn.Sequential(nn.Conv2d(3, 64, 7, 2, 3, bias=False), nn.BatchNorm2d(64), nn.ReLU(), nn.MaxPool2d(3, 2, 1))
+        layers = []
+        in_channels = 64
+        for out_channels, stride in [(64, 1), (128, 2), (256, 2), (512, 2)]:
+            layers += [BasicBlock(in_channels, out_channels, stride), BasicBlock(out_channels, out_channels, 1)]
+            in_channels = out_channels
+        self.layers = nn.Sequential(*layers)
+
+    def forward(self, x):
+        return self.layers(self.stem(x))
+
+
+def converter_Conv2d_zero_padded(self, input):
+    """Zero-padded copy followed by a valid convolution, as padded convolutions used to be converted"""
+    pad_layer = keras.layers.ZeroPadding2D(self.padding) if self.padding != (0, 0) else None
+    conv = make_conv_layer(2, self.weight, self.bias, self.stride, self.dilation, self.groups)
+
+    def func(input):
+        if pad_layer is not None:
+            input = pad_layer(input)
+        return conv(input)
+    return func
+
+
+def convert(pytorch_module, input):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return nobuco.pytorch_to_keras(
+            pytorch_module,
+            args=[input],
+            inputs_channel_order=ChannelOrder.TENSORFLOW,
+            outputs_channel_order=ChannelOrder.PYTORCH,
+        )
+
+
+def count_pads(keras_model):
+    return sum(isinstance(layer, keras.layers.ZeroPadding2D) or 'pad' in layer.name for layer in keras_model.layers)
+
+
+def benchmark_tf(keras_model, x, n_runs=50):
+    func = tf.function(keras_model)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(keras_model, x, n_runs=50):
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x)
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+pytorch_module = ResNet18().eval()
+input = torch.normal(0, 1, size=(1, 3, 224, 224))
+x = input.permute(0, 2, 3, 1).numpy()
+with torch.no_grad():
+    expected = pytorch_module(input).numpy()
+
+keras_model = convert(pytorch_module, input)
+
+converter_Conv2d = CONVERTER_DICT[nn.Conv2d]
+nobuco.converter(nn.Conv2d)(converter_Conv2d_zero_padded)
+keras_model_zero_padded = convert(pytorch_module, input)
+CONVERTER_DICT[nn.Conv2d] = converter_Conv2d
+
+print(f'{"ResNet-18, 224x224":<20} {"pads":>5} {"max diff":>9} {"TF, ms":>8} {"TFLite, ms":>11}')
+for name, model in [('zero-padded copy', keras_model_zero_padded), ('folded padding', keras_model)]:
+    diff = np.abs(model(x).numpy() - expected).max()
+    print(f'{name:<20} {count_pads(model):>5} {diff:>9.2e} {benchmark_tf(model, x):>8.3f} {benchmark_tflite(model, x):>11.3f}')
@@ -0,0 +1,62 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.einsum import compile_einsum
+
+import numpy as np
+import tensorflow as tf
+
+
+def benchmark_tf(func, inputs, n_runs=100):
+    func = tf.function(func)
+    func(*inputs)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(*inputs)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, inputs, n_runs=100):
+    input_signature = [tf.TensorSpec(input.shape) for input in inputs]
+    concrete_func = tf.function(func, input_signature=input_signature).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+    model_content = converter.convert()
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    for input_details, input in zip(interpreter.get_input_details(), inputs):
+        interpreter.set_tensor(input_details['index'], input.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    latency = (time.perf_counter() - start) / n_runs * 1000
+    ops = {op['op_name'] for op in interpreter._get_ops_details()}
+    return latency, sorted(ops)
+
+
+configs = {
+    'bhqd,bhkd->bhqk': [(1, 8, 197, 64), (1, 8, 197, 64)],
+    'bqhd,bkhd->bhqk': [(1, 197, 8, 64), (1, 197, 8, 64)],
+    'bhqk,bkhd->bqhd': [(1, 8, 197, 197), (1, 197, 8, 64)],
+    'bnd,hde->bhne': [(1, 197, 512), (8, 512, 64)],
+    'ab,bc,cd->ad': [(1024, 16), (16, 1024), (1024, 16)],
+}
+
+print(f'{"":<20} {"":<9} {"TF, ms":>8} {"TFLite, ms":>11}  TFLite ops')
+for equation, shapes in configs.items():
+    inputs = [tf.random.normal(shape) for shape in shapes]
+    compiled, note = compile_einsum(equation, shapes)
+
+    def einsum(*inputs):
+        return tf.einsum(equation, *inputs)
+
+    diff = np.abs(compiled(*inputs).numpy() - einsum(*inputs).numpy()).max()
+    assert diff < 1e-3, diff
+
+    for name, func in [('tf.einsum', einsum), ('compiled', compiled)]:
+        latency, ops = benchmark_tflite(func, inputs)
+        print(f'{equation:<20} {name:<9} {benchmark_tf(func, inputs):>8.3f} {latency:>11.3f}  {", ".join(ops)}')
+    print(f'{"":<20} {note}')
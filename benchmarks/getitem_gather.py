@@ -0,0 +1,64 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.slice import gather_adjacent_axes
+
+import numpy as np
+import tensorflow as tf
+
+
+def benchmark_tf(func, x, n_runs=100):
+    func = tf.function(func)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, x, n_runs=100):
+    concrete_func = tf.function(func, input_signature=[tf.TensorSpec(x.shape)]).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    model_content = converter.convert()
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000, len(model_content) / 1024
+
+
+def gather_nd_constant(x, indices):
+    """Pytorch-order gather_nd over the full index grid baked as a constant, as tensor indexing used to be converted"""
+    grids = np.meshgrid(*[indices.get(axis, np.arange(size)) for axis, size in enumerate(x.shape)], indexing='ij')
+    return tf.gather_nd(x, np.stack(grids, axis=-1))
+
+
+# Pytorch (NCHW) order
+x = tf.random.normal((1, 64, 96, 96))
+channels = np.random.permutation(64)[:32]
+rows = np.random.randint(0, 96, size=256)
+cols = np.random.randint(0, 96, size=256)
+
+configs = {
+    'x[:, channels]': (
+        lambda x: gather_nd_constant(x, {1: channels}),
+        lambda x: tf.gather(x, channels, axis=1),
+    ),
+    'x[:, :, rows, cols]': (
+        lambda x: tf.transpose(tf.gather_nd(tf.transpose(x, (2, 3, 0, 1)), np.stack([rows, cols], axis=-1)), (1, 2, 0)),
+        lambda x: gather_adjacent_axes(x, [rows, cols], 2),
+    ),
+}
+
+print(f'{"":<22} {"":<10} {"TF, ms":>8} {"TFLite, ms":>11} {"TFLite, KiB":>12}')
+for config_name, (reference, gather) in configs.items():
+    assert np.array_equal(gather(x).numpy(), reference(x).numpy())
+
+    for name, func in [('gather_nd', reference), ('gather', gather)]:
+        latency, size = benchmark_tflite(func, x)
+        print(f'{config_name:<22} {name:<10} {benchmark_tf(func, x):>8.3f} {latency:>11.3f} {size:>12.1f}')
@@ -0,0 +1,78 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.convolution import make_conv_layer, GroupedConvolution
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import torch
+from torch import nn
+
+
+def split_concat_conv(conv: nn.Conv2d):
+    """Grouped convolution as it used to be converted: one Conv2D per group, joined by concatenation"""
+    groups = conv.groups
+    weights = conv.weight.detach().numpy().transpose((2, 3, 1, 0))
+    biases = conv.bias.detach().numpy()
+    out_per_group = conv.out_channels // groups
+    convs = []
+    for g in range(groups):
+        s = slice(g * out_per_group, (g + 1) * out_per_group)
+        convs.append(keras.layers.Conv2D(out_per_group, conv.kernel_size, conv.stride, weights=[weights[..., s], biases[s]]))
+
+    def func(x):
+        xs = tf.split(x, groups, axis=-1)
+        return tf.concat([c(x) for c, x in zip(convs, xs)], axis=-1)
+    return func
+
+
+def block_diagonal_conv(conv: nn.Conv2d):
+    GroupedConvolution.block_diagonal = True
+    try:
+        return make_conv_layer(2, conv.weight, conv.bias, conv.stride, conv.dilation, conv.groups)
+    finally:
+        GroupedConvolution.block_diagonal = False
+
+
+def native_conv(conv: nn.Conv2d):
+    return make_conv_layer(2, conv.weight, conv.bias, conv.stride, conv.dilation, conv.groups)
+
+
+def benchmark(func, x, n_runs=50):
+    func = tf.function(func)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+configs = {
+    'groups=4': (nn.Conv2d(64, 64, 3, groups=4), (1, 64, 56, 56)),
+    'groups=32': (nn.Conv2d(64, 64, 3, groups=32), (1, 64, 56, 56)),
+    'ResNeXt, groups=32': (nn.Conv2d(256, 256, 3, groups=32), (1, 256, 28, 28)),
+    'depthwise': (nn.Conv2d(64, 64, 3, groups=64), (1, 64, 56, 56)),
+    'depthwise, multiplier=2': (nn.Conv2d(64, 128, 3, groups=64), (1, 64, 56, 56)),
+}
+
+strategies = {
+    'split/conv/concat': split_concat_conv,
+    'single layer': native_conv,
+    'block-diagonal': block_diagonal_conv,
+}
+
+for config_name, (conv, input_shape) in configs.items():
+    input = torch.normal(0, 1, size=input_shape)
+    x = tf.convert_to_tensor(input.numpy().transpose((0, 2, 3, 1)))
+    with torch.no_grad():
+        expected = conv(input).numpy().transpose((0, 2, 3, 1))
+    print(f'{config_name}:')
+    for strategy_name, strategy in strategies.items():
+        func = strategy(conv.eval())
+        diff = np.abs(func(x).numpy() - expected).max()
+        latency = benchmark(func, x)
+        print(f'    {strategy_name:<20} {latency:8.3f} ms  (max diff {diff:.2e})')
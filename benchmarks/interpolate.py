@@ -0,0 +1,62 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.interpolation import interpolate
+
+import numpy as np
+import tensorflow as tf
+
+import torch
+import torch.nn.functional as F
+
+
+def benchmark_tf(func, x, n_runs=100):
+    func = tf.function(func)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, x, n_runs=100):
+    concrete_func = tf.function(func, input_signature=[tf.TensorSpec(x.shape)]).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def interpolate_reference(x, size=None, scale_factor=None, mode='nearest', align_corners=None):
+    """`tf.image.resize` on sizes computed in Python, as interpolation used to be converted"""
+    if size is None:
+        size = (int(x.shape[1] * scale_factor), int(x.shape[2] * scale_factor))
+    method = 'bilinear' if mode == 'bilinear' else 'nearest'
+    return tf.image.resize(x, size=size, method=method)
+
+
+configs = {
+    'nearest x2': dict(scale_factor=2),
+    'nearest 48x48 -> 80x80': dict(size=(80, 80)),
+    'nearest x1.5': dict(scale_factor=1.5),
+    'bilinear x2': dict(scale_factor=2, mode='bilinear'),
+    'bilinear x2, align_corners': dict(scale_factor=2, mode='bilinear', align_corners=True),
+}
+
+input = torch.normal(0, 1, size=(1, 64, 48, 48))
+x = tf.convert_to_tensor(input.permute(0, 2, 3, 1).numpy())
+
+print(f'{"":<28} {"":<10} {"max diff":>9} {"TF, ms":>8} {"TFLite, ms":>11}')
+for config_name, kwargs in configs.items():
+    expected = F.interpolate(input, **kwargs).permute(0, 2, 3, 1).numpy()
+    for name, func in [('reference', interpolate_reference), ('fast path', interpolate)]:
+        func_kw = lambda x: func(x, **kwargs)
+        diff = np.abs(func_kw(x).numpy() - expected).max()
+        print(f'{config_name:<28} {name:<10} {diff:>9.2e} {benchmark_tf(func_kw, x):>8.3f} {benchmark_tflite(func_kw, x):>11.3f}')
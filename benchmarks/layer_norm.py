@@ -0,0 +1,152 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import contextlib
+import io
+import time
+from collections import Counter
+
+import nobuco
+from nobuco import ChannelOrder, ChannelOrderingStrategy
+from nobuco.node_converters.normalization import converter_layer_norm
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+
+class ViTBlock(nn.Module):
+    """Pre-norm transformer encoder block (with ReLU in place of GELU)"""
+
+    def __init__(self, dim, num_heads, mlp_ratio=4):
+        super().__init__()
+        self.norm1 = nn.LayerNorm(dim, eps=1e-6)
+        self.attn = nn.MultiheadAttention(dim, num_heads, batch_first=True)
+        self.norm2 = nn.LayerNorm(dim, eps=1e-6)
+        self.mlp = nn.Sequential(nn.Linear(dim, dim * mlp_ratio), nn.ReLU(), nn.Linear(dim * mlp_ratio, dim))
+
+    def forward(self, x):
+        y = self.norm1(x)
+        x = x + self.attn(y, y, y, need_weights=False)[0]
+        return x + self.mlp(self.norm2(x))
+
+
+class ViT(nn.Module):
+    def __init__(self, dim=192, num_heads=3, depth=4, patch_size=16):
+        super().__init__()
+        self.patch_embed = nn.Conv2d(3, dim, patch_size, patch_size)
+        self.blocks = nn.Sequential(*[ViTBlock(dim, num_heads) for _ in range(depth)])
+        self.norm = nn.LayerNorm(dim, eps=1e-6)
+
+    def forward(self, x):
+        x = self.patch_embed(x)
+        x = x.reshape(x.shape[0], x.shape[1], -1).permute(0, 2, 1)
+        return self.norm(self.blocks(x))
+
+
+class LayerNorm2d(nn.LayerNorm):
+    """Channel LayerNorm of NCHW tensors, as in ConvNeXt's stem and downsampling layers"""
+
+    def forward(self, x):
+        x = x.permute(0, 2, 3, 1)
+        x = F.layer_norm(x, self.normalized_shape, self.weight, self.bias, self.eps)
+        return x.permute(0, 3, 1, 2)
+
+
+class ConvNeXtBlock(nn.Module):
+    """ConvNeXt block (with ReLU in place of GELU)"""
+
+    def __init__(self, dim):
+        super().__init__()
+        self.dwconv = nn.Conv2d(dim, dim, 7, padding=3, groups=dim)
+        self.norm = nn.LayerNorm(dim, eps=1e-6)
+        self.pwconv1 = nn.Linear(dim, 4 * dim)
+        self.pwconv2 = nn.Linear(4 * dim, dim)
+
+    def forward(self, x):
+        y = self.dwconv(x).permute(0, 2, 3, 1)
+        y = self.pwconv2(F.relu(self.pwconv1(self.norm(y))))
+        return x + y.permute(0, 3, 1, 2)
+
+
+class ConvNeXt(nn.Module):
+    """First two stages of ConvNeXt-T"""
+
+    def __init__(self, dims=(96, 192), depths=(3, 3)):
+        super().__init__()
+        layers = [nn.Conv2d(3, dims[0], 4, 4), LayerNorm2d(dims[0], eps=1e-6)]
+        for i, (dim, depth) in enumerate(zip(dims, depths)):
+            if i > 0:
+                layers += [LayerNorm2d(dims[i - 1], eps=1e-6), nn.Conv2d(dims[i - 1], dim, 2, 2)]
+            layers += [ConvNeXtBlock(dim) for _ in range(depth)]
+        self.layers = nn.Sequential(*layers)
+
+    def forward(self, x):
+        return self.layers(x)
+
+
+def converter_layer_norm_keras(input, normalized_shape, weight=None, bias=None, eps=1e-5):
+    """Keras LayerNormalization on the last axis in pytorch order, as layer norms used to be converted"""
+    layer = keras.layers.LayerNormalization(axis=-1, epsilon=eps, weights=[weight.detach().numpy(), bias.detach().numpy()])
+
+    def func(input, *args, **kwargs):
+        return layer(input)
+    return func
+
+
+def convert(pytorch_module, input):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return nobuco.pytorch_to_keras(
+            pytorch_module,
+            args=[input],
+            inputs_channel_order=ChannelOrder.TENSORFLOW,
+            outputs_channel_order=ChannelOrder.PYTORCH,
+        )
+
+
+def benchmark_tf(keras_model, x, n_runs=50):
+    func = tf.function(keras_model)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(keras_model, x, n_runs=50):
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x)
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    latency = (time.perf_counter() - start) / n_runs * 1000
+    ops = Counter(op['op_name'] for op in interpreter._get_ops_details())
+    return latency, sum(ops.values()), ops['TRANSPOSE']
+
+
+input = torch.normal(0, 1, size=(1, 3, 224, 224))
+x = input.permute(0, 2, 3, 1).numpy()
+
+print(f'{"":<48} {"max diff":>9} {"TF, ms":>8} {"TFLite, ms":>11} {"TFLite ops":>11} {"transposes":>11}')
+for model_name, pytorch_module in [('ViT-Ti, 4 blocks', ViT()), ('ConvNeXt-T, 2 stages', ConvNeXt())]:
+    pytorch_module.eval()
+    with torch.no_grad():
+        expected = pytorch_module(input).numpy()
+
+    keras_model = convert(pytorch_module, input)
+
+    nobuco.converter(F.layer_norm, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)(converter_layer_norm_keras)
+    keras_model_keras_ln = convert(pytorch_module, input)
+    nobuco.converter(F.layer_norm, channel_ordering_strategy=converter_layer_norm.channel_ordering_strategy)(converter_layer_norm.convert_func)
+
+    for name, model in [('keras LayerNormalization', keras_model_keras_ln), ('mean/variance', keras_model)]:
+        diff = np.abs(model(x).numpy() - expected).max()
+        latency, num_ops, num_transposes = benchmark_tflite(model, x)
+        print(f'{f"{model_name}, {name}":<48} {diff:>9.2e} {benchmark_tf(model, x):>8.3f} {latency:>11.3f} {num_ops:>11} {num_transposes:>11}')
@@ -0,0 +1,67 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.pooling import pixel_shuffle, pixel_shuffle_reference, pixel_unshuffle
+
+import numpy as np
+import tensorflow as tf
+
+import torch
+import torch.nn.functional as F
+
+
+def benchmark_tf(func, x, n_runs=100):
+    func = tf.function(func)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, x, n_runs=100):
+    concrete_func = tf.function(func, input_signature=[tf.TensorSpec(x.shape)]).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def pixel_unshuffle_space_to_depth(x, downscale_factor):
+    """space_to_depth followed by a channel gather into pytorch's channel order, for comparison"""
+    r = downscale_factor
+    c = x.shape[-1]
+    perm = [(i * r + j) * c + k for k in range(c) for i in range(r) for j in range(r)]
+    return tf.gather(tf.nn.space_to_depth(x, r), perm, axis=-1)
+
+
+print(f'{"":<44} {"TF, ms":>8} {"TFLite, ms":>11}')
+for r in [2, 4]:
+    input = torch.normal(0, 1, size=(1, 32 * r * r, 64, 64))
+    x = tf.convert_to_tensor(input.permute(0, 2, 3, 1).numpy())
+
+    expected = pixel_shuffle_reference(x, r).numpy()
+    assert np.array_equal(pixel_shuffle(x, r).numpy(), expected)
+    assert np.array_equal(expected, F.pixel_shuffle(input, r).permute(0, 2, 3, 1).numpy())
+
+    for name, func in [('reference', pixel_shuffle_reference), ('reshape/transpose', pixel_shuffle)]:
+        func_r = lambda x: func(x, r)
+        print(f'{f"pixel_shuffle r={r}, {name}":<44} {benchmark_tf(func_r, x):>8.3f} {benchmark_tflite(func_r, x):>11.3f}')
+
+    input = torch.normal(0, 1, size=(1, 32, 64 * r, 64 * r))
+    x = tf.convert_to_tensor(input.permute(0, 2, 3, 1).numpy())
+
+    expected = F.pixel_unshuffle(input, r).permute(0, 2, 3, 1).numpy()
+    assert np.array_equal(pixel_unshuffle(x, r).numpy(), expected)
+    assert np.array_equal(pixel_unshuffle_space_to_depth(x, r).numpy(), expected)
+
+    for name, func in [('space_to_depth/gather', pixel_unshuffle_space_to_depth), ('reshape/transpose', pixel_unshuffle)]:
+        func_r = lambda x: func(x, r)
+        print(f'{f"pixel_unshuffle r={r}, {name}":<44} {benchmark_tf(func_r, x):>8.3f} {benchmark_tflite(func_r, x):>11.3f}')
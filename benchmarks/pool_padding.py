@@ -0,0 +1,78 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.pooling import PoolPadding
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import torch
+from torch import nn
+
+
+def benchmark_tf(func, x, n_runs=100):
+    func = tf.function(func)
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, x, n_runs=100):
+    concrete_func = tf.function(func, input_signature=[tf.TensorSpec(x.shape)]).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def zero_padded_pool(pool_layer_class, kernel_size, stride, padding):
+    """Zero-padded copy followed by a valid pool, as padded pooling used to be converted"""
+    pad_layer = keras.layers.ZeroPadding2D(padding)
+    pool_layer = pool_layer_class(pool_size=kernel_size, strides=stride)
+    return lambda x: pool_layer(pad_layer(x))
+
+
+def padded_pool(pool_layer_class, kernel_size, stride, padding, input_size, count_include_pad=True):
+    kernel_size, stride, padding = (kernel_size, kernel_size), (stride, stride), (padding, padding)
+    pool_padding = PoolPadding(input_size, kernel_size, stride, padding, ceil_mode=False)
+    pool_layer = pool_layer_class(pool_size=kernel_size, strides=stride, padding=pool_padding.get_keras_padding())
+    constant_value = -np.inf if pool_layer_class is keras.layers.MaxPool2D else 0
+    correction = None
+    if pool_layer_class is keras.layers.AvgPool2D:
+        correction = pool_padding.get_divisor_correction(count_include_pad, divisor_override=None)
+
+    def func(x):
+        x = pool_layer(pool_padding.pad(x, constant_value))
+        return x if correction is None else x * correction
+    return func, pool_padding.mode or 'explicit pad'
+
+
+configs = {
+    'max 3x3/1, pad 1': (nn.MaxPool2d(3, 1, 1), keras.layers.MaxPool2D, {}),
+    'max 3x3/2, pad 1 (ResNet stem)': (nn.MaxPool2d(3, 2, 1), keras.layers.MaxPool2D, {}),
+    'avg 3x3/1, pad 1': (nn.AvgPool2d(3, 1, 1), keras.layers.AvgPool2D, {}),
+    'avg 3x3/1, pad 1, exclude pad': (nn.AvgPool2d(3, 1, 1, count_include_pad=False), keras.layers.AvgPool2D, dict(count_include_pad=False)),
+}
+
+# Activations are shifted to be negative, where zero padding breaks max pooling
+input = torch.normal(0, 1, size=(1, 64, 112, 112)) - 5
+x = tf.convert_to_tensor(input.permute(0, 2, 3, 1).numpy())
+
+print(f'{"":<32} {"":<24} {"max diff":>9} {"TF, ms":>8} {"TFLite, ms":>11}')
+for config_name, (pytorch_pool, pool_layer_class, kwargs) in configs.items():
+    expected = pytorch_pool(input).permute(0, 2, 3, 1).numpy()
+    args = pytorch_pool.kernel_size, pytorch_pool.stride, pytorch_pool.padding
+    func, mode = padded_pool(pool_layer_class, *args, input_size=input.shape[2:], **kwargs)
+    for name, func in [('zero-padded copy', zero_padded_pool(pool_layer_class, *args)), (mode, func)]:
+        diff = np.abs(func(x).numpy() - expected).max()
+        print(f'{config_name:<32} {name:<24} {diff:>9.2e} {benchmark_tf(func, x):>8.3f} {benchmark_tflite(func, x):>11.3f}')
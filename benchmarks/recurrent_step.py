@@ -0,0 +1,94 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import contextlib
+import io
+import time
+
+import nobuco
+from nobuco import ChannelOrder
+from nobuco.node_converters.recurrent import get_gru_weights
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import torch
+from torch import nn
+
+
+class StreamingGRU(nn.Module):
+    """Processes one frame at a time, the hidden state is passed in and out explicitly"""
+
+    def __init__(self):
+        super().__init__()
+        self.gru = nn.GRU(80, 256, num_layers=2)
+        self.fc = nn.Linear(256, 32)
+
+    def forward(self, frame, h):
+        x, h = self.gru(frame.unsqueeze(0), h)
+        return self.fc(x[0]), h
+
+
+def sequence_layers_model(pytorch_module: StreamingGRU):
+    """Same model built from Keras GRU layers over a sequence of length 1, as frames used to be converted"""
+    gru = pytorch_module.gru
+    frame = keras.Input((80,), batch_size=1)
+    h = keras.Input((1, 256), batch_size=2)
+    x = tf.expand_dims(frame, axis=0)
+    hs = []
+    for i in range(gru.num_layers):
+        layer = keras.layers.GRU(256, return_sequences=True, return_state=True, time_major=True, reset_after=True, unroll=True, weights=get_gru_weights(gru, f'_l{i}'))
+        x, h_i = layer(x, initial_state=h[i])
+        hs.append(h_i)
+    fc = keras.layers.Dense(32, weights=[pytorch_module.fc.weight.detach().numpy().T, pytorch_module.fc.bias.detach().numpy()])
+    return keras.Model([frame, h], [fc(x[0]), tf.stack(hs, axis=0)])
+
+
+def graph_size(keras_model, inputs):
+    return len(tf.function(keras_model).get_concrete_function(inputs).graph.as_graph_def().node)
+
+
+def benchmark_tflite(keras_model, inputs, n_runs=2000):
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    # TFLite may reorder inputs, match them by shape
+    for input_details in interpreter.get_input_details():
+        input = next(input for input in inputs if input.shape == tuple(input_details['shape']))
+        interpreter.set_tensor(input_details['index'], input)
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+pytorch_module = StreamingGRU().eval()
+
+frame = torch.normal(0, 1, size=(1, 80))
+h = torch.zeros(2, 1, 256)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    keras_model = nobuco.pytorch_to_keras(
+        pytorch_module,
+        args=[frame, h],
+        inputs_channel_order=ChannelOrder.PYTORCH,
+        outputs_channel_order=ChannelOrder.PYTORCH,
+    )
+
+# Validate the step model against pytorch, feeding each model its own states back
+frames = torch.normal(0, 1, size=(100, 1, 80))
+h_pt = torch.zeros(2, 1, 256)
+h_tf = np.zeros((2, 1, 256), dtype=np.float32)
+max_diff = 0
+for frame in frames:
+    with torch.no_grad():
+        output_pt, h_pt = pytorch_module(frame, h_pt)
+    output_tf, h_tf = keras_model([frame.numpy(), h_tf])
+    max_diff = max(max_diff, np.abs(output_tf.numpy() - output_pt.numpy()).max(), np.abs(h_tf.numpy() - h_pt.numpy()).max())
+print(f'Max diff over {len(frames)} steps: {max_diff:.2e}')
+
+inputs = [frames[0].numpy(), h_tf.numpy()]
+for name, model in [('fused step cell', keras_model), ('sequence GRU layers', sequence_layers_model(pytorch_module))]:
+    print(f'{name:<20} graph nodes: {graph_size(model, inputs):>4}, TFLite per-frame latency: {benchmark_tflite(model, inputs):.3f} ms')
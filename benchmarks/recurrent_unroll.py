@@ -0,0 +1,63 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import contextlib
+import io
+import time
+
+import nobuco
+from nobuco import ChannelOrder
+
+import tensorflow as tf
+
+import torch
+from torch import nn
+
+
+class Recurrent(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.lstm = nn.LSTM(64, 128, num_layers=2, bidirectional=True)
+
+    def forward(self, x):
+        x, _ = self.lstm(x)
+        return x
+
+
+def convert(pytorch_module, input, rnn_unroll_max_steps):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return nobuco.pytorch_to_keras(
+            pytorch_module,
+            args=[input],
+            inputs_channel_order=ChannelOrder.PYTORCH,
+            outputs_channel_order=ChannelOrder.PYTORCH,
+            rnn_unroll_max_steps=rnn_unroll_max_steps,
+        )
+
+
+def benchmark(keras_model, x, n_runs=20):
+    func = tf.function(keras_model)
+
+    start = time.perf_counter()
+    graph = func.get_concrete_function(x).graph
+    build_time = time.perf_counter() - start
+    graph_size = len(graph.as_graph_def().node)
+
+    func(x)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(x)
+    latency = (time.perf_counter() - start) / n_runs
+    return graph_size, build_time, latency
+
+
+pytorch_module = Recurrent().eval()
+
+print(f'{"steps":>6} {"mode":<10} {"graph nodes":>12} {"build, s":>10} {"latency, ms":>12}')
+for num_steps in [4, 16, 64, 256]:
+    input = torch.normal(0, 1, size=(num_steps, 1, 64))
+    x = tf.convert_to_tensor(input.numpy())
+    for mode, rnn_unroll_max_steps in [('unrolled', num_steps), ('loop', 0)]:
+        keras_model = convert(pytorch_module, input, rnn_unroll_max_steps)
+        graph_size, build_time, latency = benchmark(keras_model, x)
+        print(f'{num_steps:>6} {mode:<10} {graph_size:>12} {build_time:>10.2f} {latency * 1000:>12.3f}')
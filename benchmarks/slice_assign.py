@@ -0,0 +1,62 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import time
+
+from nobuco.node_converters.slice import slice_assign, slice_assign_static, static_slice_ranges
+
+import numpy as np
+import tensorflow as tf
+
+
+def benchmark_tf(func, inputs, n_runs=100):
+    func = tf.function(func)
+    func(*inputs)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        func(*inputs)
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+def benchmark_tflite(func, inputs, n_runs=100):
+    input_signature = [tf.TensorSpec(input.shape) for input in inputs]
+    concrete_func = tf.function(func, input_signature=input_signature).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    for input_details, input in zip(interpreter.get_input_details(), inputs):
+        interpreter.set_tensor(input_details['index'], input.numpy())
+    interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / n_runs * 1000
+
+
+x = tf.random.normal((1, 128, 128, 64))
+
+# Slices in Keras (NHWC) order
+configs = {
+    'channels [16:48]': (slice(None), slice(None), slice(None), slice(16, 48)),
+    'spatial box [32:96, 32:96]': (slice(None), slice(32, 96), slice(32, 96), slice(None)),
+    'rows [0:64]': (slice(None), slice(0, 64), slice(None), slice(None)),
+    'strided rows [::2]': (slice(None), slice(None, None, 2), slice(None), slice(None)),
+    'strided box [1::2, 1::2]': (slice(None), slice(1, None, 2), slice(1, None, 2), slice(None)),
+}
+
+print(f'{"":<28} {"":<8} {"TF, ms":>8} {"TFLite, ms":>11}')
+for config_name, slices in configs.items():
+    y = tf.random.normal(x[slices].shape)
+    ranges = static_slice_ranges(x.shape, slices)
+
+    def scatter(x, y):
+        return slice_assign(x, y, *slices)
+
+    def static(x, y):
+        return slice_assign_static(x, y, ranges)
+
+    diff = np.abs(scatter(x, y).numpy() - static(x, y).numpy()).max()
+    assert diff == 0
+
+    for name, func in [('scatter', scatter), ('static', static)]:
+        print(f'{config_name:<28} {name:<8} {benchmark_tf(func, [x, y]):>8.3f} {benchmark_tflite(func, [x, y]):>11.3f}')
@@ -1,9 +1,10 @@
+import contextlib
 import time
 import warnings
 from typing import Callable, Dict, Collection, Optional, List, Union, Tuple
 
 import torch
-from nobuco.converters.tensor import permute_pytorch2keras
+from nobuco.converters.tensor import permute_pytorch2keras, LayoutPeephole
 from torch import nn
 import tensorflow as tf
 from tensorflow import keras
@@ -11,8 +12,12 @@ from tensorflow import keras
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy, TF_TENSOR_CLASSES, TraceLevel
 from nobuco.converters.channel_ordering import t_pytorch2keras, set_channel_order, t_keras2pytorch
 from nobuco.converters.validation import validate, ValidationResult, ConversionResult
+from nobuco.converters.data_movement import DataMovementTracker, DataMovementReport, format_node
+from nobuco.converters.tied_parameters import TiedParameters
+from nobuco.converters.fusion import fold_batch_norms, fuse_activations, coalesce_setitems
 from nobuco.layers.channel_order import ChangeOrderingLayer
-from nobuco.layers.container import TransientContainer
+from nobuco.layers.container import TransientContainer, GraphIndex, ExecutionPlan
+from nobuco.layers.weight import ConstantPool
 from nobuco.layers.stub import UnimplementedOpStub
 from nobuco.util import get_torch_tensor_identifier, collect_recursively, replace_recursively_func, \
     clone_torch_tensors_recursively
@@ -25,6 +30,8 @@ from nobuco.vis.html_stylizer import HtmlStylizer
 # Load default converters
 # noinspection PyUnresolvedReferences
 from nobuco.node_converters import *
+from nobuco.node_converters.recurrent import RecurrentUnrolling
+from nobuco.node_converters.convolution import GroupedConvolution
 
 # Trace pytorch ops right away
 Tracer.decorate_all()
@@ -75,20 +82,6 @@ def convert_container(
         output_tensors: List[torch.Tensor],
         constants_to_variables: bool) -> TransientContainer:
 
-    def collect_disconnected_node_names(input_names, output_names, keras_converted_nodes) -> Collection[int]:
-        input_set = set(input_names)
-        disconnected_set = set()
-        for converted_node in keras_converted_nodes:
-            for input_name in converted_node.input_names:
-                if input_name not in input_set:
-                    disconnected_set.add(input_name)
-            for output_name in converted_node.output_names:
-                input_set.add(output_name)
-        for name in output_names:
-            if name not in input_set:
-                disconnected_set.add(name)
-        return list(disconnected_set)
-
     def collect_tensors_by_ids(tensor_ids: Collection[int], node_hierarchies: Collection[PytorchNodeHierarchy], output_tensors) -> Dict[int, torch.Tensor]:
         result = {}
         for hierarchy in node_hierarchies:
@@ -102,13 +95,14 @@ def convert_container(
                 result[output_id] = tensor
         return result
 
-    disconnected_names = collect_disconnected_node_names(input_names, output_names, children_converted_nodes)
+    graph_index = GraphIndex([(converted_node.input_names, converted_node.output_names) for converted_node in children_converted_nodes])
+    disconnected_names = graph_index.unprovided_names(input_names, output_names)
     disconnected_tensors_pytorch = collect_tensors_by_ids(disconnected_names, children, output_tensors)
     disconnected_tensors_keras = {k: t_pytorch2keras(t) for k, t in disconnected_tensors_pytorch.items()}
 
     outputs_template = node.make_outputs_template()
 
-    node_keras = TransientContainer.create(input_names, output_names, outputs_template, disconnected_tensors_keras, children_converted_nodes, constants_to_variables=constants_to_variables)
+    node_keras = TransientContainer.create(input_names, output_names, outputs_template, disconnected_tensors_keras, children_converted_nodes, constants_to_variables=constants_to_variables, graph_index=graph_index)
     return node_keras
 
 
@@ -119,6 +113,8 @@ def convert_hierarchy(
         full_validation: bool = True,
         tolerance=1e-4,
         constants_to_variables: bool = True,
+        eliminate_dead_nodes: bool = True,
+        fold_constants_max_bytes: Optional[int] = 64 * 1024,
 ) -> KerasConvertedNode:
 
     def convert(hierarchy: PytorchNodeHierarchy, converted_op_dict:Dict, reuse_layers: bool, full_validation: bool, depth):
@@ -139,7 +135,7 @@ def convert_hierarchy(
             node_converter: Pytorch2KerasNodeConverter = converter_dict.get(node.get_type(), None)
             node_is_reusable = node_converter.reusable
             keras_op = convert_node(node, node_converter)
-            conversion_result = ConversionResult(converted_manually=True, converter=converter)
+            conversion_result = ConversionResult(converted_manually=True, converter=converter, note=getattr(keras_op.func, 'conversion_note', None))
         elif len(children) > 0:
             children_converted_nodes = [convert(child, converted_op_dict, reuse_layers, full_validation, depth + 1) for child in children]
             keras_op = convert_container(node, children, children_converted_nodes, input_names, output_names, node.output_tensors, constants_to_variables=constants_to_variables)
@@ -147,7 +143,9 @@ def convert_hierarchy(
             connectivity_status = keras_op.get_connectivity_status()
             if not connectivity_status.is_connected():
                 warnings.warn(f'[{node.get_type()} : {keras_op}] is disconnected!', category=RuntimeWarning)
-            conversion_result = ConversionResult(converted_manually=False, connectivity_status=connectivity_status, converter=converter)
+            folded_nodes = keras_op.fold_constants(fold_constants_max_bytes, constants_to_variables) if fold_constants_max_bytes is not None else []
+            pruned_nodes = keras_op.eliminate_dead_nodes() if eliminate_dead_nodes else []
+            conversion_result = ConversionResult(converted_manually=False, connectivity_status=connectivity_status, converter=converter, pruned_nodes=pruned_nodes, folded_nodes=folded_nodes)
         else:
             children_converted_nodes = []
             keras_op = UnimplementedOpStub(node.get_op())
@@ -184,6 +182,20 @@ def collect_conversion_results(keras_node: KerasConvertedNode) -> Dict[PytorchNo
     return conversion_result_dict
 
 
+def collect_pruned_nodes(keras_node: KerasConvertedNode) -> List[PytorchNode]:
+    pruned_nodes = list(keras_node.conversion_result.pruned_nodes)
+    for child in keras_node.children:
+        pruned_nodes += collect_pruned_nodes(child)
+    return pruned_nodes
+
+
+def collect_folded_nodes(keras_node: KerasConvertedNode) -> List[PytorchNode]:
+    folded_nodes = list(keras_node.conversion_result.folded_nodes)
+    for child in keras_node.children:
+        folded_nodes += collect_folded_nodes(child)
+    return folded_nodes
+
+
 def prepare_inputs_tf(inputs_pt, inputs_channel_order, input_shapes):
 
     def collect_func(obj):
@@ -235,6 +247,36 @@ def postprocess_outputs_tf(outputs, outputs_channel_order):
     return processed
 
 
+def build_keras_model(keras_op, args, kwargs, input_shapes, inputs_channel_order, outputs_channel_order) -> Tuple[keras.Model, DataMovementReport]:
+    LayoutPeephole.reset()
+    with DataMovementTracker.tracking():
+        args_tf, kwargs_tf = prepare_inputs_tf((args, kwargs), inputs_channel_order, input_shapes)
+        outputs_tf = keras_op(*args_tf, **kwargs_tf)
+        outputs_tf = postprocess_outputs_tf(outputs_tf, outputs_channel_order)
+
+    inputs_tf_flat = collect_recursively((args_tf, kwargs_tf), TF_TENSOR_CLASSES)
+    keras_model = keras.Model(inputs_tf_flat, outputs_tf)
+
+    data_movement_report = DataMovementReport(DataMovementTracker.collect(keras_model))
+    return keras_model, data_movement_report
+
+
+@contextlib.contextmanager
+def conversion_settings(optimize_layout: bool, merge_common_subexpressions: bool, rnn_unroll_max_steps: int, grouped_conv_block_diagonal: bool):
+    """Sets the class-level switches read by converters, restoring them on exit even if the conversion fails,
+    so that nested conversions (converter inside converter) and subsequent ones are unaffected.
+    """
+    settings_prev = (LayoutPeephole.enabled, ExecutionPlan.cse_enabled, RecurrentUnrolling.max_steps, GroupedConvolution.block_diagonal)
+    LayoutPeephole.enabled = optimize_layout
+    ExecutionPlan.cse_enabled = merge_common_subexpressions
+    RecurrentUnrolling.max_steps = rnn_unroll_max_steps
+    GroupedConvolution.block_diagonal = grouped_conv_block_diagonal
+    try:
+        yield
+    finally:
+        LayoutPeephole.enabled, ExecutionPlan.cse_enabled, RecurrentUnrolling.max_steps, GroupedConvolution.block_diagonal = settings_prev
+
+
 def pytorch_to_keras(
         module: nn.Module,
         args: List[object] = None,
@@ -244,9 +286,20 @@ def pytorch_to_keras(
         outputs_channel_order: Union[ChannelOrder, Dict[int, ChannelOrder]] = None,
         converter_dict=CONVERTER_DICT,
         constants_to_variables: bool = True,
+        optimize_layout: bool = True,
+        eliminate_dead_nodes: bool = True,
+        fold_constants_max_bytes: Optional[int] = 64 * 1024,
+        merge_common_subexpressions: bool = True,
+        fold_batch_norm: bool = False,
+        fuse_activation: bool = True,
+        coalesce_setitem: bool = True,
+        rnn_unroll_max_steps: int = 16,
+        grouped_conv_block_diagonal: bool = False,
         full_validation: bool = True,
         validation_tolerance=1e-4,
         save_trace_html=False,
+        report_data_movement=False,
+        report_constant_pool=False,
         return_outputs_pt=False,
         debug_traces: TraceLevel = TraceLevel.DEFAULT,
 ) -> Union[keras.Model, Tuple[keras.Model, object]]:
@@ -258,43 +311,79 @@ def pytorch_to_keras(
         kwargs = {}
 
     start = time.time()
-    node_hierarchy = Tracer.trace(module, args, kwargs)
-
-    keras_converted_node = convert_hierarchy(node_hierarchy, converter_dict,
-                                             reuse_layers=True, full_validation=full_validation, constants_to_variables=constants_to_variables,
-                                             tolerance=validation_tolerance,
-                                             )
-
-    validation_result_dict = collect_validation_results(keras_converted_node)
-    conversion_result_dict = collect_conversion_results(keras_converted_node)
-
-    vis_params = {
-        'validation_result_dict': validation_result_dict,
-        'conversion_result_dict': conversion_result_dict,
-        'debug_traces': debug_traces,
-    }
-
-    print(node_hierarchy.__str__(with_legend=True, **vis_params))
 
-    if save_trace_html:
-        html = node_hierarchy.__str__(with_legend=True, stylizer=HtmlStylizer(), **vis_params)
-        with open('trace.html', 'w') as f:
-            f.write(html)
-
-    unimplemented_hierarchy = find_unimplemented(node_hierarchy, converter_dict)
-    if unimplemented_hierarchy is not None:
-        print('Unimplemented nodes:')
-        print(unimplemented_hierarchy.__str__(**vis_params))
-        raise Exception('Unimplemented nodes')
-
-    keras_op = keras_converted_node.keras_op
-
-    args_tf, kwargs_tf = prepare_inputs_tf((args, kwargs), inputs_channel_order, input_shapes)
-    outputs_tf = keras_op(*args_tf, **kwargs_tf)
-    outputs_tf = postprocess_outputs_tf(outputs_tf, outputs_channel_order)
-
-    inputs_tf_flat = collect_recursively((args_tf, kwargs_tf), TF_TENSOR_CLASSES)
-    keras_model = keras.Model(inputs_tf_flat, outputs_tf)
+    with conversion_settings(optimize_layout, merge_common_subexpressions, rnn_unroll_max_steps, grouped_conv_block_diagonal), ConstantPool.scope(), TiedParameters.scope(module):
+        node_hierarchy = Tracer.trace(module, args, kwargs)
+        if fold_batch_norm:
+            node_hierarchy = fold_batch_norms(node_hierarchy)
+        if fuse_activation:
+            node_hierarchy = fuse_activations(node_hierarchy, converter_dict)
+        if coalesce_setitem:
+            node_hierarchy = coalesce_setitems(node_hierarchy, converter_dict)
+
+        keras_converted_node = convert_hierarchy(node_hierarchy, converter_dict,
+                                                 reuse_layers=True, full_validation=full_validation, constants_to_variables=constants_to_variables,
+                                                 tolerance=validation_tolerance, eliminate_dead_nodes=eliminate_dead_nodes,
+                                                 fold_constants_max_bytes=fold_constants_max_bytes,
+                                                 )
+
+        validation_result_dict = collect_validation_results(keras_converted_node)
+        conversion_result_dict = collect_conversion_results(keras_converted_node)
+
+        unimplemented_hierarchy = find_unimplemented(node_hierarchy, converter_dict)
+
+        keras_model = None
+        data_movement_report = None
+        try:
+            if unimplemented_hierarchy is None:
+                keras_model, data_movement_report = build_keras_model(keras_converted_node.keras_op, args, kwargs, input_shapes, inputs_channel_order, outputs_channel_order)
+        finally:
+            # The trace is shown even if the final graph could not be built
+            vis_params = {
+                'validation_result_dict': validation_result_dict,
+                'conversion_result_dict': conversion_result_dict,
+                'debug_traces': debug_traces,
+                'data_movement_report': data_movement_report,
+            }
+
+            print(node_hierarchy.__str__(with_legend=True, **vis_params))
+
+            if save_trace_html:
+                html = node_hierarchy.__str__(with_legend=True, stylizer=HtmlStylizer(), **vis_params)
+                with open('trace.html', 'w') as f:
+                    f.write(html)
+
+        if unimplemented_hierarchy is not None:
+            print('Unimplemented nodes:')
+            print(unimplemented_hierarchy.__str__(**vis_params))
+            raise Exception('Unimplemented nodes')
+
+        folded_nodes = collect_folded_nodes(keras_converted_node)
+        if len(folded_nodes) > 0:
+            print(f'Folded {len(folded_nodes)} input-independent op(s) into constants:')
+            for folded_node in folded_nodes:
+                print(f'    {format_node(folded_node)}')
+
+        if isinstance(keras_converted_node.keras_op, TransientContainer):
+            num_merged_steps = keras_converted_node.keras_op.get_plan().num_merged_steps
+            if num_merged_steps > 0:
+                print(f'Merged {num_merged_steps} common subexpression(s)')
+
+        pruned_nodes = collect_pruned_nodes(keras_converted_node)
+        if len(pruned_nodes) > 0:
+            print(f'Pruned {len(pruned_nodes)} op(s) whose outputs are never used:')
+            for pruned_node in pruned_nodes:
+                print(f'    {format_node(pruned_node)}')
+
+        if report_data_movement:
+            print(data_movement_report)
+            print(f'Layout ops (requested -> in graph): {LayoutPeephole.summary(keras_model)}')
+        if report_constant_pool:
+            print(f'Constant pool: {ConstantPool.summary(keras_model)}')
+
+        tied_parameter_report = TiedParameters.report(keras_model)
+        if len(tied_parameter_report.records) > 0:
+            print(tied_parameter_report)
 
     elapsed = time.time() - start
     print(f'Conversion complete. Elapsed time: {elapsed:.2f} sec.')
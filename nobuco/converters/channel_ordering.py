@@ -1,11 +1,13 @@
+from copy import deepcopy
 from dataclasses import dataclass
+from enum import Enum
 
 import tensorflow as tf
 import torch
 
 from nobuco.commons import ChannelOrder, TF_TENSOR_CLASSES
 from nobuco.converters.tensor import _permute, perm_pytorch2keras, perm_keras2pytorch
-from nobuco.util import replace_recursively_func
+from nobuco.util import replace_recursively_func, collect_recursively_func
 
 
 def set_channel_order(tensor, channel_order: ChannelOrder):
@@ -83,3 +85,41 @@ def template_insert_recursively(obj, tensors):
         return tensors[obj.idx]
 
     return replace_recursively_func(obj, collect_func, replace_func)
+
+
+def _is_immutable(obj):
+    if isinstance(obj, tuple):
+        return all(_is_immutable(el) for el in obj)
+    if isinstance(obj, slice):
+        return all(_is_immutable(el) for el in (obj.start, obj.stop, obj.step))
+    return isinstance(obj, (int, float, complex, bool, str, bytes, type(None), type(Ellipsis), torch.dtype, torch.device, Enum))
+
+
+def compile_template(obj):
+    """Turns a template into a function that fills it with tensors.
+    Templates are resolved once, so that repeated calls avoid a deepcopy of the whole structure.
+    """
+
+    def has_placeholders(obj):
+        return len(collect_recursively_func(obj, lambda o: isinstance(o, TensorPlaceholder))) > 0
+
+    if isinstance(obj, TensorPlaceholder):
+        idx = obj.idx
+        return lambda tensors: tensors[idx]
+    elif not has_placeholders(obj):
+        if _is_immutable(obj):
+            return lambda tensors: obj
+        else:
+            return lambda tensors: deepcopy(obj)
+    elif type(obj) in (list, tuple):
+        cls = type(obj)
+        fill_funcs = [compile_template(el) for el in obj]
+        return lambda tensors: cls([f(tensors) for f in fill_funcs])
+    elif type(obj) is dict and not has_placeholders(list(obj.keys())):
+        fill_funcs = [(k, compile_template(v)) for k, v in obj.items()]
+        return lambda tensors: {k: f(tensors) for k, f in fill_funcs}
+    elif isinstance(obj, slice):
+        fill_funcs = [compile_template(el) for el in (obj.start, obj.stop, obj.step)]
+        return lambda tensors: slice(*[f(tensors) for f in fill_funcs])
+    else:
+        return lambda tensors: template_insert_recursively(obj, tensors)
@@ -0,0 +1,156 @@
+import contextlib
+from typing import List, Optional
+
+import numpy as np
+
+
+class DataMovementRecord:
+    def __init__(self, kind, pytorch_node, shape, dtype, channel_ordering_strategy):
+        self.kind = kind
+        self.pytorch_node = pytorch_node
+        self.shape = shape
+        self.dtype = dtype
+        self.channel_ordering_strategy = channel_ordering_strategy
+
+    @property
+    def num_bytes(self) -> Optional[int]:
+        # Size of the tensor written by the op, unknown for dynamic shapes
+        if None in self.shape:
+            return None
+        return int(np.prod(self.shape, dtype=np.int64)) * self.dtype.size
+
+    def node_str(self):
+        if self.pytorch_node is None:
+            return '<outputs>'
+        return format_node(self.pytorch_node)
+
+    def strategy_str(self):
+        if self.channel_ordering_strategy is None:
+            return '-'
+        return self.channel_ordering_strategy.name
+
+    def __str__(self):
+        num_bytes = self.num_bytes
+        bytes_str = '?' if num_bytes is None else format_bytes(num_bytes)
+        shape_str = ','.join('?' if s is None else str(s) for s in self.shape)
+        return f'{self.kind:<9} {self.dtype.name}<{shape_str}> {bytes_str:>10}  {self.strategy_str():<33} {self.node_str()}'
+
+
+def format_node(node):
+    summary = node.traceback_summary
+    return f'{node.get_type().__name__}[{node.module_name}] File "{summary.filename}", line {summary.lineno}'
+
+
+def format_bytes(num_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if num_bytes < 1024 or unit == 'GB':
+            break
+        num_bytes /= 1024
+    return f'{num_bytes:.1f} {unit}'
+
+
+class DataMovementTracker:
+    """Records every transpose, reshape and cast emitted while the final graph is built,
+    along with the pytorch node and the channel ordering strategy responsible for it.
+    Only ops emitted through the layout helpers (`_transpose`, `_reshape` and the like) and input casts are seen,
+    converters calling tf ops directly are not accounted for.
+    """
+
+    kinds = ('transpose', 'reshape', 'cast')
+
+    _tracking_enabled = False
+    _records: List[DataMovementRecord] = []
+    _tensors = []
+    _node_stack = []
+    _strategy_stack = []
+
+    @staticmethod
+    @contextlib.contextmanager
+    def tracking():
+        """Records data movement ops emitted inside the block, which are then retrieved with `collect`"""
+        DataMovementTracker._tracking_enabled = True
+        DataMovementTracker._records = []
+        DataMovementTracker._tensors = []
+        DataMovementTracker._node_stack = []
+        DataMovementTracker._strategy_stack = []
+        try:
+            yield
+        finally:
+            DataMovementTracker._tracking_enabled = False
+
+    @staticmethod
+    def collect(keras_model) -> List[DataMovementRecord]:
+        # Ops that ended up disconnected from the outputs are not part of the model
+        model_layers = {id(layer) for layer in keras_model.layers}
+
+        def is_in_model(tensor):
+            keras_history = getattr(tensor, '_keras_history', None)
+            return keras_history is None or id(keras_history.layer) in model_layers
+
+        records = [r for r, t in zip(DataMovementTracker._records, DataMovementTracker._tensors) if is_in_model(t)]
+        DataMovementTracker._records = []
+        DataMovementTracker._tensors = []
+        return records
+
+    @staticmethod
+    @contextlib.contextmanager
+    def node(pytorch_node):
+        """Attributes ops emitted inside the block to `pytorch_node`"""
+        DataMovementTracker._node_stack.append(pytorch_node)
+        try:
+            yield
+        finally:
+            DataMovementTracker._node_stack.pop()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def strategy(channel_ordering_strategy):
+        """Attributes ops emitted inside the block to `channel_ordering_strategy`"""
+        DataMovementTracker._strategy_stack.append(channel_ordering_strategy)
+        try:
+            yield
+        finally:
+            DataMovementTracker._strategy_stack.pop()
+
+    @staticmethod
+    def record(kind, tensor):
+        if not DataMovementTracker._tracking_enabled:
+            return
+        node_stack = DataMovementTracker._node_stack
+        strategy_stack = DataMovementTracker._strategy_stack
+        record = DataMovementRecord(
+            kind,
+            node_stack[-1] if node_stack else None,
+            tuple(tensor.shape.as_list()) if tensor.shape.rank is not None else (None,),
+            tensor.dtype,
+            strategy_stack[-1] if strategy_stack else None,
+        )
+        DataMovementTracker._records.append(record)
+        DataMovementTracker._tensors.append(tensor)
+
+
+class DataMovementReport:
+    def __init__(self, records: List[DataMovementRecord]):
+        self.records = records
+
+    def totals(self):
+        totals = {}
+        for kind in DataMovementTracker.kinds:
+            records = [r for r in self.records if r.kind == kind]
+            num_bytes = sum(r.num_bytes for r in records if r.num_bytes is not None)
+            is_partial = any(r.num_bytes is None for r in records)
+            totals[kind] = (len(records), num_bytes, is_partial)
+        return totals
+
+    def totals_str(self):
+        parts = []
+        for kind, (num, num_bytes, is_partial) in self.totals().items():
+            parts.append(f'{num} {kind}{"s" if num != 1 else ""} ({">=" if is_partial else ""}{format_bytes(num_bytes)})')
+        return ', '.join(parts)
+
+    def __str__(self):
+        lines = ['Data movement (op, tensor, bytes per inference, channel ordering strategy, pytorch node),',
+                 'counting only ops emitted through nobuco\'s layout helpers:']
+        lines += ['    ' + str(r) for r in self.records]
+        lines += ['Total: ' + self.totals_str()]
+        return '\n'.join(lines)
@@ -0,0 +1,282 @@
+from copy import deepcopy
+from typing import Dict, Optional
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from nobuco.entity.pytorch import PytorchNode, PytorchNodeHierarchy, WrappedOp
+from nobuco.trace.trace import Tracer
+
+
+def _make_fused_node(first: PytorchNode, last: PytorchNode, op) -> PytorchNode:
+    fused_node = PytorchNode(WrappedOp(op), first.module_name, first.parent_list, op, first.input_args, first.input_kwargs, last.outputs, False, first.traceback_summary)
+    fused_node.fused_nodes = (first.fused_nodes or [first]) + [last]
+    return fused_node
+
+
+def _is_consumed_elsewhere(name, hierarchy: PytorchNodeHierarchy, consumer_idx):
+    # In-place consumer, later readers of the name see its output
+    if name in hierarchy.children[consumer_idx].node.output_names:
+        return False
+    if name in hierarchy.node.output_names:
+        return True
+    for i, child in enumerate(hierarchy.children):
+        if i != consumer_idx and name in child.node.input_names:
+            return True
+    return False
+
+
+def _fuse_pairs(hierarchy: PytorchNodeHierarchy, fuse_func) -> PytorchNodeHierarchy:
+    """Replaces adjacent children (A, B), where B is the only consumer of A's single output, with `fuse_func(A, B)` if it is not None"""
+    children = [_fuse_pairs(child, fuse_func) for child in hierarchy.children]
+    hierarchy = PytorchNodeHierarchy(hierarchy.node, children)
+
+    fused_children = []
+    i = 0
+    while i < len(children):
+        fused = None
+        if i + 1 < len(children):
+            first, second = children[i].node, children[i + 1].node
+            if len(first.output_names) == 1 and first.output_names == second.input_names[:1] \
+                    and not _is_consumed_elsewhere(first.output_names[0], hierarchy, i + 1):
+                fused = fuse_func(first, second)
+
+        if fused is not None:
+            # A fused pair can be fused further with the next node
+            children[i + 1] = PytorchNodeHierarchy(fused, [])
+        else:
+            fused_children.append(children[i])
+        i += 1
+
+    hierarchy.children = fused_children
+    return hierarchy
+
+
+def _fold_batch_norm_weights(layer, bn: nn.modules.batchnorm._BatchNorm):
+    scale = bn.running_var.add(bn.eps).rsqrt()
+    shift = -bn.running_mean * scale
+    if bn.affine:
+        scale = scale * bn.weight
+        shift = shift * bn.weight + bn.bias
+
+    if isinstance(layer, nn.ConvTranspose2d):
+        out_dim = 1
+    else:
+        out_dim = 0
+    scale_shape = [1] * layer.weight.dim()
+    scale_shape[out_dim] = -1
+
+    folded = deepcopy(layer)
+    with torch.no_grad():
+        bias = layer.bias if layer.bias is not None else torch.zeros_like(bn.running_mean)
+        folded.weight = nn.Parameter(layer.weight * scale.reshape(scale_shape))
+        folded.bias = nn.Parameter(bias * scale + shift)
+    return folded
+
+
+def fold_batch_norms(node_hierarchy: PytorchNodeHierarchy) -> PytorchNodeHierarchy:
+    """Folds eval-mode BatchNorm into the weights and bias of the preceding Conv1d/Conv2d/ConvTranspose2d/Linear"""
+    pairs = {
+        nn.Conv1d: nn.BatchNorm1d,
+        nn.Conv2d: nn.BatchNorm2d,
+        nn.ConvTranspose2d: nn.BatchNorm2d,
+        nn.Linear: nn.BatchNorm1d,
+    }
+    folded_layers: Dict[tuple, nn.Module] = {}
+
+    def fuse_func(first: PytorchNode, second: PytorchNode):
+        layer, bn = first.get_op(), second.get_op()
+        if type(layer) not in pairs or type(bn) is not pairs[type(layer)]:
+            return None
+        if bn.training or not bn.track_running_stats:
+            return None
+        if isinstance(layer, nn.ConvTranspose2d) and layer.groups != 1:
+            return None
+        # Linear output channels must be the ones BatchNorm1d normalizes
+        if isinstance(layer, nn.Linear) and first.output_tensors[0].dim() != 2:
+            return None
+
+        # Keep layers shared between calls, so that conversion reuses them
+        key = (id(layer), id(bn))
+        if key not in folded_layers:
+            folded_layers[key] = _fold_batch_norm_weights(layer, bn)
+        return _make_fused_node(first, second, folded_layers[key])
+
+    return _fuse_pairs(node_hierarchy, fuse_func)
+
+
+
+class FusedActivation(nn.Module):
+    """Layer followed by an elementwise activation, converted as a single Keras layer where possible"""
+
+    activation_funcs = {
+        'relu': F.relu,
+        'relu6': F.relu6,
+        'sigmoid': torch.sigmoid,
+        'tanh': torch.tanh,
+    }
+
+    def __init__(self, layer: nn.Module, activation: str, layer_converter):
+        super().__init__()
+        self.layer = layer
+        self.activation = activation
+        # Converter of the layer from the conversion's converter dict
+        self.layer_converter = layer_converter
+
+    def forward(self, input):
+        return self.activation_funcs[self.activation](self.layer(input))
+
+
+def _get_activation(node: PytorchNode) -> Optional[str]:
+    op = node.get_op()
+    args = node.input_args[1:]
+    kwargs = node.input_kwargs
+
+    if op in [Tracer.op_unwrap(f) for f in (F.relu, torch.relu, torch.relu_, torch.Tensor.relu, torch.Tensor.relu_)] or isinstance(op, nn.ReLU):
+        return 'relu'
+    elif op in [Tracer.op_unwrap(f) for f in (torch.sigmoid, torch.Tensor.sigmoid, F.sigmoid)] or isinstance(op, nn.Sigmoid):
+        return 'sigmoid'
+    elif op in [Tracer.op_unwrap(f) for f in (torch.tanh, torch.Tensor.tanh, F.tanh)] or isinstance(op, nn.Tanh):
+        return 'tanh'
+    elif op is Tracer.op_unwrap(F.relu6):
+        return 'relu6'
+    elif isinstance(op, nn.Hardtanh):
+        min_val, max_val = op.min_val, op.max_val
+    elif op is Tracer.op_unwrap(F.hardtanh):
+        min_val = args[0] if len(args) > 0 else kwargs.get('min_val', -1.0)
+        max_val = args[1] if len(args) > 1 else kwargs.get('max_val', 1.0)
+    else:
+        return None
+
+    if (min_val, max_val) == (0, 6):
+        return 'relu6'
+    return None
+
+
+def fuse_activations(node_hierarchy: PytorchNodeHierarchy, converter_dict) -> PytorchNodeHierarchy:
+    """Merges Conv1d/Conv2d/ConvTranspose2d/Linear with the activation that follows it"""
+    layer_types = (nn.Conv1d, nn.Conv2d, nn.ConvTranspose2d, nn.Linear)
+    fused_layers: Dict[tuple, nn.Module] = {}
+
+    if FusedActivation not in converter_dict:
+        return node_hierarchy
+
+    def fuse_func(first: PytorchNode, second: PytorchNode):
+        layer = first.get_op()
+        if type(layer) not in layer_types or type(layer) not in converter_dict:
+            return None
+        if len(first.input_args) != 1 or len(first.input_kwargs) > 0:
+            return None
+
+        activation = _get_activation(second)
+        if activation is None:
+            return None
+
+        # Keep layers shared between calls, so that conversion reuses them
+        key = (id(layer), activation)
+        if key not in fused_layers:
+            fused_layers[key] = FusedActivation(layer, activation, converter_dict[type(layer)])
+        return _make_fused_node(first, second, fused_layers[key])
+
+    return _fuse_pairs(node_hierarchy, fuse_func)
+
+
+class CoalescedSetItem(nn.Module):
+    """Chain of `__setitem__` writes into disjoint static slices of one tensor, converted as a single op"""
+
+    def __init__(self, keys):
+        super().__init__()
+        self.keys = keys
+
+    def forward(self, tensor, *values):
+        for key, value in zip(self.keys, values):
+            tensor[key] = value
+        return tensor
+
+
+def _is_setitem(node: PytorchNode):
+    return node.get_op() is Tracer.op_unwrap(torch.Tensor.__setitem__)
+
+
+def _key_index_sets(key, shape) -> Optional[list]:
+    """Indices a `__setitem__` key writes to along each axis, or None if the key is not static"""
+    key = key if isinstance(key, tuple) else (key,)
+    if any(not (isinstance(k, (int, slice)) or k is Ellipsis) for k in key):
+        return None
+    if Ellipsis in key:
+        i = key.index(Ellipsis)
+        key = key[:i] + (slice(None),) * (len(shape) - len(key) + 1) + key[i + 1:]
+    key = key + (slice(None),) * (len(shape) - len(key))
+
+    index_sets = []
+    for k, size in zip(key, shape):
+        if isinstance(k, int):
+            index_sets.append({k % size})
+        else:
+            index_sets.append(set(range(*k.indices(size))))
+    return index_sets
+
+
+def _are_disjoint(index_sets1, index_sets2):
+    return any(len(s1 & s2) == 0 for s1, s2 in zip(index_sets1, index_sets2))
+
+
+def coalesce_setitems(node_hierarchy: PytorchNodeHierarchy, converter_dict) -> PytorchNodeHierarchy:
+    """Replaces chains of `__setitem__` writes into disjoint static slices of the same tensor with a single `CoalescedSetItem`.
+    Nodes in between must neither use the tensor nor modify the assigned values, the chain is then moved to its last write.
+    """
+    if CoalescedSetItem not in converter_dict:
+        return node_hierarchy
+
+    children = [coalesce_setitems(child, converter_dict) for child in node_hierarchy.children]
+    hierarchy = PytorchNodeHierarchy(node_hierarchy.node, children)
+
+    def is_static_setitem(node: PytorchNode):
+        return _is_setitem(node) and len(node.input_args) == 3 \
+            and _key_index_sets(node.input_args[1], node.input_args[0].shape) is not None
+
+    chains = {}
+    merged = set()
+    for i, child in enumerate(children):
+        node = child.node
+        if i in merged or not is_static_setitem(node):
+            continue
+
+        base_name = node.input_names[0]
+        shape = node.input_args[0].shape
+        chain = [i]
+        chain_index_sets = [_key_index_sets(node.input_args[1], shape)]
+        value_names = set(node.input_names[1:])
+        for j in range(i + 1, len(children)):
+            other = children[j].node
+            if is_static_setitem(other) and other.input_names[0] == base_name:
+                index_sets = _key_index_sets(other.input_args[1], shape)
+                if not all(_are_disjoint(index_sets, s) for s in chain_index_sets):
+                    break
+                chain.append(j)
+                chain_index_sets.append(index_sets)
+                value_names.update(other.input_names[1:])
+            elif base_name in other.input_names or base_name in other.output_names \
+                    or len(value_names & set(other.output_names)) > 0:
+                break
+
+        if len(chain) > 1:
+            chains[chain[-1]] = chain
+            merged.update(chain)
+
+    coalesced_children = []
+    for i, child in enumerate(children):
+        if i in chains:
+            nodes = [children[j].node for j in chains[i]]
+            first, last = nodes[0], nodes[-1]
+            op = CoalescedSetItem([node.input_args[1] for node in nodes])
+            values = [node.input_args[2] for node in nodes]
+            coalesced_node = PytorchNode(WrappedOp(op), first.module_name, first.parent_list, op, (first.input_args[0], *values), {}, last.outputs, True, last.traceback_summary)
+            coalesced_node.fused_nodes = nodes
+            coalesced_children.append(PytorchNodeHierarchy(coalesced_node, []))
+        elif i not in merged:
+            coalesced_children.append(child)
+
+    hierarchy.children = coalesced_children
+    return hierarchy
@@ -7,16 +7,17 @@ from nobuco.trace.trace import Tracer
 
 
 class Pytorch2KerasNodeConverter:
-    def __init__(self, convert_func, validate_func, channel_ordering_strategy, autocast, reusable):
+    def __init__(self, convert_func, validate_func, channel_ordering_strategy, autocast, reusable, deterministic):
         self.convert_func = convert_func
         self.validate_func = validate_func
         self.channel_ordering_strategy = channel_ordering_strategy
         self.autocast = autocast
         self.reusable = reusable
+        self.deterministic = deterministic
 
     def convert(self, *args, **kwargs):
         converter_result_func = self.convert_func(*args, **kwargs)
-        return ChangeOrderingLayer(converter_result_func, self.channel_ordering_strategy, self.autocast)
+        return ChangeOrderingLayer(converter_result_func, self.channel_ordering_strategy, self.autocast, deterministic=self.deterministic)
 
     def validate(self, keras_op, pytorch_op, input_tensors_pt, args_pt, kwargs_pt, is_training=False):
         raise self.validate_func(keras_op, pytorch_op, input_tensors_pt, args_pt, kwargs_pt, is_training=False)
@@ -27,9 +28,10 @@ def converter(*ops,
               channel_ordering_strategy=ChannelOrderingStrategy.FORCE_TENSORFLOW_ORDER,
               autocast: bool = False,
               reusable = True,
+              deterministic: bool = True,
               ):
     def inner(convert_func: Callable) -> Pytorch2KerasNodeConverter:
-        node_converter = Pytorch2KerasNodeConverter(convert_func, validate_func, channel_ordering_strategy, autocast, reusable)
+        node_converter = Pytorch2KerasNodeConverter(convert_func, validate_func, channel_ordering_strategy, autocast, reusable, deterministic)
         for op in ops:
             op = Tracer.op_unwrap(op)
             CONVERTER_DICT[op] = node_converter
@@ -37,7 +39,24 @@ def converter(*ops,
     return inner
 
 
+def set_conversion_note(func: Callable, note: str) -> Callable:
+    """Attaches a note to the function returned by a converter, e.g. to tell which lowering was chosen.
+    The note is shown next to the node in the conversion trace.
+    """
+    func.conversion_note = note
+    return func
+
+
 def converter_unregister(op):
     op = Tracer.op_unwrap(op)
     if op in CONVERTER_DICT:
         del CONVERTER_DICT[op]
+
+
+def set_activation_hook(func: Callable, hook: Callable[[str], bool]) -> Callable:
+    """Declares that the function returned by a converter can apply an elementwise activation itself,
+    e.g. as the `activation` of the Keras layer it creates. Activation fusion calls `hook(activation)`
+    with a Keras activation name before the function is called, the hook returns whether it applies it.
+    """
+    func.activation_hook = hook
+    return func
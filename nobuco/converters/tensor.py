@@ -1,5 +1,9 @@
+import numbers
+
 import tensorflow as tf
 
+from nobuco.converters.data_movement import DataMovementTracker
+
 
 def _dim_make_positive(dim, n_dims, add_one=False):
     if dim < 0:
@@ -70,12 +74,146 @@ def is_identity_perm(perm):
 
 # FIXME: find a better place for these
 
+class LayoutPeephole:
+    """Folds chains of transposes and reshapes as they are emitted.
+
+    Every emitted transpose/reshape remembers the tensor it was derived from.
+    A transpose of a transposed tensor is applied to the origin with the composed permutation (and vanishes if it's an identity),
+    a reshape of a reshaped tensor is applied to the origin directly.
+    Both are pure data movement, so the outputs stay bit-identical.
+    """
+
+    enabled = True
+    num_requested = {}
+
+    layer_kinds = {
+        'transpose': ('compat.v1.transpose', 'transpose', 'Permute'),
+        'reshape': ('reshape', 'compat.v1.squeeze', 'squeeze', 'expand_dims', 'Reshape', 'Flatten'),
+    }
+
+    @staticmethod
+    def reset():
+        LayoutPeephole.num_requested = {kind: 0 for kind in LayoutPeephole.layer_kinds.keys()}
+
+    @staticmethod
+    def count(kind):
+        LayoutPeephole.num_requested[kind] += 1
+
+    @staticmethod
+    def summary(keras_model):
+        def layer_kind(layer):
+            return getattr(layer, 'symbol', layer.__class__.__name__)
+
+        model_layer_kinds = [layer_kind(layer) for layer in keras_model.layers]
+        summary = []
+        for kind, layer_kinds in LayoutPeephole.layer_kinds.items():
+            num_in_model = sum(k in layer_kinds for k in model_layer_kinds)
+            summary.append(f'{kind} {LayoutPeephole.num_requested[kind]} -> {num_in_model}')
+        return ', '.join(summary)
+
+
+LayoutPeephole.reset()
+
+
+def _transpose(x, perm):
+    perm = list(perm)
+    if LayoutPeephole.enabled and hasattr(x, 'transpose_origin'):
+        origin, origin_perm = x.transpose_origin
+        x, perm = origin, perm_compose(perm, origin_perm)
+
+    LayoutPeephole.count('transpose')
+    if is_identity_perm(perm):
+        # Fresh tensor object, as the caller is free to re-annotate it
+        return tf.identity(x)
+
+    result = tf.transpose(x, perm)
+    result.transpose_origin = (x, perm)
+    DataMovementTracker.record('transpose', result)
+    return result
+
+
+def _shape_list(x):
+    """Static dimensions as ints, dynamic ones as scalar tensors"""
+    shape = x.shape.as_list()
+    if None not in shape:
+        return shape
+    dynamic_shape = tf.shape(x)
+    return [s if s is not None else dynamic_shape[i] for i, s in enumerate(shape)]
+
+
+def _reshape_origin(x):
+    if LayoutPeephole.enabled and hasattr(x, 'reshape_origin'):
+        return x.reshape_origin
+    return x
+
+
+def _reshape_is_noop(x, shape):
+    x_shape = x.shape.as_list()
+    if None in x_shape or len(x_shape) != len(shape) or not all(isinstance(s, numbers.Integral) for s in shape):
+        return False
+    return sum(s == -1 for s in shape) <= 1 and all(s == -1 or s == xs for s, xs in zip(shape, x_shape))
+
+
+def _reshape_target(shape):
+    shape = list(shape)
+    if shape.count(None) > 1:
+        return None
+    return [-1 if s is None else s for s in shape]
+
+
+def _reshape(x, shape):
+    LayoutPeephole.count('reshape')
+    x = _reshape_origin(x)
+    if LayoutPeephole.enabled and _reshape_is_noop(x, shape):
+        # Fresh tensor object, as the caller is free to re-annotate it
+        return tf.identity(x)
+
+    result = tf.reshape(x, shape)
+    result.reshape_origin = x
+    DataMovementTracker.record('reshape', result)
+    return result
+
+
+def _reshape_or(x, shape, func):
+    """Emits `func(x)`, or a single reshape of the origin if `x` is the tail of a reshape chain"""
+    origin = _reshape_origin(x)
+    target = _reshape_target(shape)
+    if origin is not x and target is not None:
+        return _reshape(origin, target)
+
+    LayoutPeephole.count('reshape')
+    result = func(x)
+    result.reshape_origin = origin
+    DataMovementTracker.record('reshape', result)
+    return result
+
+
+def _squeeze(x, axis=None):
+    shape = x.shape.as_list()
+    if axis is None:
+        axes = [i for i, s in enumerate(shape) if s == 1]
+    else:
+        axes = _dims_make_positive(_ensure_iterable(axis), len(shape))
+    if any(shape[i] is None for i in axes):
+        # Whether the axis is removed is only known at runtime
+        return tf.squeeze(x, axis=axis)
+    squeezed_shape = [s for i, s in enumerate(shape) if not (i in axes and s == 1)]
+    return _reshape_or(x, squeezed_shape, lambda x: tf.squeeze(x, axis=axis))
+
+
+def _expand_dims(x, axis):
+    shape = x.shape.as_list()
+    axis = _dim_make_positive(axis, len(shape), add_one=True)
+    expanded_shape = shape[:axis] + [1] + shape[axis:]
+    return _reshape_or(x, expanded_shape, lambda x: tf.expand_dims(x, axis=axis))
+
+
 def _permute(perm):
     if is_identity_perm(perm):
         return lambda x: x
     else:
         def func(x):
-            return tf.transpose(x, perm)
+            return _transpose(x, perm)
         return func
 
 
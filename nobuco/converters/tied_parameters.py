@@ -0,0 +1,118 @@
+import contextlib
+from collections import defaultdict
+from typing import List, Optional
+
+import torch
+from torch import nn
+
+from nobuco.converters.data_movement import format_bytes
+from nobuco.layers.weight import WeightLayer
+from nobuco.util import get_torch_tensor_identifier
+
+
+class TiedParameterRecord:
+    def __init__(self, param_names, weight_layer, num_uses, num_bytes):
+        self.param_names = param_names
+        self.weight_layer = weight_layer
+        self.num_uses = num_uses
+        self.num_bytes = num_bytes
+
+    @property
+    def num_bytes_saved(self) -> int:
+        return max(self.num_uses - 1, 0) * self.num_bytes
+
+    def __str__(self):
+        names_str = ' = '.join(self.param_names)
+        if self.num_uses < 2:
+            return f'{names_str} -> not shared, converted separately by converters without tied parameter support'
+        note = ', other uses hold copies' if self.num_uses < len(self.param_names) else ''
+        return f'{names_str} -> {self.weight_layer.name} shared by {self.num_uses} ops ({format_bytes(self.num_bytes_saved)} saved{note})'
+
+
+class TiedParameterReport:
+    def __init__(self, records: List[TiedParameterRecord]):
+        self.records = records
+
+    def __str__(self):
+        lines = ['Tied parameters:']
+        lines += ['    ' + str(r) for r in self.records]
+        return '\n'.join(lines)
+
+
+class TiedParameters:
+    """Pytorch parameters shared by several modules (tied weights) are converted into a single variable.
+
+    Converters that support it ask for `get_weight_layer(param)` instead of baking the parameter into their own Keras layer.
+    The weight layer is created on the first request and returned by every request after that,
+    so converters share the variable from construction on, each in the layout it needs (e.g. transposed for a tied output head).
+    Converters without support keep making their own copy, which the report points out.
+    """
+
+    _state = None
+
+    @staticmethod
+    @contextlib.contextmanager
+    def scope(module):
+        """Tracks tied parameters of `module` for the duration of a conversion, the enclosing conversion's state is restored on exit"""
+        param_names = defaultdict(list)
+        params = {}
+        if isinstance(module, nn.Module):
+            for name, param in module.named_parameters(remove_duplicate=False):
+                # Parameters passed to functional ops are recorded as clones that keep the original identifier
+                identifier = get_torch_tensor_identifier(param)
+                param_names[identifier].append(name)
+                params[identifier] = param
+
+        state_prev = TiedParameters._state
+        TiedParameters._state = {
+            'param_names': {identifier: names for identifier, names in param_names.items() if len(names) > 1},
+            'params': params,
+            'weight_layers': {},
+            'num_uses': defaultdict(int),
+        }
+        try:
+            yield
+        finally:
+            TiedParameters._state = state_prev
+
+    @staticmethod
+    def is_tied(param: Optional[torch.Tensor]) -> bool:
+        state = TiedParameters._state
+        return state is not None and param is not None and get_torch_tensor_identifier(param) in state['param_names']
+
+    @staticmethod
+    def get_weight_layer(param: torch.Tensor) -> WeightLayer:
+        """Keras layer outputting the parameter's variable in pytorch's layout, one per parameter of the converted module
+        (e.g. for a module called several times), and one per tied parameter however many modules share it.
+        Other parameters get a layer of their own.
+        """
+        state = TiedParameters._state
+        identifier = get_torch_tensor_identifier(param)
+        if state is None or identifier not in state['params']:
+            weight = param.detach().numpy()
+            weight_layer = WeightLayer(weight.shape, dtype=weight.dtype)
+            weight_layer.set_weights([weight])
+            return weight_layer
+
+        weight_layers = state['weight_layers']
+        if identifier not in weight_layers:
+            weight = state['params'][identifier].detach().numpy()
+            name = 'tied_' + state['param_names'][identifier][0].replace('.', '_') if TiedParameters.is_tied(param) else None
+            weight_layer = WeightLayer(weight.shape, dtype=weight.dtype, name=name)
+            weight_layer.set_weights([weight])
+            weight_layers[identifier] = weight_layer
+        if TiedParameters.is_tied(param):
+            state['num_uses'][identifier] += 1
+        return weight_layers[identifier]
+
+    @staticmethod
+    def report(keras_model) -> TiedParameterReport:
+        state = TiedParameters._state
+        model_layers = {id(layer) for layer in keras_model.layers}
+        records = []
+        for identifier, names in state['param_names'].items():
+            weight_layer = state['weight_layers'].get(identifier, None)
+            num_uses = state['num_uses'][identifier] if weight_layer is not None and id(weight_layer) in model_layers else 0
+            param = state['params'][identifier]
+            records.append(TiedParameterRecord(names, weight_layer, num_uses, param.numel() * param.element_size()))
+        return TiedParameterReport(records)
@@ -3,6 +3,7 @@ import sys
 import tensorflow as tf
 
 from nobuco.commons import TF_TENSOR_CLASSES
+from nobuco.converters.data_movement import DataMovementTracker
 from nobuco.util import collect_recursively, replace_recursively_func
 
 TF_TYPE_PRIORITY_LIST = [
@@ -42,6 +43,7 @@ def tf_cast_recursively(inputs, type_priority_list=None):
             obj_cast = tf.cast(obj, target_dtype)
             if hasattr(obj, 'channel_order'):
                 obj_cast.channel_order = obj.channel_order
+            DataMovementTracker.record('cast', obj_cast)
             return obj_cast
         else:
             return obj
@@ -23,12 +23,15 @@ class ValidationResult:
 
 
 class ConversionResult:
-    def __init__(self, converted_manually, is_implemented=True, is_duplicate=False, connectivity_status=None, converter=None):
+    def __init__(self, converted_manually, is_implemented=True, is_duplicate=False, connectivity_status=None, converter=None, pruned_nodes=None, folded_nodes=None, note=None):
         self.converted_manually = converted_manually
         self.is_implemented = is_implemented
         self.is_duplicate = is_duplicate
         self.connectivity_status = connectivity_status
         self.converter = converter
+        self.pruned_nodes = [] if pruned_nodes is None else pruned_nodes
+        self.folded_nodes = [] if folded_nodes is None else folded_nodes
+        self.note = note
 
     def get_converter_link(self):
         if self.converter is None:
@@ -69,6 +69,8 @@ class PytorchNode:
         self.outputs = outputs
         self.is_inplace = is_inplace
         self.traceback_summary = traceback_summary
+        # Original nodes replaced by this one in fusion passes
+        self.fused_nodes = []
 
     def make_inputs_template(self):
         args_template, kwargs_template = make_template_recursively((self.input_args, self.input_kwargs))
@@ -120,6 +122,7 @@ class PytorchNodeHierarchy:
                 tensor_name_assigner: TensorNameAssigner = None,
                 stylizer=None,
                 debug_traces: TraceLevel = TraceLevel.NEVER,
+                data_movement_report=None,
                 ) -> str:
 
         if tier_statuses is None:
@@ -182,6 +185,7 @@ class PytorchNodeHierarchy:
         is_disconnected = None
         connectivity_status = None
         is_inplace = None
+        note = None
 
         validation_result = validation_result_dict.get(self.node, None)
         if validation_result is not None:
@@ -196,6 +200,7 @@ class PytorchNodeHierarchy:
                 connectivity_status = conversion_result.connectivity_status
                 is_disconnected = not conversion_result.connectivity_status.is_connected()
             is_inplace = self.node.is_inplace
+            note = conversion_result.note
 
         result = ''
 
@@ -218,6 +223,9 @@ class PytorchNodeHierarchy:
             result += '    ' + stylizer.stylize('Tensor', st) + " — this input is a parameter / constant\n"
             st = stylizer.style_grey
             result += '    ' + stylizer.stylize('Tensor', st) + " — this tensor is useless\n"
+            result += '    ' + 'A+B' + ' — nodes fused into one\n'
+            if data_movement_report is not None:
+                result += '    ' + 'Data movement: ' + data_movement_report.totals_str() + '\n'
             result += '\n'
 
         style = stylizer.validation_status_to_style(status, converted_manually)
@@ -258,7 +266,7 @@ class PytorchNodeHierarchy:
 
             return res
 
-        if status == ValidationStatus.INACCURATE or is_disconnected or is_inplace:
+        if status == ValidationStatus.INACCURATE or is_disconnected or is_inplace or note:
             result += get_tier_str(tier_statuses, is_additional=True)
 
             if status == ValidationStatus.INACCURATE:
@@ -267,6 +275,8 @@ class PytorchNodeHierarchy:
                 result += stylizer.stylize(f' (!) Subgraph disconnected ', stylizer.style_inverse) + ' '
             if is_inplace:
                 result += stylizer.stylize(f' (!) Inplace ', stylizer.style_inplace) + ' '
+            if note:
+                result += stylizer.stylize(f' (i) {note} ', stylizer.style_grey) + ' '
             result += '\n'
 
         are_problems = status == ValidationStatus.FAIL or status == ValidationStatus.INACCURATE or is_disconnected
@@ -293,7 +303,7 @@ class PytorchNodeHierarchy:
         result += get_tier_str(tier_statuses)
         result += \
             stylizer.stylize(
-                f'{"*" if is_duplicate else ""}' + f'{self.node.get_type().__name__}' + f'[{self.node.module_name}]',
+                f'{"*" if is_duplicate else ""}' + '+'.join(n.get_type().__name__ for n in self.node.fused_nodes or [self.node]) + f'[{self.node.module_name}]',
                 style
             ) + \
             f'{to_str(FunctionArgs(self.node.input_args, self.node.input_kwargs), connectivity_status, parent_connectivity_status, is_input=True)}' + \
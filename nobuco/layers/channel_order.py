@@ -1,5 +1,6 @@
 from nobuco.commons import ChannelOrderingStrategy, ChannelOrder, TF_TENSOR_CLASSES
 from nobuco.converters.channel_ordering import set_channel_order, get_channel_order
+from nobuco.converters.data_movement import DataMovementTracker
 from nobuco.converters.tensor import _permute, perm_keras2pytorch, perm_pytorch2keras
 from nobuco.converters.type_cast import tf_cast_recursively
 from nobuco.util import collect_recursively, replace_recursively_func
@@ -22,12 +23,18 @@ class SetOrderLayer:
 
 
 class ChangeOrderingLayer:
-    def __init__(self, func, channel_ordering_strategy, autocast):
+    def __init__(self, func, channel_ordering_strategy, autocast, deterministic=True):
         self.func = func
         self.channel_ordering_strategy = channel_ordering_strategy
         self.autocast = autocast
+        # Non-deterministic ops are never merged or folded into constants
+        self.deterministic = deterministic
 
     def __call__(self, *args, **kwargs):
+        with DataMovementTracker.strategy(self.channel_ordering_strategy):
+            return self._call(*args, **kwargs)
+
+    def _call(self, *args, **kwargs):
         tf_assert_has_attr_recursively((args, kwargs), 'channel_order')
 
         strategy = self.channel_ordering_strategy
@@ -1,9 +1,177 @@
+from collections import defaultdict, deque
+
 from nobuco.commons import TF_TENSOR_CLASSES, ConnectivityStatus
+from nobuco.converters.data_movement import DataMovementTracker
 from nobuco.layers.weight import WeightLayer
-from nobuco.converters.channel_ordering import TensorPlaceholder, template_insert_recursively
+from nobuco.converters.channel_ordering import TensorPlaceholder, compile_template, t_pytorch2keras
 from nobuco.util import collect_recursively
 
 
+def _freeze(obj):
+    # Hashable view of a template, objects that cannot be hashed are only equal to themselves
+    if isinstance(obj, TensorPlaceholder):
+        return TensorPlaceholder, obj.idx
+    elif isinstance(obj, (list, tuple)):
+        return type(obj), tuple(_freeze(el) for el in obj)
+    elif isinstance(obj, dict):
+        return dict, tuple((_freeze(k), _freeze(v)) for k, v in obj.items())
+    elif isinstance(obj, slice):
+        return slice, _freeze(obj.start), _freeze(obj.stop), _freeze(obj.step)
+    try:
+        hash(obj)
+        return type(obj), obj
+    except TypeError:
+        return id, id(obj)
+
+
+class PlanStep:
+    def __init__(self, op, input_slots, output_slots, fill_inputs, pytorch_node, cse_key=None):
+        self.op = op
+        self.input_slots = input_slots
+        self.output_slots = output_slots
+        self.fill_inputs = fill_inputs
+        self.pytorch_node = pytorch_node
+        self.cse_key = cse_key
+
+    @staticmethod
+    def make_cse_key(op, templates, pytorch_node):
+        if not getattr(op, 'deterministic', False):
+            return None
+        # Functional ops are converted anew for every call, modules and constants reuse the same op
+        if pytorch_node is not None and not pytorch_node.is_module():
+            op_key = pytorch_node.get_op()
+        else:
+            op_key = id(op)
+        return op_key, _freeze(templates)
+
+
+class ExecutionPlan:
+    """Flat sequence of leaf ops with nested containers inlined.
+    Tensors live in integer-indexed slots instead of being looked up by name.
+    """
+
+    cse_enabled = True
+
+    def __init__(self):
+        self.num_slots = 0
+        self.constants = []
+        self.steps = []
+        self.input_slots = []
+        self.output_slots = []
+        self.fill_outputs = None
+        self.num_merged_steps = 0
+
+    def new_slot(self):
+        slot = self.num_slots
+        self.num_slots += 1
+        return slot
+
+    def eliminate_common_subexpressions(self):
+        """Merges steps that run the same op with the same inputs and non-tensor arguments."""
+        slot_aliases = {}
+        seen_steps = {}
+        steps = []
+        for step in self.steps:
+            step.input_slots = [slot_aliases.get(slot, slot) for slot in step.input_slots]
+            if step.cse_key is not None and len(step.output_slots) > 0:
+                key = (step.cse_key, tuple(step.input_slots))
+                prev_step = seen_steps.get(key)
+                if prev_step is not None and len(prev_step.output_slots) == len(step.output_slots):
+                    for slot, prev_slot in zip(step.output_slots, prev_step.output_slots):
+                        slot_aliases[slot] = prev_slot
+                    continue
+                seen_steps[key] = step
+            steps.append(step)
+
+        self.num_merged_steps += len(self.steps) - len(steps)
+        self.steps = steps
+        self.output_slots = [slot_aliases.get(slot, slot) for slot in self.output_slots]
+
+    def run(self, inputs):
+        slots = [None] * self.num_slots
+
+        for slot, tensor in self.constants:
+            slots[slot] = tensor
+
+        for slot, input in zip(self.input_slots, inputs):
+            slots[slot] = input
+
+        for step in self.steps:
+            args, kwargs = step.fill_inputs([slots[i] for i in step.input_slots])
+            with DataMovementTracker.node(step.pytorch_node):
+                outputs = step.op(*args, **kwargs)
+            output_tensors = collect_recursively(outputs, TF_TENSOR_CLASSES)
+            assert len(step.output_slots) == len(output_tensors)
+
+            for slot, output in zip(step.output_slots, output_tensors):
+                slots[slot] = output
+
+        return self.fill_outputs([slots[i] for i in self.output_slots])
+
+
+class GraphIndex:
+    """Forward and backward adjacency of the ops in a container, keyed by tensor name."""
+
+    def __init__(self, names_list):
+        self.names_list = names_list
+        self.consumers = defaultdict(list)
+        self.producers = defaultdict(list)
+        for op_idx, (input_names, output_names) in enumerate(names_list):
+            for name in input_names:
+                self.consumers[name].append(op_idx)
+            for name in output_names:
+                self.producers[name].append(op_idx)
+
+    def traverse(self, start_names, reverse_graph):
+        adjacency = self.producers if reverse_graph else self.consumers
+
+        traversed_nodes = set(start_names)
+        visited_ops = set()
+        queue = deque(traversed_nodes)
+        while queue:
+            name = queue.popleft()
+            for op_idx in adjacency.get(name, []):
+                if op_idx in visited_ops:
+                    continue
+                visited_ops.add(op_idx)
+
+                input_names, output_names = self.names_list[op_idx]
+                if reverse_graph:
+                    input_names, output_names = output_names, input_names
+
+                for output_name in output_names:
+                    if output_name not in traversed_nodes:
+                        traversed_nodes.add(output_name)
+                        queue.append(output_name)
+
+        used_nodes = set()
+        for op_idx in visited_ops:
+            input_names, output_names = self.names_list[op_idx]
+            if reverse_graph:
+                input_names, output_names = output_names, input_names
+            # Handle in-place ops
+            used_nodes.update(traversed_nodes.intersection(input_names).difference(output_names))
+
+        terminal_nodes = traversed_nodes.difference(used_nodes)
+        return traversed_nodes, terminal_nodes
+
+    def unprovided_names(self, input_names, output_names):
+        """Names consumed before any op produces them, i.e. tensors that come from outside the graph"""
+        first_producer = {}
+        for name, op_indices in self.producers.items():
+            first_producer[name] = op_indices[0]
+
+        input_set = set(input_names)
+        unprovided = set()
+        for name, op_indices in self.consumers.items():
+            if name not in input_set and first_producer.get(name, len(self.names_list)) >= op_indices[0]:
+                unprovided.add(name)
+        for name in output_names:
+            if name not in input_set and name not in first_producer:
+                unprovided.add(name)
+        return list(unprovided)
+
+
 class TransientContainer:
     def __init__(self, op_descr_list, input_names, output_names, outputs_template, constants_dict=None, disconnected_tensors_descr_list=None):
         self.op_descr_list = op_descr_list
@@ -12,41 +180,38 @@ class TransientContainer:
         self.outputs_template = outputs_template
         self.constants_dict = {} if constants_dict is None else constants_dict
         self.disconnected_tensors_descr_list = [] if disconnected_tensors_descr_list is None else disconnected_tensors_descr_list
+        self._plan = None
+        self._graph_index = None
 
     @classmethod
-    def create(cls, input_names, output_names, outputs_template, disconnected_tensors_keras, children_converted_nodes, constants_to_variables: bool):
-        children_descr_list = [(node.input_names, node.output_names, node.keras_op, node.pytorch_node.make_inputs_template()) for node in children_converted_nodes]
+    def create(cls, input_names, output_names, outputs_template, disconnected_tensors_keras, children_converted_nodes, constants_to_variables: bool, graph_index=None):
+        children_descr_list = [(node.input_names, node.output_names, node.keras_op, node.pytorch_node.make_inputs_template(), node.pytorch_node) for node in children_converted_nodes]
         if constants_to_variables:
-            const_input_name = input_names[0]
-            disconnected_tensors_descr_list = [([const_input_name], [output_name], WeightLayer.create(t), ([TensorPlaceholder(0)], {})) for output_name, t in disconnected_tensors_keras.items()]
-            return TransientContainer(children_descr_list, input_names, output_names, outputs_template, constants_dict={}, disconnected_tensors_descr_list=disconnected_tensors_descr_list)
+            disconnected_tensors_descr_list = [cls._make_weight_descr(input_names, output_name, t) for output_name, t in disconnected_tensors_keras.items()]
+            container = TransientContainer(children_descr_list, input_names, output_names, outputs_template, constants_dict={}, disconnected_tensors_descr_list=disconnected_tensors_descr_list)
         else:
-            return TransientContainer(children_descr_list, input_names, output_names, outputs_template, constants_dict=disconnected_tensors_keras, disconnected_tensors_descr_list=[])
+            container = TransientContainer(children_descr_list, input_names, output_names, outputs_template, constants_dict=disconnected_tensors_keras, disconnected_tensors_descr_list=[])
+        container._graph_index = graph_index
+        return container
 
-    def _traverse_graph(self, start_names, op_descr_list, reverse_graph):
-        traversed_nodes = set(start_names)
-        used_nodes = set()
-        num_traversed_prev = -1
-        while len(traversed_nodes) > num_traversed_prev:
-            num_traversed_prev = len(traversed_nodes)
+    @staticmethod
+    def _make_weight_descr(input_names, output_name, t):
+        const_input_name = input_names[0]
+        return [const_input_name], [output_name], WeightLayer.create(t), ([TensorPlaceholder(0)], {}), None
 
-            for input_names, output_names, _, _ in op_descr_list:
-                if reverse_graph:
-                    input_names, output_names = output_names, input_names
+    @property
+    def deterministic(self):
+        return all(getattr(op, 'deterministic', True) for _, _, op, _, _ in self.op_descr_list)
 
-                relevant_inputs = set(input_names).intersection(traversed_nodes)
-                if len(relevant_inputs) > 0:
-                    # Handle in-place ops
-                    relevant_inputs = relevant_inputs.difference(output_names)
-                    used_nodes.update(relevant_inputs)
-                    traversed_nodes.update(output_names)
-
-        terminal_nodes = traversed_nodes.difference(used_nodes)
-        return traversed_nodes, terminal_nodes
+    def get_graph_index(self) -> 'GraphIndex':
+        if self._graph_index is None:
+            self._graph_index = GraphIndex([(input_names, output_names) for input_names, output_names, *_ in self.op_descr_list])
+        return self._graph_index
 
     def get_connectivity_status(self) -> ConnectivityStatus:
-        traversed_nodes_forward, graph_outputs = self._traverse_graph(self.input_names, self.op_descr_list, reverse_graph=False)
-        traversed_nodes_backward, graph_inputs = self._traverse_graph(self.output_names, self.op_descr_list, reverse_graph=True)
+        graph_index = self.get_graph_index()
+        traversed_nodes_forward, graph_outputs = graph_index.traverse(self.input_names, reverse_graph=False)
+        traversed_nodes_backward, graph_inputs = graph_index.traverse(self.output_names, reverse_graph=True)
 
         unused_inputs = set(self.input_names).difference(traversed_nodes_backward)
         unreached_outputs = set(self.output_names).difference(traversed_nodes_forward)
@@ -55,24 +220,141 @@ class TransientContainer:
 
         return ConnectivityStatus(unused_inputs, unreached_outputs, unused_nodes, unprovided_inputs)
 
-    def __call__(self, *args, training=False, **kwargs):
-        inputs = collect_recursively((args, kwargs), TF_TENSOR_CLASSES)
+    def eliminate_dead_nodes(self):
+        """Drops ops whose outputs never reach the container outputs, along with constants only they consume.
+        Returns pytorch nodes of the dropped ops.
+        """
+        traversed_nodes_backward, _ = self.get_graph_index().traverse(self.output_names, reverse_graph=True)
 
-        node_dict = self.constants_dict.copy()
+        live_descr_list = []
+        pruned_nodes = []
+        for descr in self.op_descr_list:
+            input_names, output_names, _, _, pytorch_node = descr
+            if traversed_nodes_backward.intersection(output_names):
+                live_descr_list.append(descr)
+            else:
+                pruned_nodes.append(pytorch_node)
 
-        for input, name in zip(inputs, self.input_names):
-            node_dict[name] = input
+        consumed_names = set(self.output_names)
+        for input_names, *_ in live_descr_list:
+            consumed_names.update(input_names)
 
-        for input_names, output_names, op, (args_template, kwargs_template) in (self.disconnected_tensors_descr_list + self.op_descr_list):
-            input_tensors = [node_dict[name] for name in input_names]
-            args, kwargs = template_insert_recursively((args_template, kwargs_template), input_tensors)
-            outputs = op(*args, **kwargs)
-            output_tensors = collect_recursively(outputs, TF_TENSOR_CLASSES)
-            assert len(output_names) == len(output_tensors)
+        self.op_descr_list = live_descr_list
+        self.disconnected_tensors_descr_list = [descr for descr in self.disconnected_tensors_descr_list if consumed_names.intersection(descr[1])]
+        self.constants_dict = {name: t for name, t in self.constants_dict.items() if name in consumed_names}
+        self._graph_index = None
+        self._plan = None
+        return pruned_nodes
+
+    def fold_constants(self, max_bytes, constants_to_variables: bool):
+        """Replaces subgraphs that do not depend on container inputs with their recorded pytorch values.
+        Tensors larger than `max_bytes` are recomputed instead. Returns pytorch nodes of the folded ops.
+        """
+        graph_index = self.get_graph_index()
+
+        # Outputs of non-deterministic ops change from run to run, same as inputs
+        start_names = list(self.input_names)
+        for _, output_names, op, _, _ in self.op_descr_list:
+            if not getattr(op, 'deterministic', True):
+                start_names += output_names
+        traversed_nodes_forward, _ = graph_index.traverse(start_names, reverse_graph=False)
 
-            for name, output in zip(output_names, output_tensors):
-                node_dict[name] = output
+        is_independent = [getattr(op, 'deterministic', True) and not traversed_nodes_forward.intersection(input_names) for input_names, _, op, _, _ in self.op_descr_list]
 
-        output_tensors = [node_dict[name] for name in self.output_names]
-        outputs = template_insert_recursively(self.outputs_template, output_tensors)
-        return outputs
\ No newline at end of file
+        # Tensors flowing from the input-independent part of the graph into the rest of it
+        boundary_names = set(self.output_names)
+        for (input_names, *_), independent in zip(self.op_descr_list, is_independent):
+            if not independent:
+                boundary_names.update(input_names)
+
+        folded_tensors = {}
+        for name in boundary_names:
+            producers = graph_index.producers.get(name, [])
+            # Values of tensors modified in-place depend on the point of use
+            if len(producers) != 1 or not is_independent[producers[0]]:
+                continue
+            _, output_names, _, _, pytorch_node = self.op_descr_list[producers[0]]
+            t = pytorch_node.output_tensors[output_names.index(name)]
+            if t.numel() * t.element_size() <= max_bytes:
+                folded_tensors[name] = t
+
+        if len(folded_tensors) == 0:
+            return []
+
+        def collect_producers(start_names):
+            op_indices = set()
+            queue = deque(start_names)
+            visited_names = set(start_names)
+            while queue:
+                name = queue.popleft()
+                for op_idx in graph_index.producers.get(name, []):
+                    if is_independent[op_idx] and op_idx not in op_indices:
+                        op_indices.add(op_idx)
+                        for input_name in self.op_descr_list[op_idx][0]:
+                            if input_name not in visited_names:
+                                visited_names.add(input_name)
+                                queue.append(input_name)
+            return op_indices
+
+        kept_ops = collect_producers(boundary_names.difference(folded_tensors))
+        folded_ops = collect_producers(folded_tensors).difference(kept_ops)
+
+        folded_nodes = [self.op_descr_list[op_idx][4] for op_idx in sorted(folded_ops)]
+        self.op_descr_list = [descr for op_idx, descr in enumerate(self.op_descr_list) if op_idx not in folded_ops]
+        for name, t in folded_tensors.items():
+            if constants_to_variables:
+                self.disconnected_tensors_descr_list.append(self._make_weight_descr(self.input_names, name, t_pytorch2keras(t)))
+            else:
+                self.constants_dict[name] = t_pytorch2keras(t)
+        self._graph_index = None
+        self._plan = None
+        return folded_nodes
+
+    def _compile_into(self, plan: ExecutionPlan, input_slots):
+        # Every write gets a fresh slot, so in-place ops and name shadowing inside
+        # inlined children cannot leak into the enclosing scope
+        slot_dict = {}
+        for name, tensor in self.constants_dict.items():
+            slot = plan.new_slot()
+            plan.constants.append((slot, tensor))
+            slot_dict[name] = slot
+
+        for slot, name in zip(input_slots, self.input_names):
+            slot_dict[name] = slot
+
+        for input_names, output_names, op, (args_template, kwargs_template), pytorch_node in (self.disconnected_tensors_descr_list + self.op_descr_list):
+            step_input_slots = [slot_dict[name] for name in input_names]
+            if isinstance(op, TransientContainer):
+                step_output_slots = op._compile_into(plan, step_input_slots)
+            else:
+                step_output_slots = [plan.new_slot() for _ in output_names]
+                fill_inputs = compile_template((args_template, kwargs_template))
+                cse_key = PlanStep.make_cse_key(op, (args_template, kwargs_template), pytorch_node)
+                plan.steps.append(PlanStep(op, step_input_slots, step_output_slots, fill_inputs, pytorch_node, cse_key))
+            assert len(output_names) == len(step_output_slots)
+
+            for name, slot in zip(output_names, step_output_slots):
+                slot_dict[name] = slot
+
+        return [slot_dict[name] for name in self.output_names]
+
+    def compile(self) -> ExecutionPlan:
+        plan = ExecutionPlan()
+        plan.input_slots = [plan.new_slot() for _ in self.input_names]
+        plan.output_slots = self._compile_into(plan, plan.input_slots)
+        plan.fill_outputs = compile_template(self.outputs_template)
+        if ExecutionPlan.cse_enabled:
+            plan.eliminate_common_subexpressions()
+        return plan
+
+    def get_plan(self) -> ExecutionPlan:
+        if self._plan is None:
+            self._plan = self.compile()
+        return self._plan
+
+    def invalidate_plan(self):
+        self._plan = None
+
+    def __call__(self, *args, training=False, **kwargs):
+        inputs = collect_recursively((args, kwargs), TF_TENSOR_CLASSES)
+        return self.get_plan().run(inputs)
@@ -1,6 +1,12 @@
+import contextlib
+import hashlib
+from typing import Optional
+
+import numpy as np
 import tensorflow as tf
 
 from nobuco.commons import ChannelOrderingStrategy
+from nobuco.converters.data_movement import format_bytes
 from nobuco.layers.channel_order import ChangeOrderingLayer
 
 
@@ -17,10 +23,72 @@ class WeightLayer(tf.keras.layers.Layer):
 
     @classmethod
     def create(cls, weight):
-        const_layer = WeightLayer(weight.shape)
+        return ConstantPool.get_or_create(weight, cls._create)
+
+    @classmethod
+    def _create(cls, weight):
+        const_layer = WeightLayer(weight.shape, dtype=weight.dtype)
         const_layer.set_weights([weight])
         const_layer = ChangeOrderingLayer(const_layer, channel_ordering_strategy=ChannelOrderingStrategy.OUTPUT_FORCE_PYTORCH_ORDER, autocast=False)
         return const_layer
 
     def call(self, *args, **kwargs):
-        return self.weight
+        return tf.convert_to_tensor(self.weight)
+
+
+def get_constant_value(tensor) -> Optional[np.ndarray]:
+    """Value of a tensor known at conversion time (an eager tensor or the output of a weight layer), None otherwise"""
+    keras_history = getattr(tensor, '_keras_history', None)
+    if keras_history is None:
+        return tf.get_static_value(tensor)
+    if isinstance(keras_history.layer, WeightLayer):
+        return keras_history.layer.get_weights()[0]
+    return None
+
+
+class ConstantPool:
+    """Content-addressed storage of constants, so that bitwise-identical tensors share one variable.
+    Each conversion gets its own pool, see `scope`.
+    """
+
+    _pool = {}
+
+    @staticmethod
+    @contextlib.contextmanager
+    def scope():
+        """Empty pool for the duration of a conversion, the enclosing conversion's pool is restored on exit"""
+        pool_prev = ConstantPool._pool
+        ConstantPool._pool = {}
+        try:
+            yield
+        finally:
+            ConstantPool._pool = pool_prev
+
+    @staticmethod
+    def get_or_create(weight, create_func):
+        array = np.asarray(weight)
+        key = (array.dtype.str, array.shape, hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest())
+        for entry in ConstantPool._pool.get(key, []):
+            pooled_array, pooled_layer, _ = entry
+            if pooled_array.tobytes() == array.tobytes():
+                entry[2] += 1
+                return pooled_layer
+
+        layer = create_func(weight)
+        ConstantPool._pool.setdefault(key, []).append([array, layer, 0])
+        return layer
+
+    @staticmethod
+    def summary(keras_model):
+        # Every hit is a constant that would otherwise be a separate variable
+        num_shared = 0
+        num_bytes_saved = 0
+        model_layers = {id(layer) for layer in keras_model.layers}
+        for entries in ConstantPool._pool.values():
+            for array, layer, num_hits in entries:
+                if id(layer.func) not in model_layers:
+                    continue
+                if num_hits > 0:
+                    num_shared += 1
+                    num_bytes_saved += num_hits * array.nbytes
+        return f'{num_shared} constant(s) shared, {format_bytes(num_bytes_saved)} saved'
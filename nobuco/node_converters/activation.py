@@ -14,6 +14,7 @@ from tensorflow.python.framework.ops import disable_eager_execution
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy
 from nobuco.converters.channel_ordering import set_channel_order, get_channel_order
 from nobuco.converters.node_converter import converter
+from nobuco.converters.fusion import FusedActivation
 from nobuco.converters.tensor import dim_pytorch2keras
 
 def prelu(x, weight):
@@ -139,3 +140,26 @@ def converter_clip(input: Tensor, min: Optional[Tensor]=None, max: Optional[Tens
     def func(input, min=None, max=None, *, out=None):
         return tf.clip_by_value(input, min, max)
     return func
+
+
+@converter(FusedActivation, channel_ordering_strategy=ChannelOrderingStrategy.MANUAL)
+def converter_FusedActivation(self, input: Tensor):
+    layer_op = self.layer_converter.convert(self.layer, input)
+
+    # Only converters that explicitly accept an activation get it fused, anything else falls back to a separate activation op
+    activation_hook = getattr(layer_op.func, 'activation_hook', None)
+    if self.activation in ('relu', 'sigmoid', 'tanh') and activation_hook is not None and activation_hook(self.activation):
+        return layer_op
+
+    activation_funcs = {
+        'relu': tf.nn.relu,
+        # Recognized by TFLite as a fused activation, unlike clip_by_value
+        'relu6': tf.nn.relu6,
+        'sigmoid': tf.math.sigmoid,
+        'tanh': tf.math.tanh,
+    }
+
+    def func(input):
+        output = layer_op(input)
+        return set_channel_order(activation_funcs[self.activation](output), get_channel_order(output))
+    return func
@@ -0,0 +1,210 @@
+import math
+import numbers
+from typing import Optional
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+import torch.nn.functional as F
+from torch import nn, Tensor
+
+from nobuco.commons import ChannelOrderingStrategy
+from nobuco.converters.node_converter import converter, set_conversion_note
+from nobuco.converters.tensor import _transpose, _reshape, _shape_list, _squeeze, _expand_dims
+
+
+def mask_to_bias(mask, masked_value: bool):
+    """Additive attention bias from a pytorch mask: boolean masks hide positions equal to `masked_value`, float masks are added as is"""
+    if mask is None or mask.dtype != tf.bool:
+        return mask
+    if masked_value:
+        return tf.where(mask, -np.inf, 0.)
+    else:
+        return tf.where(mask, 0., -np.inf)
+
+
+def pad_bias(bias, n: int):
+    """Extends an attention bias with `n` attendable key positions"""
+    if bias is None or n == 0:
+        return bias
+    return tf.pad(bias, [[0, 0]] * (len(bias.shape) - 1) + [[0, n]])
+
+
+def causal_bias(tgt_len, src_len):
+    """Bias hiding keys after the query position, aligned to the top left corner like pytorch's `is_causal`"""
+    if isinstance(tgt_len, numbers.Integral) and isinstance(src_len, numbers.Integral):
+        return np.triu(np.full((tgt_len, src_len), -np.inf, dtype=np.float32), k=1)
+    keep = tf.linalg.band_part(tf.ones(tf.stack([tgt_len, src_len]), dtype=tf.bool), -1, 0)
+    return tf.where(keep, 0., -np.inf)
+
+
+def dot_product_attention(q, k, v, bias=None, transposed_v=False):
+    """Attention over the last two axes of already scaled queries (..., L, E), keys (..., S, E) and values (..., S, Ev),
+    or (..., Ev, S) if `transposed_v`. Returns the output and the attention weights.
+    Both products take their second operand transposed, which TFLite lowers to fully connected ops without extra transposes.
+    """
+    scores = tf.linalg.matmul(q, k, adjoint_b=True)
+    if bias is not None:
+        scores = scores + bias
+    weights = tf.nn.softmax(scores, axis=-1)
+    return tf.linalg.matmul(weights, v, adjoint_b=transposed_v), weights
+
+
+@converter(F.scaled_dot_product_attention, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_scaled_dot_product_attention(query: Tensor, key: Tensor, value: Tensor, attn_mask: Optional[Tensor] = None, dropout_p: float = 0.0, is_causal: bool = False, scale: Optional[float] = None):
+    def func(query, key, value, attn_mask=None, dropout_p=0.0, is_causal=False, scale=None):
+        if scale is None:
+            scale = 1 / math.sqrt(query.shape[-1])
+
+        bias = mask_to_bias(attn_mask, masked_value=False)
+        if is_causal:
+            bias = causal_bias(_shape_list(query)[-2], _shape_list(key)[-2])
+        output, _ = dot_product_attention(query * scale, key, value, bias)
+        return output
+    return func
+
+
+def get_mha_projection_params(self: nn.MultiheadAttention):
+    """Transposed (input, output) kernels and biases of the query, key and value projections, the query's prescaled by 1/sqrt(head_dim)"""
+    embed_dim = self.embed_dim
+    if self._qkv_same_embed_dim:
+        weights = np.split(self.in_proj_weight.detach().numpy(), 3, axis=0)
+    else:
+        weights = [self.q_proj_weight.detach().numpy(), self.k_proj_weight.detach().numpy(), self.v_proj_weight.detach().numpy()]
+
+    if self.in_proj_bias is not None:
+        biases = np.split(self.in_proj_bias.detach().numpy(), 3, axis=0)
+    else:
+        biases = [np.zeros((embed_dim,), dtype=weights[0].dtype)] * 3
+
+    scale = 1 / math.sqrt(embed_dim // self.num_heads)
+    kernels = [w.transpose((1, 0)) for w in weights]
+    kernels[0] = kernels[0] * scale
+    biases[0] = biases[0] * scale
+    return kernels, biases
+
+
+def make_mha_projections(self: nn.MultiheadAttention, packing: str):
+    """Dense layers projecting (query, key, value) inputs into (q, k, v), sharing one matmul between inputs that are the same tensor.
+    `packing` is 'qkv' for self-attention, 'q_kv' when keys are values, and 'q_k_v' otherwise.
+    """
+    kernels, biases = get_mha_projection_params(self)
+    embed_dim = self.embed_dim
+
+    def dense(indices):
+        kernel = np.concatenate([kernels[i] for i in indices], axis=1)
+        bias = np.concatenate([biases[i] for i in indices], axis=0)
+        return keras.layers.Dense(kernel.shape[1], weights=[kernel, bias])
+
+    if packing == 'qkv':
+        dense_qkv = dense([0, 1, 2])
+
+        def project(query, key, value):
+            return tf.split(dense_qkv(query), 3, axis=-1)
+    elif packing == 'q_kv':
+        dense_q = dense([0])
+        dense_kv = dense([1, 2])
+
+        def project(query, key, value):
+            k, v = tf.split(dense_kv(key), [embed_dim, embed_dim], axis=-1)
+            return dense_q(query), k, v
+    else:
+        dense_q, dense_k, dense_v = dense([0]), dense([1]), dense([2])
+
+        def project(query, key, value):
+            return dense_q(query), dense_k(key), dense_v(value)
+    return project
+
+
+@converter(nn.MultiheadAttention, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_MultiheadAttention(self: nn.MultiheadAttention, query: Tensor, key: Tensor, value: Tensor, key_padding_mask: Optional[Tensor] = None,
+                                 need_weights: bool = True, attn_mask: Optional[Tensor] = None, average_attn_weights: bool = True, is_causal: bool = False):
+    """Fused attention: projections share a matmul where inputs coincide, heads are split by static reshapes,
+    and the softmax scale is folded into the query projection. Masks are merged into a single additive bias.
+    """
+    num_heads = self.num_heads
+    embed_dim = self.embed_dim
+    head_dim = embed_dim // num_heads
+
+    if query is key and key is value and self._qkv_same_embed_dim:
+        packing = 'qkv'
+    elif key is value and self._qkv_same_embed_dim:
+        packing = 'q_kv'
+    else:
+        packing = 'q_k_v'
+    project = make_mha_projections(self, packing)
+
+    out_proj_weight = self.out_proj.weight.detach().numpy().transpose((1, 0))
+    if self.out_proj.bias is not None:
+        dense_out = keras.layers.Dense(embed_dim, weights=[out_proj_weight, self.out_proj.bias.detach().numpy()])
+    else:
+        dense_out = keras.layers.Dense(embed_dim, use_bias=False, weights=[out_proj_weight])
+
+    bias_k = self.bias_k.detach().numpy() if self.bias_k is not None else None
+    bias_v = self.bias_v.detach().numpy() if self.bias_v is not None else None
+    num_extra_keys = (bias_k is not None) + self.add_zero_attn
+
+    is_batched = query.dim() == 3
+    # Inputs are made (batch, seq, embed) or (seq, batch, embed), heads are split into (batch, heads, seq, head_dim),
+    # values into (batch, heads, head_dim, seq)
+    batch_axis, seq_axis = (0, 1) if self.batch_first or not is_batched else (1, 0)
+    heads_perm = [batch_axis, 2, seq_axis, 3]
+    values_perm = [batch_axis, 2, 3, seq_axis]
+    output_perm = [0, 2, 1, 3] if seq_axis == 1 else [2, 0, 1, 3]
+
+    def append_bias_row(x, bias):
+        row_shape = _shape_list(x)
+        row_shape[seq_axis] = 1
+        return tf.concat([x, tf.broadcast_to(bias.reshape((1, 1, embed_dim)), row_shape)], axis=seq_axis)
+
+    def split_heads(x, perm):
+        return _transpose(_reshape(x, _shape_list(x)[:2] + [num_heads, head_dim]), perm)
+
+    def func(query, key, value, key_padding_mask=None, need_weights=True, attn_mask=None, average_attn_weights=True, is_causal=False):
+        if not is_batched:
+            query, key, value = _expand_dims(query, 0), _expand_dims(key, 0), _expand_dims(value, 0)
+            if key_padding_mask is not None:
+                key_padding_mask = _expand_dims(key_padding_mask, 0)
+
+        q, k, v = project(query, key, value)
+        if bias_k is not None:
+            k = append_bias_row(k, bias_k)
+            v = append_bias_row(v, bias_v)
+
+        q = split_heads(q, heads_perm)
+        k = split_heads(k, heads_perm)
+        v_t = split_heads(v, values_perm)
+        if self.add_zero_attn:
+            k = tf.pad(k, [[0, 0], [0, 0], [0, 1], [0, 0]])
+            v_t = tf.pad(v_t, [[0, 0], [0, 0], [0, 0], [0, 1]])
+
+        bias = mask_to_bias(attn_mask, masked_value=True)
+        if bias is not None and len(bias.shape) == 3:
+            bias = _reshape(bias, [-1, num_heads] + _shape_list(bias)[1:])
+        bias = pad_bias(bias, num_extra_keys)
+
+        padding_bias = mask_to_bias(key_padding_mask, masked_value=True)
+        if padding_bias is not None:
+            padding_bias = pad_bias(padding_bias, num_extra_keys)
+            padding_bias = _reshape(padding_bias, [-1, 1, 1, _shape_list(padding_bias)[1]])
+            bias = padding_bias if bias is None else bias + padding_bias
+
+        output, weights = dot_product_attention(q, k, v_t, bias, transposed_v=True)
+
+        output = _transpose(output, output_perm)
+        output = _reshape(output, _shape_list(output)[:2] + [embed_dim])
+        output = dense_out(output)
+
+        if not need_weights:
+            weights = None
+        elif average_attn_weights:
+            weights = tf.reduce_mean(weights, axis=1)
+
+        if not is_batched:
+            output = _squeeze(output, axis=0)
+            if weights is not None:
+                weights = _squeeze(weights, axis=0)
+        return output, weights
+
+    note = {'qkv': 'Packed QKV projection', 'q_kv': 'Packed KV projection', 'q_k_v': 'Separate QKV projections'}[packing]
+    return set_conversion_note(func, note)
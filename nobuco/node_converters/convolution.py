@@ -11,320 +11,188 @@ import torch.nn.functional as F
 from torch import nn
 
 import numpy as np
-from nobuco.converters.node_converter import converter
+from nobuco.converters.node_converter import converter, set_activation_hook
+
+
+class GroupedConvolution:
+    """Grouped convolutions are emitted with Keras' native `groups=`, which maps to a single grouped kernel on GPU and in TFLite.
+    With `block_diagonal`, they become a regular convolution with a block-diagonal kernel instead,
+    for runtimes lacking grouped convolutions, at the cost of `groups` times the FLOPs and weights.
+    """
+
+    block_diagonal = False
+
+
+def _ntuple(x, n):
+    if isinstance(x, numbers.Number):
+        return (x,) * n
+    return tuple(x)
+
+
+def conv_padding(input_size, kernel_size, stride, dilation, padding, padding_mode='zeros'):
+    """Maps pytorch's convolution padding to Keras' padding and explicit (before, after) pads, None if there are none.
+    `input_size` holds the input's static spatial dimensions, None for dynamic ones.
+
+    - 'valid' if there is no padding
+    - 'same' if Keras' same padding yields the same windows, for any size the dynamic dimensions may take
+    - otherwise 'valid' after a single explicit pad, limited to what the windows actually reach along static dimensions
+    """
+    n_dims = len(kernel_size)
+    if isinstance(padding, str):
+        if padding == 'valid':
+            return 'valid', None
+        elif padding_mode == 'zeros':
+            return 'same', None
+        # Pytorch's same padding puts the extra element last, as Keras does
+        padding = [d * (k - 1) // 2 for k, d in zip(kernel_size, dilation)]
+        pads = [(p, d * (k - 1) - p) for p, k, d in zip(padding, kernel_size, dilation)]
+        return 'valid', pads
+
+    padding = (padding,) * n_dims if isinstance(padding, numbers.Number) else tuple(padding)
+    if all(p == 0 for p in padding):
+        return 'valid', None
+
+    effective_kernel_size = [d * (k - 1) + 1 for k, d in zip(kernel_size, dilation)]
+
+    def output_size(i, p, ek, s):
+        return (i + 2 * p - ek) // s + 1
+
+    def is_same(i, p, ek, s):
+        if i is None:
+            # Windows of a strided conv only line up for some input sizes
+            return s == 1 and 2 * p == ek - 1
+        o = output_size(i, p, ek, s)
+        return o == -(-i // s) and max((o - 1) * s + ek - i, 0) // 2 == p
+
+    if padding_mode == 'zeros' and all(is_same(i, p, ek, s) for i, p, ek, s in zip(input_size, padding, effective_kernel_size, stride)):
+        return 'same', None
+
+    def trailing_pad(i, p, ek, s):
+        if padding_mode != 'zeros' or i is None:
+            # Padded values depend on the input, or the reached extent is unknown: pad symmetrically as pytorch does
+            return p
+        return max((output_size(i, p, ek, s) - 1) * s + ek - i - p, 0)
+
+    pads = [(p, trailing_pad(i, p, ek, s)) for i, p, ek, s in zip(input_size, padding, effective_kernel_size, stride)]
+    return 'valid', pads
+
+
+def pad_conv_input(input, pads, padding_mode='zeros'):
+    if pads is None:
+        return input
+    if padding_mode == 'zeros':
+        return tf.pad(input, [[0, 0], *pads, [0, 0]])
+    elif padding_mode == 'reflect':
+        return tf.pad(input, [[0, 0], *pads, [0, 0]], mode='REFLECT')
+    else:
+        raise Exception('Unsupported padding mode: ', padding_mode)
 
 
-@converter(nn.Conv1d)
-def converter_Conv1d(self, input: Tensor):
-    weight = self.weight
-    bias = self.bias
-    groups = self.groups
-    padding = self.padding
-    stride = self.stride
-    dilation = self.dilation
+def make_conv_layer(n_dims, weight, bias, stride, dilation, groups, padding='valid', activation=None):
+    """Creates a single Keras layer for a pytorch convolution with weight of shape (out, in / groups, *kernel_size).
 
-    out_filters, in_filters, kw = weight.shape
-    weights = weight.detach().numpy()
-    if groups == out_filters and groups != 1:
-        weights = tf.transpose(weights, (2, 0, 1))
-    else:
-        weights = tf.transpose(weights, (2, 1, 0))
+    - groups == 1: regular convolution
+    - groups == in_channels: depthwise convolution, with depth_multiplier = out / in
+    - otherwise: native `groups=` convolution, or a block-diagonal kernel if `GroupedConvolution.block_diagonal` is set
+    """
+    conv_cls, depthwise_cls = {
+        1: (keras.layers.Conv1D, keras.layers.DepthwiseConv1D),
+        2: (keras.layers.Conv2D, keras.layers.DepthwiseConv2D),
+    }[n_dims]
 
-    if bias is not None:
-        biases = bias.detach().numpy()
-        params = [weights, biases]
-        use_bias = True
-    else:
-        params = [weights]
-        use_bias = False
+    out_filters, in_filters_per_group = weight.shape[:2]
+    kernel_size = weight.shape[2:]
+    in_filters = in_filters_per_group * groups
+    spatial_axes = tuple(range(2, 2 + n_dims))
 
-    if isinstance(padding, numbers.Number):
-        padding = (padding,)
-    if padding != (0,) and padding != 'valid':
-        pad_layer = keras.layers.ZeroPadding1D(padding[0])
-    else:
-        pad_layer = None
+    weights = weight.detach().numpy()
+    use_bias = bias is not None
+    biases = [bias.detach().numpy()] if use_bias else []
 
-    if groups == out_filters and groups != 1:
-        conv = keras.layers.DepthwiseConv1D(kernel_size=kw,
-                                      strides=stride,
-                                      padding='valid',
-                                      dilation_rate=dilation,
-                                      groups=groups,
-                                      use_bias=use_bias,
-                                      weights=params
-                                      )
-    elif groups == 1:
-        conv = keras.layers.Conv1D(filters=out_filters,
-                             kernel_size=kw,
+    if groups != 1 and in_filters_per_group == 1:
+        depth_multiplier = out_filters // groups
+        weights = weights.reshape((groups, depth_multiplier, *kernel_size)).transpose((*spatial_axes, 0, 1))
+        return depthwise_cls(kernel_size=kernel_size,
                              strides=stride,
-                             padding='valid',
+                             padding=padding,
+                             depth_multiplier=depth_multiplier,
                              dilation_rate=dilation,
-                             groups=groups,
+                             activation=activation,
                              use_bias=use_bias,
-                             weights=params
+                             weights=[weights] + biases
                              )
-    else:
-        def split_params(params, groups, axis):
-            params_split = [np.split(p, groups, axis=axis) for p in params]
-            return list(zip(*params_split))
-
-        params_split = split_params(params, groups, axis=-1)
-
-        def grouped_conv1d(inputs, filters, kernel_size, strides, groups, dilation=dilation):
-            splits = tf.split(inputs, groups, axis=-1)
-            convolved_splits = [
-                keras.layers.Conv1D(filters // groups,
-                                    kernel_size=kernel_size,
-                                    strides=strides,
-                                    padding='valid',
-                                    dilation_rate=dilation,
-                                    use_bias=use_bias,
-                                    weights=params_split[i]
-                                    )(split)
-                for i, split in enumerate(splits)
-            ]
-            return tf.concat(convolved_splits, -1)
-
-        conv = lambda x: grouped_conv1d(x, out_filters, kernel_size=kw, strides=stride, groups=groups, dilation=dilation)
 
-    def func(input):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        output = conv(input)
-        return output
-    return func
+    weights = weights.transpose((*spatial_axes, 1, 0))
+
+    if groups != 1 and GroupedConvolution.block_diagonal:
+        out_filters_per_group = out_filters // groups
+        weights_full = np.zeros((*kernel_size, in_filters, out_filters), dtype=weights.dtype)
+        for g in range(groups):
+            in_slice = slice(g * in_filters_per_group, (g + 1) * in_filters_per_group)
+            out_slice = slice(g * out_filters_per_group, (g + 1) * out_filters_per_group)
+            weights_full[..., in_slice, out_slice] = weights[..., out_slice]
+        weights = weights_full
+        groups = 1
+
+    return conv_cls(filters=out_filters,
+                    kernel_size=kernel_size,
+                    strides=stride,
+                    padding=padding,
+                    dilation_rate=dilation,
+                    groups=groups,
+                    activation=activation,
+                    use_bias=use_bias,
+                    weights=[weights] + biases
+                    )
+
+
+def make_conv_func(n_dims, weight, bias, stride, dilation, groups, padding, padding_mode='zeros'):
+    """Pads the input and convolves it. Padding is decided from the static shape of the Keras input,
+    the layer is created for every distinct padding mode it needs. Accepts a fused activation.
+    """
+    kernel_size = weight.shape[2:]
+    conv_layers = {}
+    layer_kwargs = {}
+
+    def fuse_activation(activation):
+        layer_kwargs['activation'] = activation
+        return True
 
+    def func(input):
+        keras_padding, pads = conv_padding(input.shape[1:-1], kernel_size, stride, dilation, padding, padding_mode)
+        if keras_padding not in conv_layers:
+            conv_layers[keras_padding] = make_conv_layer(n_dims, weight, bias, stride, dilation, groups, keras_padding, **layer_kwargs)
+        input = pad_conv_input(input, pads, padding_mode)
+        return conv_layers[keras_padding](input)
+    return set_activation_hook(func, fuse_activation)
 
-@converter(F.conv1d)
-def converter_conv1d(input: Tensor, weight: Tensor, bias: Optional[Tensor]=None, stride: Union[_int, _size]=1, padding: str="valid", dilation: Union[_int, _size]=1, groups: _int=1):
-    out_filters, in_filters, kw = weight.shape
-    weights = weight.detach().numpy()
-    if groups == out_filters and groups != 1:
-        weights = tf.transpose(weights, (2, 0, 1))
-    else:
-        weights = tf.transpose(weights, (2, 1, 0))
 
-    if bias is not None:
-        biases = bias.detach().numpy()
-        params = [weights, biases]
-        use_bias = True
-    else:
-        params = [weights]
-        use_bias = False
+@converter(nn.Conv1d)
+def converter_Conv1d(self, input: Tensor):
+    return make_conv_func(1, self.weight, self.bias, self.stride, self.dilation, self.groups, self.padding, self.padding_mode)
 
-    if isinstance(padding, numbers.Number):
-        padding = (padding,)
-    if padding != (0,) and padding != 'valid':
-        pad_layer = keras.layers.ZeroPadding1D(padding[0])
-    else:
-        pad_layer = None
 
-    if groups == out_filters and groups != 1:
-        conv = keras.layers.DepthwiseConv1D(kernel_size=kw,
-                                      strides=stride,
-                                      padding='valid',
-                                      dilation_rate=dilation,
-                                      groups=groups,
-                                      use_bias=use_bias,
-                                      weights=params
-                                      )
-    elif groups == 1:
-        conv = keras.layers.Conv1D(filters=out_filters,
-                             kernel_size=kw,
-                             strides=stride,
-                             padding='valid',
-                             dilation_rate=dilation,
-                             groups=groups,
-                             use_bias=use_bias,
-                             weights=params
-                             )
-    else:
-        def split_params(params, groups, axis):
-            params_split = [np.split(p, groups, axis=axis) for p in params]
-            return list(zip(*params_split))
-
-        params_split = split_params(params, groups, axis=-1)
-
-        def grouped_conv1d(inputs, filters, kernel_size, strides, groups, dilation=dilation):
-            splits = tf.split(inputs, groups, axis=-1)
-            convolved_splits = [
-                keras.layers.Conv1D(filters // groups,
-                                    kernel_size=kernel_size,
-                                    strides=strides,
-                                    padding='valid',
-                                    dilation_rate=dilation,
-                                    use_bias=use_bias,
-                                    weights=params_split[i]
-                                    )(split)
-                for i, split in enumerate(splits)
-            ]
-            return tf.concat(convolved_splits, -1)
-
-        conv = lambda x: grouped_conv1d(x, out_filters, kernel_size=kw, strides=stride, groups=groups, dilation=dilation)
+@converter(F.conv1d)
+def converter_conv1d(input: Tensor, weight: Tensor, bias: Optional[Tensor]=None, stride: Union[_int, _size]=1, padding: str="valid", dilation: Union[_int, _size]=1, groups: _int=1):
+    conv = make_conv_func(1, weight, bias, _ntuple(stride, 1), _ntuple(dilation, 1), groups, padding)
 
     def func(input, *args, **kwargs):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        output = conv(input)
-        return output
+        return conv(input)
     return func
 
 
 @converter(nn.Conv2d)
 def converter_Conv2d(self, input: Tensor):
-    weight = self.weight
-    bias = self.bias
-    groups = self.groups
-    padding = self.padding
-    stride = self.stride
-    dilation = self.dilation
-
-    out_filters, in_filters, kh, kw = weight.shape
-
-    weights = weight.detach().numpy()
-    if groups == out_filters and groups != 1:
-        weights = tf.transpose(weights, (2, 3, 0, 1))
-    else:
-        weights = tf.transpose(weights, (2, 3, 1, 0))
-
-    if bias is not None:
-        biases = bias.detach().numpy()
-        params = [weights, biases]
-        use_bias = True
-    else:
-        params = [weights]
-        use_bias = False
-
-    if padding != 0 and padding != (0, 0) and padding != 'valid':
-        pad_layer = keras.layers.ZeroPadding2D(padding)
-    else:
-        pad_layer = None
-
-    if groups == out_filters and groups != 1:
-        conv = keras.layers.DepthwiseConv2D(kernel_size=(kh, kw),
-                                      strides=stride,
-                                      padding='valid',
-                                      dilation_rate=dilation,
-                                      groups=groups,
-                                      use_bias=use_bias,
-                                      weights=params
-                                      )
-    elif groups == 1:
-        conv = keras.layers.Conv2D(filters=out_filters,
-                             kernel_size=(kh, kw),
-                             strides=stride,
-                             padding='valid',
-                             dilation_rate=dilation,
-                             groups=groups,
-                             use_bias=use_bias,
-                             weights=params
-                             )
-    else:
-        def split_params(params, groups, axis):
-            params_split = [np.split(p, groups, axis=axis) for p in params]
-            return list(zip(*params_split))
-
-        params_split = split_params(params, groups, axis=-1)
-
-        def grouped_conv2d(inputs, filters, kernel_size, strides, groups, dilation=dilation):
-            splits = tf.split(inputs, groups, axis=-1)
-            convolved_splits = [
-                keras.layers.Conv2D(filters // groups,
-                                    kernel_size=kernel_size,
-                                    strides=strides,
-                                    padding='valid',
-                                    dilation_rate=dilation,
-                                    use_bias=use_bias,
-                                    weights=params_split[i]
-                                    )(split)
-                for i, split in enumerate(splits)
-            ]
-            return tf.concat(convolved_splits, -1)
-
-        conv = lambda x: grouped_conv2d(x, out_filters, kernel_size=(kh, kw), strides=stride, groups=groups, dilation=dilation)
-
-    def func(input):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        output = conv(input)
-        return output
-    return func
+    return make_conv_func(2, self.weight, self.bias, self.stride, self.dilation, self.groups, self.padding, self.padding_mode)
 
 
 @converter(F.conv2d)
 def converter_conv2d(input: Tensor, weight: Tensor, bias: Optional[Tensor] = None, stride: Union[_int, _size] = 1,
                     padding: str = "valid", dilation: Union[_int, _size] = 1, groups: _int = 1):
-
-    out_filters, in_filters, kh, kw = weight.shape
-
-    weights = weight.detach().numpy()
-    if groups == out_filters and groups != 1:
-        weights = tf.transpose(weights, (2, 3, 0, 1))
-    else:
-        weights = tf.transpose(weights, (2, 3, 1, 0))
-
-    if bias is not None:
-        biases = bias.detach().numpy()
-        params = [weights, biases]
-        use_bias = True
-    else:
-        params = [weights]
-        use_bias = False
-
-    if padding != 0 and padding != (0, 0) and padding != 'valid':
-        pad_layer = keras.layers.ZeroPadding2D(padding)
-    else:
-        pad_layer = None
-
-    if groups == out_filters and groups != 1:
-        conv = keras.layers.DepthwiseConv2D(kernel_size=(kh, kw),
-                                      strides=stride,
-                                      padding='valid',
-                                      dilation_rate=dilation,
-                                      groups=groups,
-                                      use_bias=use_bias,
-                                      weights=params
-                                      )
-    elif groups == 1:
-        conv = keras.layers.Conv2D(filters=out_filters,
-                             kernel_size=(kh, kw),
-                             strides=stride,
-                             padding='valid',
-                             dilation_rate=dilation,
-                             groups=groups,
-                             use_bias=use_bias,
-                             weights=params
-                             )
-    else:
-        def split_params(params, groups, axis):
-            params_split = [np.split(p, groups, axis=axis) for p in params]
-            return list(zip(*params_split))
-
-        params_split = split_params(params, groups, axis=-1)
-
-        def grouped_conv2d(inputs, filters, kernel_size, strides, groups, dilation=dilation):
-            splits = tf.split(inputs, groups, axis=-1)
-            convolved_splits = [
-                keras.layers.Conv2D(filters // groups,
-                                    kernel_size=kernel_size,
-                                    strides=strides,
-                                    padding='valid',
-                                    dilation_rate=dilation,
-                                    use_bias=use_bias,
-                                    weights=params_split[i]
-                                    )(split)
-                for i, split in enumerate(splits)
-            ]
-            return tf.concat(convolved_splits, -1)
-
-        conv = lambda x: grouped_conv2d(x, out_filters, kernel_size=(kh, kw), strides=stride, groups=groups, dilation=dilation)
+    conv = make_conv_func(2, weight, bias, _ntuple(stride, 2), _ntuple(dilation, 2), groups, padding)
 
     def func(input, *args, **kwargs):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        output = conv(input)
-        return output
+        return conv(input)
     return func
 
 
@@ -373,15 +241,7 @@ def converter_ConvTranspose2d(self, input: Tensor, output_size: Optional[List[in
     pad_layer = None
 
     if groups == 1:
-        conv = keras.layers.Conv2DTranspose(out_filters,
-                                            kernel_size=(kh, kw),
-                                            strides=stride,
-                                            padding='valid',
-                                            dilation_rate=dilation,
-                                            groups=1,
-                                            use_bias=use_bias,
-                                            weights=params
-                                            )
+        filters = out_filters
     elif groups == in_filters and out_filters == 1:
         weights = params[0]
 
@@ -389,31 +249,42 @@ def converter_ConvTranspose2d(self, input: Tensor, output_size: Optional[List[in
         for i in range(groups):
             weights_full[..., i, i] = weights[..., i, 0]
         params[0] = weights_full
-
-        conv = keras.layers.Conv2DTranspose(out_filters*groups,
-                                            kernel_size=(kh, kw),
-                                            strides=stride,
-                                            padding='valid',
-                                            dilation_rate=dilation,
-                                            groups=1,
-                                            use_bias=use_bias,
-                                            weights=params
-                                            )
+        filters = out_filters*groups
     else:
         raise Exception('Unsupprorted # groups:', groups)
 
+    # Created on first call, after a possible fused activation
+    conv = None
+    layer_kwargs = {}
+
+    def fuse_activation(activation):
+        layer_kwargs['activation'] = activation
+        return True
+
     def func(input: Tensor, output_size: Optional[List[int]] = None):
+        nonlocal conv
         assert output_size is None
 
         if pad_layer is not None:
             input = pad_layer(input)
 
+        if conv is None:
+            conv = keras.layers.Conv2DTranspose(filters,
+                                                kernel_size=(kh, kw),
+                                                strides=stride,
+                                                padding='valid',
+                                                dilation_rate=dilation,
+                                                groups=1,
+                                                use_bias=use_bias,
+                                                weights=params,
+                                                **layer_kwargs
+                                                )
         x = conv(input)
 
         if output_padding != (0, 0):
             x = x[:, output_padding[0]:, output_padding[1]:, :]
         return x
-    return func
+    return set_activation_hook(func, fuse_activation)
 
 
 # # FIXME: not thoroughly tested
@@ -0,0 +1,205 @@
+import functools
+import itertools
+import operator
+from typing import Any, List, Dict, Optional, Tuple
+
+import tensorflow as tf
+from tensorflow import keras
+import torch
+
+from nobuco.commons import ChannelOrderingStrategy
+from nobuco.converters.node_converter import converter, set_conversion_note
+from nobuco.converters.tensor import _transpose, _reshape, _shape_list
+
+
+# Labels that ellipsis dimensions are expanded into, pytorch only accepts latin letters in equations
+ELLIPSIS_LABELS = [chr(0x3b1 + i) for i in range(24)]
+
+
+def _prod(sizes):
+    return functools.reduce(operator.mul, sizes, 1)
+
+
+def parse_einsum_equation(equation: str, ranks: List[int]) -> Tuple[List[str], str]:
+    """Returns labels of each operand and of the output, with ellipses expanded into distinct labels"""
+    equation = equation.replace(' ', '')
+    if '->' in equation:
+        inputs, output = equation.split('->')
+    else:
+        inputs, output = equation, None
+    inputs = inputs.split(',')
+
+    n_ellipsis_dims = max([rank - (len(labels) - 3) for labels, rank in zip(inputs, ranks) if '...' in labels], default=0)
+    ellipsis_labels = ''.join(ELLIPSIS_LABELS[:n_ellipsis_dims])
+
+    def expand(labels, rank):
+        if '...' not in labels:
+            return labels
+        n_dims = rank - (len(labels) - 3)
+        return labels.replace('...', ellipsis_labels[n_ellipsis_dims - n_dims:])
+
+    inputs = [expand(labels, rank) for labels, rank in zip(inputs, ranks)]
+    if output is None:
+        # Implicit output: ellipsis dimensions, then labels appearing once in alphabetical order
+        counts = {}
+        for label in ''.join(inputs):
+            counts[label] = counts.get(label, 0) + 1
+        output = ellipsis_labels + ''.join(sorted(label for label, count in counts.items() if count == 1 and label not in ellipsis_labels))
+    else:
+        output = output.replace('...', ellipsis_labels)
+    return inputs, output
+
+
+def einsum_label_sizes(input_labels: List[str], shapes) -> Optional[Dict[str, int]]:
+    """Sizes of labels, None if an operand repeats a label (diagonal) or labels broadcast, which aren't compiled"""
+    sizes = {}
+    for labels, shape in zip(input_labels, shapes):
+        if len(set(labels)) != len(labels):
+            return None
+        for label, size in zip(labels, shape):
+            if sizes.setdefault(label, size) != size:
+                return None
+    return sizes
+
+
+def plan_einsum(input_labels: List[str], output_labels: str, sizes: Dict[str, int]):
+    """Pairwise contraction tree with the fewest multiply-adds, found by dynamic programming over subsets of operands.
+    Leaves are operand indices, inner nodes are pairs.
+    """
+    all_operands = frozenset(range(len(input_labels)))
+
+    def result_labels(subset):
+        inner = set().union(*(input_labels[i] for i in subset))
+        outer = set(output_labels).union(*(input_labels[i] for i in all_operands - subset))
+        return inner & outer
+
+    @functools.lru_cache(maxsize=None)
+    def best(subset):
+        if len(subset) == 1:
+            return 0, next(iter(subset))
+        first, *rest = sorted(subset)
+        best_cost, best_tree = None, None
+        for n in range(len(rest)):
+            for others in itertools.combinations(rest, n):
+                left = frozenset((first, *others))
+                right = subset - left
+                left_cost, left_tree = best(left)
+                right_cost, right_tree = best(right)
+                cost = left_cost + right_cost + _prod(sizes[label] for label in result_labels(left) | result_labels(right))
+                if best_cost is None or cost < best_cost:
+                    best_cost, best_tree = cost, (left_tree, right_tree)
+        return best_cost, best_tree
+
+    return best(all_operands)[1], result_labels
+
+
+def _tree_str(tree):
+    if isinstance(tree, int):
+        return str(tree)
+    return f'({_tree_str(tree[0])}, {_tree_str(tree[1])})'
+
+
+def _sum_labels(x, labels: str, keep) -> Tuple[Any, str]:
+    axes = [i for i, label in enumerate(labels) if label not in keep]
+    if not axes:
+        return x, labels
+    return tf.reduce_sum(x, axis=axes), ''.join(label for label in labels if label in keep)
+
+
+def _permute_labels(x, labels: str, target: str):
+    if labels == target:
+        return x
+    return _transpose(x, perm=[labels.index(label) for label in target])
+
+
+def contract_pair(x, x_labels: str, y, y_labels: str, keep) -> Tuple[Any, str]:
+    """Contracts two operands, keeping labels in `keep`, with one matmul (or a broadcast multiply if nothing is contracted).
+    Operands are laid out as [batch..., free, contracted] with static reshapes; matmul's adjoint flags save transposes where they can.
+    """
+    x, x_labels = _sum_labels(x, x_labels, keep | set(y_labels))
+    y, y_labels = _sum_labels(y, y_labels, keep | set(x_labels))
+
+    batch = ''.join(label for label in x_labels if label in y_labels and label in keep)
+    contracted = ''.join(label for label in x_labels if label in y_labels and label not in keep)
+    left = ''.join(label for label in x_labels if label not in y_labels)
+    right = ''.join(label for label in y_labels if label not in x_labels)
+
+    if not contracted:
+        x = _permute_labels(x, x_labels, batch + left)
+        y = _permute_labels(y, y_labels, batch + right)
+        if right:
+            x = _reshape(x, _shape_list(x) + [1] * len(right))
+        if left:
+            y_shape = _shape_list(y)
+            y = _reshape(y, y_shape[:len(batch)] + [1] * len(left) + y_shape[len(batch):])
+        return x * y, batch + left + right
+
+    x_order = batch + contracted + left if x_labels == batch + contracted + left else batch + left + contracted
+    y_order = batch + right + contracted if y_labels == batch + right + contracted else batch + contracted + right
+    x = _permute_labels(x, x_labels, x_order)
+    y = _permute_labels(y, y_labels, y_order)
+
+    x_shape = dict(zip(x_order, _shape_list(x)))
+    y_shape = dict(zip(y_order, _shape_list(y)))
+    batch_shape = [x_shape[label] for label in batch]
+
+    def merge(t, shape, group1, group2):
+        if len(group1) == 1 and len(group2) == 1:
+            return t
+        return _reshape(t, batch_shape + [_prod(shape[label] for label in group1), _prod(shape[label] for label in group2)])
+
+    adjoint_x = x_order != batch + left + contracted
+    adjoint_y = y_order != batch + contracted + right
+    x = merge(x, x_shape, *((contracted, left) if adjoint_x else (left, contracted)))
+    y = merge(y, y_shape, *((right, contracted) if adjoint_y else (contracted, right)))
+
+    result = tf.linalg.matmul(x, y, adjoint_a=adjoint_x, adjoint_b=adjoint_y)
+    if len(left) != 1 or len(right) != 1:
+        result = _reshape(result, batch_shape + [x_shape[label] for label in left] + [y_shape[label] for label in right])
+    return result, batch + left + right
+
+
+def compile_einsum(equation: str, shapes):
+    """Compiles an einsum into matmuls, reshapes and transposes on the operands' traced shapes.
+    Returns the function, or None if the equation has diagonals or broadcast labels, and a description of the plan.
+    """
+    input_labels, output_labels = parse_einsum_equation(equation, [len(shape) for shape in shapes])
+    sizes = einsum_label_sizes(input_labels, shapes)
+    if sizes is None:
+        return None, 'tf.einsum: repeated or broadcast labels'
+
+    tree, result_labels = plan_einsum(input_labels, output_labels, sizes)
+
+    def contract(tree, operands):
+        if isinstance(tree, int):
+            return operands[tree], input_labels[tree], frozenset((tree,))
+        x, x_labels, x_subset = contract(tree[0], operands)
+        y, y_labels, y_subset = contract(tree[1], operands)
+        subset = x_subset | y_subset
+        result, labels = contract_pair(x, x_labels, y, y_labels, result_labels(subset))
+        return result, labels, subset
+
+    def func(*operands):
+        result, labels, _ = contract(tree, operands)
+        result, labels = _sum_labels(result, labels, set(output_labels))
+        return _permute_labels(result, labels, output_labels)
+
+    return func, f'Contraction order: {_tree_str(tree)}'
+
+
+@converter(torch.einsum, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_einsum(*args: Any):
+    equation, *operands = args
+    if len(operands) == 1 and isinstance(operands[0], (list, tuple)):
+        operands = operands[0]
+
+    compiled, note = compile_einsum(equation, [tuple(operand.shape) for operand in operands])
+
+    def func(*args: Any):
+        equation, *operands = args
+        if len(operands) == 1 and isinstance(operands[0], (list, tuple)):
+            operands = operands[0]
+        if compiled is not None:
+            return compiled(*operands)
+        return keras.layers.Lambda(lambda operands: tf.einsum(equation, *operands))(operands)
+    return set_conversion_note(func, note)
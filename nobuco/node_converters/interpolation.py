@@ -1,6 +1,8 @@
 import numbers
 from typing import Optional, Union, List, Tuple, Sequence, Any
 
+import numpy as np
+from tensorflow import keras
 from tensorflow.python.ops.image_ops_impl import ResizeMethod
 from torch import Tensor
 
@@ -10,26 +12,133 @@ import torch.nn.functional as F
 from nobuco.converters.node_converter import converter
 
 
-@converter(F.interpolate)
-def converter_interpolate(input: Tensor, size: Optional[int] = None, scale_factor: Optional[List[float]] = None, mode: str = 'nearest',
-                align_corners: Optional[bool] = None, recompute_scale_factor: Optional[bool] = None, antialias: bool = False):
-    if mode == 'bilinear':
-        method = ResizeMethod.BILINEAR
+def _pair(x):
+    if x is None:
+        return x
+    elif isinstance(x, (list, tuple)):
+        return tuple(x)
+    return (x, x)
+
+
+def is_static_size(size) -> bool:
+    return all(isinstance(s, numbers.Integral) for s in size)
+
+
+def interpolation_source_coords(in_size: int, out_size: int, scale: float, mode: str, align_corners: bool) -> np.ndarray:
+    """Source coordinates of output pixels along one axis, as pytorch computes them"""
+    dst = np.arange(out_size, dtype=np.float64)
+    if align_corners:
+        scale = (in_size - 1) / (out_size - 1) if out_size > 1 else 0
+        return dst * scale
     elif mode == 'nearest':
-        method = ResizeMethod.NEAREST_NEIGHBOR
+        return np.floor(dst * scale)
+    elif mode == 'nearest-exact':
+        return np.floor((dst + 0.5) * scale)
     else:
-        raise Exception('Unsupported mode: ', mode)
+        return np.maximum((dst + 0.5) * scale - 0.5, 0)
+
+
+def resize_gather(x, in_size, out_size, scales, mode: str, align_corners: bool):
+    """Exact resize by gathering along each spatial axis, for sampling grids no resize kernel implements"""
+    for axis, in_s, out_s, scale in zip([1, 2], in_size, out_size, scales):
+        coords = interpolation_source_coords(in_s, out_s, scale, mode, align_corners)
+        lo = np.minimum(np.floor(coords), in_s - 1).astype(np.int32)
+        if mode.startswith('nearest'):
+            x = tf.gather(x, lo, axis=axis)
+        else:
+            hi = np.minimum(lo + 1, in_s - 1)
+            weight_shape = [1, 1, 1, 1]
+            weight_shape[axis] = out_s
+            weight = (coords - lo).astype(np.float32).reshape(weight_shape)
+            x_lo = tf.gather(x, lo, axis=axis)
+            x_hi = tf.gather(x, hi, axis=axis)
+            x = x_lo + (x_hi - x_lo) * weight
+    return x
 
-    def func(input, size=None, scale_factor=None, mode='nearest', align_corners=None, recompute_scale_factor=None, antialias=False):
-        if isinstance(scale_factor, numbers.Number):
-            scale_factor = (scale_factor, scale_factor)
 
-        if isinstance(size, numbers.Number):
-            size = (size, size)
+def resize_gather_dynamic(x, out_size, scales, mode: str, align_corners: bool):
+    """Same as `resize_gather`, for sizes only known at runtime"""
+    for axis, out_s, scale in zip([1, 2], out_size, scales):
+        in_s = tf.shape(x)[axis]
+        in_f = tf.cast(in_s, tf.float32)
+        out_f = tf.cast(out_s, tf.float32)
+        dst = tf.cast(tf.range(out_s), tf.float32)
+        if align_corners:
+            coords = dst * tf.math.divide_no_nan(in_f - 1, out_f - 1)
+        else:
+            if scale is None:
+                scale = in_f / out_f
+            if mode == 'nearest':
+                coords = tf.floor(dst * scale)
+            else:
+                coords = tf.maximum((dst + 0.5) * scale - 0.5, 0)
+        lo = tf.minimum(tf.cast(tf.floor(coords), tf.int32), in_s - 1)
+        if mode.startswith('nearest'):
+            x = tf.gather(x, lo, axis=axis)
+        else:
+            hi = tf.minimum(lo + 1, in_s - 1)
+            weight_shape = [1, 1, 1, 1]
+            weight_shape[axis] = -1
+            weight = tf.reshape(coords - tf.cast(lo, tf.float32), weight_shape)
+            x_lo = tf.gather(x, lo, axis=axis)
+            x_hi = tf.gather(x, hi, axis=axis)
+            x = x_lo + (x_hi - x_lo) * weight
+    return x
 
-        if size is None:
-            _, h, w, _ = input.shape
-            size = (int(h * scale_factor[0]), int(w * scale_factor[1]))
 
-        return tf.image.resize(input, size=size, method=method, antialias=antialias)
+def interpolate(input, size=None, scale_factor=None, mode='nearest', align_corners=None, recompute_scale_factor=None, antialias=False):
+    """Resizes an NHWC tensor like `F.interpolate`, picking the cheapest kernel that reproduces pytorch's sampling:
+    - integer-factor nearest upsampling is `UpSampling2D`
+    - 'nearest-exact' is the half-pixel nearest resize, 'bilinear' the half-pixel bilinear one
+    - 'nearest' and `align_corners` sample grids no resize kernel implements, so they are gathered explicitly
+    - so is a `scale_factor` that doesn't divide the output size, which pytorch keeps for sampling
+    Sizes may be dynamic, e.g. computed from `nobuco.shape`.
+    """
+    in_size = input.shape[1:3]
+    scale_factor = _pair(scale_factor)
+    size = _pair(size)
+
+    if size is None:
+        if is_static_size(in_size):
+            size = tuple(int(np.floor(s * f)) for s, f in zip(in_size, scale_factor))
+        else:
+            in_size_dynamic = tf.cast(tf.shape(input)[1:3], tf.float32)
+            size = tf.cast(tf.floor(in_size_dynamic * np.array(scale_factor, dtype=np.float32)), tf.int32)
+            size = tf.unstack(size)
+
+    if scale_factor is not None and not recompute_scale_factor:
+        # Pytorch samples with the given scale factor, not with the ratio of sizes
+        scales = [1 / f for f in scale_factor]
+    else:
+        scales = [None, None]
+
+    if is_static_size(in_size) and is_static_size(size):
+        if mode.startswith('nearest') and all(o % i == 0 for i, o in zip(in_size, size)):
+            factors = tuple(o // i for i, o in zip(in_size, size))
+            if factors == (1, 1):
+                return tf.identity(input)
+            return keras.layers.UpSampling2D(size=factors, interpolation='nearest')(input)
+
+        scales = [i / o if s is None else s for s, i, o in zip(scales, in_size, size)]
+        if mode == 'nearest' or align_corners or any(not np.isclose(s, i / o) for s, i, o in zip(scales, in_size, size)):
+            return resize_gather(input, in_size, size, scales, mode, align_corners)
+    elif mode == 'nearest' or align_corners:
+        return resize_gather_dynamic(input, size, scales, mode, align_corners)
+    else:
+        size = tf.cast(tf.stack(size), tf.int32)
+
+    if mode == 'nearest-exact':
+        return tf.image.resize(input, size=size, method=ResizeMethod.NEAREST_NEIGHBOR)
+    else:
+        return tf.image.resize(input, size=size, method=ResizeMethod.BILINEAR, antialias=antialias)
+
+
+@converter(F.interpolate)
+def converter_interpolate(input: Tensor, size: Optional[int] = None, scale_factor: Optional[List[float]] = None, mode: str = 'nearest',
+                align_corners: Optional[bool] = None, recompute_scale_factor: Optional[bool] = None, antialias: bool = False):
+    if mode not in ('nearest', 'nearest-exact', 'bilinear'):
+        raise Exception('Unsupported mode: ', mode)
+
+    def func(input, size=None, scale_factor=None, mode='nearest', align_corners=None, recompute_scale_factor=None, antialias=False):
+        return interpolate(input, size, scale_factor, mode, align_corners, recompute_scale_factor, antialias)
     return func
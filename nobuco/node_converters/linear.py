@@ -14,11 +14,30 @@ from torch import nn
 import numpy as np
 
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy
-from nobuco.converters.node_converter import converter
+from nobuco.converters.node_converter import converter, set_activation_hook
+from nobuco.converters.tied_parameters import TiedParameters
+
+
+def make_tied_linear(weight, bias):
+    """Linear op over the variables of tied parameters, using the (out, in) weight transposed as is,
+    so that it may be shared e.g. with an embedding's (num_embeddings, dim) table.
+    """
+    weight_layer = TiedParameters.get_weight_layer(weight)
+    bias_layer = TiedParameters.get_weight_layer(bias) if bias is not None else None
+
+    def func(input):
+        output = tf.linalg.matmul(input, weight_layer(input), transpose_b=True)
+        if bias_layer is not None:
+            output = output + bias_layer(input)
+        return output
+    return func
 
 
 @converter(nn.Linear, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
 def converter_Linear(self, input: Tensor):
+    if TiedParameters.is_tied(self.weight) or TiedParameters.is_tied(self.bias):
+        return make_tied_linear(self.weight, self.bias)
+
     out_filters, in_filters = self.weight.shape
     weights = self.weight.detach().numpy()
     weights = weights.transpose(1, 0)
@@ -29,11 +48,32 @@ def converter_Linear(self, input: Tensor):
         params = [weights, biases]
     else:
         params = [weights]
-    return keras.layers.Dense(out_filters, weights=params)
+
+    # Created on first call, after a possible fused activation
+    dense = None
+    layer_kwargs = {}
+
+    def fuse_activation(activation):
+        layer_kwargs['activation'] = activation
+        return True
+
+    def func(input):
+        nonlocal dense
+        if dense is None:
+            dense = keras.layers.Dense(out_filters, weights=params, **layer_kwargs)
+        return dense(input)
+    return set_activation_hook(func, fuse_activation)
 
 
 @converter(torch.nn.functional.linear, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
 def converter_linear(input, weight, bias, out=None):
+    if TiedParameters.is_tied(weight) or TiedParameters.is_tied(bias):
+        tied_linear = make_tied_linear(weight, bias)
+
+        def func(input, weight, bias, out=None):
+            return tied_linear(input)
+        return func
+
     out_filters, in_filters = weight.shape
     weights = weight.detach().numpy()
     weights = weights.transpose(1, 0)
@@ -93,15 +133,6 @@ def converter_baddbmm(input: Tensor, batch1: Tensor, batch2: Tensor, *, beta: Nu
     return func
 
 
-@converter(torch.einsum, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
-def converter_einsum(*args: Any):
-    def func(*args: Any):
-        equation = args[0]
-        operands = args[1:]
-        return keras.layers.Lambda(lambda operands: tf.einsum(equation, *operands))(operands)
-    return func
-
-
 @converter(torch.Tensor.triu, torch.Tensor.triu_, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
 def converter_triu(self, diagonal=0):
     def func(self, diagonal=0):
@@ -123,6 +154,13 @@ def converter_norm(input, p="fro", dim=None, keepdim=False, out=None, dtype=None
 @converter(F.embedding, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
 def converter_embedding(input: Tensor, weight: Tensor, padding_idx: Optional[int] = None, max_norm: Optional[float] = None,
               norm_type: float = 2.0, scale_grad_by_freq: bool = False, sparse: bool = False):
+    if TiedParameters.is_tied(weight):
+        weight_layer = TiedParameters.get_weight_layer(weight)
+
+        def func(input, weight, padding_idx=None, max_norm=None, norm_type=2.0, scale_grad_by_freq=False, sparse=False):
+            return tf.gather(weight_layer(input), tf.cast(input, tf.int32))
+        return func
+
     input_dim, output_dim = weight.shape
     weight = weight.detach().numpy()
 
@@ -2,13 +2,19 @@ from typing import Optional, Union, List, Tuple, Sequence, Any
 
 from torch import Tensor
 
+import numpy as np
+import tensorflow as tf
 from tensorflow import keras
 import torch
 import torch.nn.functional as F
 from torch import nn
 
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy
+from nobuco.converters.channel_ordering import get_channel_order, set_channel_order
 from nobuco.converters.node_converter import converter
+from nobuco.converters.tied_parameters import TiedParameters
+from nobuco.converters.tensor import dim_pytorch2keras, dims_pytorch2keras, perm_keras2pytorch, perm_pytorch2keras, _permute, _reshape, _shape_list, _transpose
+from nobuco.layers.weight import WeightLayer
 
 
 # NB: tensorflow and pytorch implementations of batchnorm behave differently in train mode
@@ -46,19 +52,90 @@ def converter_BatchNorm(self, input: Tensor):
 #     return func
 
 
-@converter(F.layer_norm, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def normalize(x, axes: List[int], eps: float):
+    """(x - mean) / sqrt(var + eps) over `axes` in the centered form, which TFLite runs as MEAN, SQUARED_DIFFERENCE and RSQRT
+    over any set of axes, so the input needs no transposes to bring them last
+    """
+    mean = tf.reduce_mean(x, axis=axes, keepdims=True)
+    centered = x - mean
+    variance = tf.reduce_mean(tf.square(centered), axis=axes, keepdims=True)
+    return centered * tf.math.rsqrt(variance + eps)
+
+
+def affine_param(weight_layer: Optional[WeightLayer], input, shape: List[int], channel_order: ChannelOrder):
+    """Weight or bias variable broadcastable to the input (of pytorch order `shape`) in its channel order"""
+    if weight_layer is None:
+        return None
+    param = weight_layer(input)
+    if channel_order == ChannelOrder.TENSORFLOW:
+        perm = perm_pytorch2keras(len(shape))
+        # Positions of the parameter's dimensions in tensorflow layout, they only need a transpose if their order changes
+        positions = [perm.index(i) for i, size in enumerate(shape) if size != 1]
+        if positions != sorted(positions):
+            param = _transpose(_reshape(param, shape), perm)
+        shape = [shape[i] for i in perm]
+    # Leading unit dimensions are left to broadcasting
+    while shape and shape[0] == 1:
+        shape = shape[1:]
+    if param.shape.as_list() != shape:
+        param = _reshape(param, shape)
+    return param
+
+
+def apply_affine(x, weight, bias):
+    if weight is not None:
+        x = x * weight
+    if bias is not None:
+        x = x + bias
+    return x
+
+
+@converter(F.layer_norm, channel_ordering_strategy=ChannelOrderingStrategy.MANUAL)
 def converter_layer_norm(input: Tensor,
                normalized_shape: List[int],
                weight: Optional[Tensor] = None,
                bias: Optional[Tensor] = None,
                eps: float = 1e-5
                ):
-    assert len(normalized_shape) == 1
+    n_dims = input.dim()
+    axes = list(range(n_dims - len(normalized_shape), n_dims))
+    param_shape = [1] * (n_dims - len(normalized_shape)) + list(normalized_shape)
+    weight_layer = TiedParameters.get_weight_layer(weight) if weight is not None else None
+    bias_layer = TiedParameters.get_weight_layer(bias) if bias is not None else None
+
+    def func(input, *args, **kwargs):
+        channel_order = get_channel_order(input)
+        keras_axes = sorted(dims_pytorch2keras(axes, n_dims)) if channel_order == ChannelOrder.TENSORFLOW else axes
+        # The input keeps its layout if the normalized axes stay innermost in it (e.g. channels, height and width of NHWC).
+        # Otherwise it's a sequence whose features lead in tensorflow layout, which later ops want in pytorch order anyway.
+        if keras_axes != axes:
+            input = _permute(perm_keras2pytorch(n_dims))(input)
+            channel_order = ChannelOrder.PYTORCH
+            keras_axes = axes
+        x = normalize(input, keras_axes, eps)
+        x = apply_affine(x, affine_param(weight_layer, input, param_shape, channel_order), affine_param(bias_layer, input, param_shape, channel_order))
+        return set_channel_order(x, channel_order)
+    return func
 
-    weight = weight.detach().numpy()
-    bias = bias.detach().numpy()
-    layer = keras.layers.LayerNormalization(axis=-1, epsilon=eps, weights=[weight, bias])
+
+@converter(F.group_norm, channel_ordering_strategy=ChannelOrderingStrategy.MANUAL)
+def converter_group_norm(input: Tensor, num_groups: int, weight: Optional[Tensor] = None, bias: Optional[Tensor] = None, eps: float = 1e-5):
+    n_dims = input.dim()
+    num_channels = input.shape[1]
+    param_shape = [1, num_channels] + [1] * (n_dims - 2)
+    weight_layer = TiedParameters.get_weight_layer(weight) if weight is not None else None
+    bias_layer = TiedParameters.get_weight_layer(bias) if bias is not None else None
 
     def func(input, *args, **kwargs):
-        return layer(input)
+        channel_order = get_channel_order(input)
+        channel_axis = dim_pytorch2keras(1, n_dims) if channel_order == ChannelOrder.TENSORFLOW else 1
+
+        # The channel axis is split into (groups, channels per group) in place, whichever layout the input has
+        shape = _shape_list(input)
+        grouped_shape = shape[:channel_axis] + [num_groups, num_channels // num_groups] + shape[channel_axis + 1:]
+        axes = [i for i in range(1, len(grouped_shape)) if i != channel_axis]
+        x = normalize(_reshape(input, grouped_shape), axes, eps)
+        x = _reshape(x, shape)
+        x = apply_affine(x, affine_param(weight_layer, input, param_shape, channel_order), affine_param(bias_layer, input, param_shape, channel_order))
+        return set_channel_order(x, channel_order)
     return func
@@ -4,12 +4,14 @@ from typing import Optional, Union, List, Tuple, Sequence, Any
 from torch import Tensor
 from torch.types import _int, _bool, Number, _dtype, _size
 
+import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 import torch
 import torch.nn.functional as F
 
-from nobuco.converters.node_converter import converter
+from nobuco.converters.node_converter import converter, set_conversion_note
+from nobuco.converters.tensor import _shape_list, _reshape, _transpose
 
 
 # @converter(nn.MaxPool2d)
@@ -19,69 +21,319 @@ from nobuco.converters.node_converter import converter
 #     return keras.layers.MaxPool2D(pool_size=kernel_size, strides=stride)
 
 
-@converter(torch.max_pool2d)
-def converter_max_pool_2d(input: Tensor, kernel_size: Union[_int, _size], stride: Union[_int, _size]=(), padding: Union[_int, _size]=0, dilation: Union[_int, _size]=1, ceil_mode: _bool=False):
-    if isinstance(kernel_size, numbers.Number):
-        kernel_size = (kernel_size, kernel_size)
+def _pair(x):
+    if isinstance(x, numbers.Number):
+        return (x, x)
+    return tuple(x)
 
-    if isinstance(dilation, numbers.Number):
-        dilation = (dilation, dilation)
 
-    if isinstance(padding, numbers.Number):
-        padding = (padding, padding)
+def pool_output_size(in_size, kernel_size: int, stride: int, padding: int, ceil_mode: bool):
+    """Output size along one axis, for a static (int) or dynamic (scalar tensor) input size"""
+    numerator = in_size + 2 * padding - kernel_size
+    if ceil_mode:
+        out_size = -(-numerator // stride) + 1
+        # The last window must start inside the input or the left padding
+        if isinstance(in_size, numbers.Integral):
+            if (out_size - 1) * stride >= in_size + padding:
+                out_size -= 1
+        else:
+            out_size = tf.where((out_size - 1) * stride >= in_size + padding, out_size - 1, out_size)
+        return out_size
+    return numerator // stride + 1
 
-    if padding != (0, 0):
-        kh, kw = kernel_size
-        pad = (dilation[0] * (kh - 1) - padding[0], dilation[1] * (kw - 1) - padding[1])
-        pad_layer = keras.layers.ZeroPadding2D(pad)
+
+def pool_window_counts(in_size, kernel_size: int, stride: int, out_size, pad_before: int, include_pad: bool):
+    """Number of elements pytorch averages over in each window along one axis, a tensor if the size is dynamic"""
+    if isinstance(in_size, numbers.Integral):
+        starts = np.arange(out_size) * stride - pad_before
+        minimum, maximum = np.minimum, np.maximum
     else:
-        pad_layer = None
+        starts = tf.range(out_size) * stride - pad_before
+        minimum, maximum = tf.minimum, tf.maximum
+    ends = starts + kernel_size
+    if include_pad:
+        return minimum(ends, in_size + pad_before) - starts
+    return minimum(ends, in_size) - maximum(starts, 0)
+
+
+class PoolPadding:
+    """Padding of a 2D pooling with pytorch's geometry, for input sizes given as static ints or dynamic scalars. It is, from cheapest to costliest:
+    - 'valid' if windows don't cross the input's borders
+    - 'same' if Keras' same padding yields the same windows, for any size the dynamic dimensions may take
+    - otherwise an explicit pad followed by a valid pool, and a crop of the extra windows `ceil_mode` may produce on dynamic dimensions
+    Keras' pooling ignores the implicit padding of 'same', as pytorch's max pooling and `count_include_pad=False` do.
+    """
+
+    def __init__(self, input_size, kernel_size, stride, padding, ceil_mode):
+        self.input_size = input_size
+        self.kernel_size = kernel_size
+        self.stride = stride
+        self.ceil_mode = ceil_mode
+        self.output_size = [pool_output_size(i, k, s, p, ceil_mode) for i, k, s, p in zip(input_size, kernel_size, stride, padding)]
+        self.is_static = [isinstance(i, numbers.Integral) for i in input_size]
+
+        # Trailing padding the windows actually reach, it differs from the leading one with strides and `ceil_mode`.
+        # For dynamic sizes, that's the most they may reach
+        self.pads = []
+        for i, k, s, p, o, is_static in zip(input_size, kernel_size, stride, padding, self.output_size, self.is_static):
+            if is_static:
+                self.pads.append((p, max((o - 1) * s + k - i - p, 0)))
+            else:
+                self.pads.append((p, p + s - 1 if ceil_mode else p))
+        self.needs_crop = ceil_mode and not all(is_static or s == 1 for is_static, s in zip(self.is_static, stride))
+
+        def is_same(i, k, s, o, pad_before, is_static):
+            if not is_static:
+                return s == 1 and 2 * pad_before == k - 1
+            return o == -(-i // s) and max((o - 1) * s + k - i, 0) // 2 == pad_before
+
+        if all(pad == (0, 0) for pad in self.pads):
+            self.mode = 'valid'
+        elif all(is_same(i, k, s, o, pad_before, is_static)
+                 for i, k, s, o, (pad_before, _), is_static in zip(input_size, kernel_size, stride, self.output_size, self.pads, self.is_static)):
+            self.mode = 'same'
+        else:
+            self.mode = None
+
+    def get_keras_padding(self) -> str:
+        return 'valid' if self.mode is None else self.mode
+
+    def pad(self, x, constant_value):
+        if self.mode is not None:
+            return x
+        return tf.pad(x, [[0, 0], *self.pads, [0, 0]], constant_values=constant_value)
+
+    def crop(self, x):
+        if not self.needs_crop:
+            return x
+        return x[:, :self.output_size[0], :self.output_size[1], :]
+
+    def get_divisor_correction(self, count_include_pad: bool, divisor_override: Optional[int]):
+        """Factor to multiply Keras' average pooling by to get pytorch's, None if it's 1.
+        It's computed in the graph if window counts along a dynamic dimension are not uniform.
+        """
+        factors = []
+        for axis, (i, k, s, o, (pad_before, _), is_static) in enumerate(zip(self.input_size, self.kernel_size, self.stride, self.output_size, self.pads, self.is_static)):
+            if self.mode == 'same':
+                keras_counts = pool_window_counts(i, k, s, o, pad_before, include_pad=False)
+            else:
+                keras_counts = k
+
+            if divisor_override:
+                factor = keras_counts
+            elif not is_static and self.mode is None and count_include_pad and not self.ceil_mode:
+                # Symmetrically padded, every window lies within the padded input
+                factor = 1
+            else:
+                factor = keras_counts / pool_window_counts(i, k, s, o, pad_before, include_pad=count_include_pad)
 
-    def func(input, kernel_size, stride=(), padding=0, dilation=1, ceil_mode=False):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        return keras.layers.MaxPool2D(pool_size=kernel_size, strides=stride, padding='valid')(input)
+            shape = [1, 1, 1, 1]
+            shape[axis + 1] = -1
+            if tf.is_tensor(factor):
+                factor = tf.reshape(tf.cast(factor, tf.float32), shape)
+            elif np.ndim(factor) > 0:
+                factor = np.reshape(np.asarray(factor, dtype=np.float32), shape)
+            factors.append(factor)
+        scale = np.float32(1 / divisor_override if divisor_override else 1)
+
+        factor_h, factor_w = factors
+        if tf.is_tensor(factor_h) or tf.is_tensor(factor_w):
+            return tf.math.multiply(factor_h, factor_w) * scale
+        correction = np.float32(factor_h * factor_w * scale)
+        if np.all(correction == 1):
+            return None
+        return correction
+
+
+@converter(torch.max_pool2d)
+def converter_max_pool_2d(input: Tensor, kernel_size: Union[_int, _size], stride: Union[_int, _size]=(), padding: Union[_int, _size]=0, dilation: Union[_int, _size]=1, ceil_mode: _bool=False):
+    kernel_size = _pair(kernel_size)
+    stride = _pair(stride) if stride else kernel_size
+    padding = _pair(padding)
+
+    if _pair(dilation) != (1, 1):
+        raise Exception('Unsupported parameters for max_pool2d: dilation=', dilation)
+
+    # Padding is decided from the static shape of the Keras input, a layer is created for every padding mode it needs
+    pool_layers = {}
+
+    def func(input, *args, **kwargs):
+        pool_padding = PoolPadding(_shape_list(input)[1:3], kernel_size, stride, padding, ceil_mode)
+        keras_padding = pool_padding.get_keras_padding()
+        if keras_padding not in pool_layers:
+            pool_layers[keras_padding] = keras.layers.MaxPool2D(pool_size=kernel_size, strides=stride, padding=keras_padding)
+        input = pool_padding.pad(input, -np.inf)
+        return pool_padding.crop(pool_layers[keras_padding](input))
     return func
 
 
 @converter(F.avg_pool2d)
 def converter_avg_pool2d(input, kernel_size, stride=None, padding=0, ceil_mode=False, count_include_pad=True, divisor_override=None):
-    if isinstance(kernel_size, numbers.Number):
-        kernel_size = (kernel_size, kernel_size)
-
-    if isinstance(padding, numbers.Number):
-        padding = (padding, padding)
+    kernel_size = _pair(kernel_size)
+    stride = _pair(stride) if stride else kernel_size
+    padding = _pair(padding)
 
-    if padding != (0, 0):
-        kh, kw = kernel_size
-        pad = ((kh - 1) - padding[0], (kw - 1) - padding[1])
-        pad_layer = keras.layers.ZeroPadding2D(pad)
-    else:
-        pad_layer = None
+    # Padding is decided from the static shape of the Keras input, a layer is created for every padding mode it needs
+    pool_layers = {}
 
-    def func(input, kernel_size, stride=None, padding=0, ceil_mode=False, count_include_pad=True, divisor_override=None):
-        if pad_layer is not None:
-            input = pad_layer(input)
-        return keras.layers.AvgPool2D(pool_size=kernel_size, strides=stride)(input)
+    def func(input, *args, **kwargs):
+        pool_padding = PoolPadding(_shape_list(input)[1:3], kernel_size, stride, padding, ceil_mode)
+        keras_padding = pool_padding.get_keras_padding()
+        if keras_padding not in pool_layers:
+            pool_layers[keras_padding] = keras.layers.AvgPool2D(pool_size=kernel_size, strides=stride, padding=keras_padding)
+        input = pool_padding.pad(input, 0)
+        output = pool_padding.crop(pool_layers[keras_padding](input))
+        correction = pool_padding.get_divisor_correction(count_include_pad, divisor_override)
+        if correction is not None:
+            output = output * correction
+        return output
     return func
 
 
+def adaptive_pool_bins(in_size: int, out_size: int) -> List[Tuple[int, int]]:
+    """(start, end) of each adaptive pooling bin along one axis, as pytorch computes them"""
+    return [((i * in_size) // out_size, -(-((i + 1) * in_size) // out_size)) for i in range(out_size)]
+
+
+def adaptive_pool_window(bins: List[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """(pool_size, stride) of a strided pool whose windows are the bins, if there is one"""
+    sizes = {end - start for start, end in bins}
+    if len(sizes) != 1:
+        return None
+    pool_size = sizes.pop()
+    stride = bins[1][0] - bins[0][0] if len(bins) > 1 else pool_size
+    if all(start == i * stride for i, (start, _) in enumerate(bins)):
+        return pool_size, stride
+    return None
+
+
+def make_adaptive_pool(input_size, output_size, pool_layer_class, reduce_func):
+    """Adaptive pooling of a channel-last tensor, planned from the static input sizes (None if dynamic).
+    Pooling to 1x1 is a global reduction. If the bins along both axes are windows of a strided pool, that's a single pooling layer.
+    Otherwise each axis is pooled separately (both average and max pooling are separable):
+    reduced whole if its output size is 1, with a strided pool if possible, or as reduced slices concatenated together.
+    Bounds of the slices along a dynamic axis are computed in the graph.
+    Returns the pooling function and a description of the chosen strategy.
+    """
+    output_size = [i if o is None else o for i, o in zip(input_size, _pair(output_size))]
+
+    if output_size == [1, 1]:
+        def func(x):
+            return reduce_func(x, axis=[1, 2], keepdims=True)
+        return func, 'Global reduction'
+
+    is_static = [isinstance(i, numbers.Integral) for i in input_size]
+    bins_list = [adaptive_pool_bins(i, o) if static else None for i, o, static in zip(input_size, output_size, is_static)]
+    windows = [adaptive_pool_window(bins) if bins is not None else None for bins in bins_list]
+
+    if all(window is not None for window in windows):
+        (kh, sh), (kw, sw) = windows
+        pool_layer = pool_layer_class(pool_size=(kh, kw), strides=(sh, sw))
+        return pool_layer, f'Strided pool {kh}x{kw}, stride {sh}x{sw}'
+
+    def dynamic_bins(x, axis, out_size):
+        in_size = tf.shape(x)[axis]
+        return [((i * in_size) // out_size, -(-((i + 1) * in_size) // out_size)) for i in range(out_size)]
+
+    def pool_axis(x, axis, out_size, bins, window):
+        if out_size == 1:
+            return reduce_func(x, axis=axis, keepdims=True)
+        if window is not None:
+            pool_size, stride = window
+            pool_size = (pool_size, 1) if axis == 1 else (1, pool_size)
+            strides = (stride, 1) if axis == 1 else (1, stride)
+            return pool_layer_class(pool_size=pool_size, strides=strides)(x)
+        if bins is None:
+            bins = dynamic_bins(x, axis, out_size)
+        slices = [(slice(None),) * axis + (slice(start, end),) for start, end in bins]
+        return tf.concat([reduce_func(x[slc], axis=axis, keepdims=True) for slc in slices], axis=axis)
+
+    def func(x):
+        for axis, out_size, bins, window in zip([1, 2], output_size, bins_list, windows):
+            if out_size is not None and window != (1, 1):
+                x = pool_axis(x, axis, out_size, bins, window)
+        return x
+
+    def describe(out_size, bins, window):
+        if out_size is None or window == (1, 1):
+            return 'identity'
+        elif out_size == 1:
+            return 'reduction'
+        elif window is not None:
+            return f'strided pool {window[0]}/{window[1]}'
+        elif bins is not None:
+            return f'{len(bins)} pooled slices'
+        return f'{out_size} pooled slices of dynamic bounds'
+
+    strategies = [describe(o, bins, window) for o, bins, window in zip(output_size, bins_list, windows)]
+    return func, f'Separable: {strategies[0]} along H, {strategies[1]} along W'
+
+
+def adaptive_pool_converter_func(input: Tensor, output_size, pool_layer_class, reduce_func):
+    """Converter function of an adaptive pooling. Pools are planned from the static shape of the Keras input,
+    one for every input size it's called with. The note describes the plan for the traced input.
+    """
+    traced_size = tuple(input.shape[2:])
+    pool, note = make_adaptive_pool(traced_size, output_size, pool_layer_class, reduce_func)
+    pools = {traced_size: pool}
+
+    def func(input, *args, **kwargs):
+        input_size = tuple(input.shape[1:3])
+        if input_size not in pools:
+            pools[input_size], _ = make_adaptive_pool(input_size, output_size, pool_layer_class, reduce_func)
+        return pools[input_size](input)
+    return set_conversion_note(func, note)
+
+
 @converter(F.adaptive_avg_pool2d)
-def converter_adaptiveAvgPool2D(input: Tensor, output_size):
-    if output_size == (1, 1) or output_size == 1:
-        pool_size = input.shape[2:]
-        def func(input, output_size):
-            return keras.layers.AvgPool2D(pool_size=pool_size)(input)
-        return func
-    else:
-        raise Exception('Unsupported parameters for adaptive_avg_pool2d')
+def converter_adaptive_avg_pool2d(input: Tensor, output_size):
+    return adaptive_pool_converter_func(input, output_size, keras.layers.AvgPool2D, tf.reduce_mean)
+
+
+@converter(F.adaptive_max_pool2d)
+def converter_adaptive_max_pool2d(input: Tensor, output_size, return_indices: bool = False):
+    if return_indices:
+        raise Exception('Unsupported parameters for adaptive_max_pool2d: return_indices=True')
+    return adaptive_pool_converter_func(input, output_size, keras.layers.MaxPool2D, tf.reduce_max)
+
+
+def pixel_shuffle_reference(x, upscale_factor):
+    """Previous lowering, kept as a reference for validation"""
+    x = tf.concat([x[..., i::upscale_factor**2] for i in range(upscale_factor**2)], axis=-1)
+    x = tf.nn.depth_to_space(x, upscale_factor)
+    return x
+
+
+def pixel_shuffle(x, upscale_factor):
+    """Pixel shuffle of a channel-last tensor as one reshape/transpose/reshape.
+    Batch and height are merged to keep the transpose 5-dimensional.
+    """
+    r = upscale_factor
+    n, h, w, c = _shape_list(x)
+    c_out = c // (r * r)
+    x = _reshape(x, [-1, w, c_out, r, r])
+    x = _transpose(x, perm=[0, 3, 1, 4, 2])
+    return _reshape(x, [n, h * r, w * r, c_out])
+
+
+def pixel_unshuffle(x, downscale_factor):
+    """Pixel unshuffle of a channel-last tensor as one reshape/transpose/reshape"""
+    r = downscale_factor
+    n, h, w, c = _shape_list(x)
+    x = _reshape(x, [-1, r, w // r, r, c])
+    x = _transpose(x, perm=[0, 2, 4, 1, 3])
+    return _reshape(x, [n, h // r, w // r, c * r * r])
 
 
 @converter(F.pixel_shuffle)
 def converter_pixel_shuffle(input: Tensor, upscale_factor: _int):
     def func(input, upscale_factor):
-        x = input
-        x = tf.concat([x[..., i::upscale_factor**2] for i in range(upscale_factor**2)], axis=-1)
-        x = tf.nn.depth_to_space(x, upscale_factor)
-        return x
+        return pixel_shuffle(input, upscale_factor)
+    return func
+
+
+@converter(F.pixel_unshuffle)
+def converter_pixel_unshuffle(input: Tensor, downscale_factor: _int):
+    def func(input, downscale_factor):
+        return pixel_unshuffle(input, downscale_factor)
     return func
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import tensorflow as tf
 from tensorflow import keras
 from torch import nn
@@ -6,91 +8,250 @@ import numpy as np
 
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy
 from nobuco.converters.node_converter import converter
+from nobuco.converters.tensor import _squeeze, _expand_dims
 
 
-@converter(nn.GRU, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
-def converter_GRU(self: nn.GRU, input, hx=None):
-    assert not self.bidirectional
+class RecurrentUnrolling:
+    """Recurrent layers are unrolled over static sequences of at most `max_steps` steps.
+    Longer and dynamic sequences are processed in a loop, which Keras runs with the fused cuDNN kernel when it's available.
+    A single frame is processed by a fused step cell without a sequence dimension.
+    """
+
+    max_steps = 16
+
+    @classmethod
+    def get_mode(cls, num_steps: Optional[int]) -> str:
+        if num_steps == 1:
+            return 'step'
+        elif num_steps is not None and num_steps <= cls.max_steps:
+            return 'unrolled'
+        else:
+            return 'loop'
+
 
+def get_recurrent_params(self: nn.Module, suffix: str, num_gates: int):
+    """Returns transposed input and hidden weights, and input and hidden biases (zero if the module has none)"""
+    weight_ih = getattr(self, f'weight_ih{suffix}').detach().numpy().transpose((1, 0))
+    weight_hh = getattr(self, f'weight_hh{suffix}').detach().numpy().transpose((1, 0))
+    if self.bias:
+        bias_ih = getattr(self, f'bias_ih{suffix}').detach().numpy()
+        bias_hh = getattr(self, f'bias_hh{suffix}').detach().numpy()
+    else:
+        # Zero bias keeps the layer eligible for the cuDNN kernel
+        bias_ih = np.zeros((num_gates * self.hidden_size,), dtype=weight_ih.dtype)
+        bias_hh = np.zeros((num_gates * self.hidden_size,), dtype=weight_ih.dtype)
+    return weight_ih, weight_hh, bias_ih, bias_hh
+
+
+def get_gru_weights(self: nn.GRU, suffix: str):
+    # Pytorch gate order is (r, z, n), Keras' is (z, r, n)
     def reorder(param):
         assert param.shape[-1] % 3 == 0
         p1, p2, p3 = np.split(param, 3, axis=-1)
         return np.concatenate([p2, p1, p3], axis=-1)
 
-    grus = []
-    for i in range(self.num_layers):
-        weight_ih = self.__getattr__(f'weight_ih_l{i}').detach().numpy().transpose((1, 0))
-        weight_hh = self.__getattr__(f'weight_hh_l{i}').detach().numpy().transpose((1, 0))
-        bias_ih = self.__getattr__(f'bias_ih_l{i}').detach().numpy()
-        bias_hh = self.__getattr__(f'bias_hh_l{i}').detach().numpy()
+    weight_ih, weight_hh, bias_ih, bias_hh = get_recurrent_params(self, suffix, num_gates=3)
+    return [reorder(weight_ih), reorder(weight_hh), np.stack([reorder(bias_ih), reorder(bias_hh)], axis=0)]
+
+
+def get_lstm_weights(self: nn.LSTM, suffix: str):
+    weight_ih, weight_hh, bias_ih, bias_hh = get_recurrent_params(self, suffix, num_gates=4)
+    return [weight_ih, weight_hh, bias_ih + bias_hh]
+
+
+def make_gru_step(self: nn.Module, suffix: str):
+    """Single GRU step without a sequence dimension.
+    Input and hidden gates are computed by two matmuls, as the candidate needs the hidden part separately
+    (a single matmul of concatenated input and state would spend a third of its work on zero blocks).
+    """
+    weight_ih, weight_hh, bias_ih, bias_hh = get_recurrent_params(self, suffix, num_gates=3)
+    hidden_size = self.hidden_size
+    rz = slice(0, 2 * hidden_size)
+
+    # The reset and update gates' biases are folded into the input gates
+    bias_ih = np.concatenate([bias_ih[rz] + bias_hh[rz], bias_ih[2 * hidden_size:]])
+    bias_hh = np.concatenate([np.zeros_like(bias_hh[rz]), bias_hh[2 * hidden_size:]])
+    dense_ih = keras.layers.Dense(3 * hidden_size, weights=[weight_ih, bias_ih])
+    dense_hh = keras.layers.Dense(3 * hidden_size, weights=[weight_hh, bias_hh])
+
+    def step(x, states):
+        h, = states
+        gates_x = dense_ih(x)
+        gates_h = dense_hh(h)
+        rz_x, n_x = tf.split(gates_x, [2 * hidden_size, hidden_size], axis=-1)
+        rz_h, n_h = tf.split(gates_h, [2 * hidden_size, hidden_size], axis=-1)
+        r, z = tf.split(tf.sigmoid(rz_x + rz_h), 2, axis=-1)
+        n = tf.tanh(n_x + r * n_h)
+        return [n + z * (h - n)]
+    return step
+
+
+def make_lstm_step(self: nn.Module, suffix: str):
+    """Single LSTM step without a sequence dimension, gates are computed by one matmul of concatenated input and state"""
+    weight_ih, weight_hh, bias_ih, bias_hh = get_recurrent_params(self, suffix, num_gates=4)
+    kernel = np.concatenate([weight_ih, weight_hh], axis=0)
+    dense = keras.layers.Dense(4 * self.hidden_size, weights=[kernel, bias_ih + bias_hh])
+
+    def step(x, states):
+        h, c = states
+        gates = dense(tf.concat([x, h], axis=-1))
+        i, f, g, o = tf.split(gates, 4, axis=-1)
+        c = tf.sigmoid(f) * c + tf.sigmoid(i) * tf.tanh(g)
+        h = tf.sigmoid(o) * tf.tanh(c)
+        return [h, c]
+    return step
+
+
+def zero_states(x, hidden_size, num_states):
+    zeros = tf.zeros(tf.stack([tf.shape(x)[0], hidden_size]), dtype=x.dtype)
+    return [zeros] * num_states
+
+
+def make_recurrent_layers(self: nn.RNNBase, create_layer, create_step):
+    """Lazily creates `create_layer(weights_suffix, go_backwards, unroll)` or `create_step(weights_suffix)` for every layer and direction.
+    The mode is only known once the sequence length of the Keras input is, so several variants may be needed.
+    """
+    directions = [('', False), ('_reverse', True)] if self.bidirectional else [('', False)]
+    layers = {}
 
-        weight_ih = reorder(weight_ih)
-        weight_hh = reorder(weight_hh)
-        bias_ih = reorder(bias_ih)
-        bias_hh = reorder(bias_hh)
+    def get_layers(mode):
+        if mode not in layers:
+            if mode == 'step':
+                create = lambda suffix, go_backwards: create_step(suffix)
+            else:
+                create = lambda suffix, go_backwards: create_layer(suffix, go_backwards, mode == 'unrolled')
+            layers[mode] = [[create(f'_l{i}{suffix}', go_backwards) for suffix, go_backwards in directions]
+                            for i in range(self.num_layers)]
+        return layers[mode]
+    return get_layers
 
-        gru = keras.layers.GRU(
+
+def run_recurrent_layers(self: nn.RNNBase, get_layers, input, initial_states, num_state_tensors):
+    """Runs stacked (possibly bidirectional) recurrent layers.
+    `initial_states` are lists of state tensors ordered like in pytorch: layer-major, direction-minor.
+    """
+    time_axis = 1 if self.batch_first else 0
+    mode = RecurrentUnrolling.get_mode(input.shape[time_axis])
+    layers = get_layers(mode)
+
+    x = input
+    if mode == 'step':
+        x = _squeeze(x, axis=time_axis)
+
+    states = []
+    for directional_layers in layers:
+        outputs = []
+        for layer in directional_layers:
+            initial_state = initial_states[len(states)] if initial_states is not None else None
+            if mode == 'step':
+                if initial_state is None:
+                    initial_state = zero_states(x, self.hidden_size, num_state_tensors)
+                state = layer(x, initial_state)
+                output = state[0]
+            else:
+                output, *state = layer(x, initial_state=initial_state)
+                if layer.go_backwards:
+                    output = tf.reverse(output, axis=[time_axis])
+            outputs.append(output)
+            states.append(state)
+        x = tf.concat(outputs, axis=-1) if len(outputs) > 1 else outputs[0]
+
+    if mode == 'step':
+        x = _expand_dims(x, axis=time_axis)
+    return x, states
+
+
+@converter(nn.GRU, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_GRU(self: nn.GRU, input, hx=None):
+    num_states = self.num_layers * (2 if self.bidirectional else 1)
+
+    def create_layer(suffix, go_backwards, unroll):
+        return keras.layers.GRU(
             units=self.hidden_size,
             activation='tanh',
             recurrent_activation='sigmoid',
-            use_bias=self.bias,
+            use_bias=True,
             dropout=self.dropout,
             return_sequences=True,
             return_state=True,
+            go_backwards=go_backwards,
             time_major=not self.batch_first,
             reset_after=True,
-            unroll=True,
-            weights=[weight_ih, weight_hh, tf.stack([bias_ih, bias_hh], axis=0)],
+            unroll=unroll,
+            weights=get_gru_weights(self, suffix),
         )
-        grus.append(gru)
+
+    get_layers = make_recurrent_layers(self, create_layer, lambda suffix: make_gru_step(self, suffix))
 
     def func(input, hx=None):
-        x = input
-        hxs = []
-        for i in range(len(grus)):
-            initial_state = hx[i] if hx is not None else None
-            x, hxo = grus[i](x, initial_state=initial_state)
-            hxs.append(hxo)
-        hxs = tf.stack(hxs, axis=0)
+        initial_states = [[hx[i]] for i in range(num_states)] if hx is not None else None
+        x, states = run_recurrent_layers(self, get_layers, input, initial_states, num_state_tensors=1)
+        hxs = tf.stack([h for h, in states], axis=0)
         return x, hxs
     return func
 
 
 @converter(nn.LSTM, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
 def converter_LSTM(self: nn.LSTM, input, hx=None):
-    assert not self.bidirectional
+    assert self.proj_size == 0
 
-    lstms = []
-    for i in range(self.num_layers):
-        weight_ih = self.__getattr__(f'weight_ih_l{i}').detach().numpy().transpose((1, 0))
-        weight_hh = self.__getattr__(f'weight_hh_l{i}').detach().numpy().transpose((1, 0))
-        bias_ih = self.__getattr__(f'bias_ih_l{i}').detach().numpy()
-        bias_hh = self.__getattr__(f'bias_hh_l{i}').detach().numpy()
+    num_states = self.num_layers * (2 if self.bidirectional else 1)
 
-        lstm = keras.layers.LSTM(
+    def create_layer(suffix, go_backwards, unroll):
+        return keras.layers.LSTM(
             units=self.hidden_size,
             activation='tanh',
             recurrent_activation='sigmoid',
-            use_bias=self.bias,
+            use_bias=True,
             dropout=self.dropout,
             return_sequences=True,
             return_state=True,
+            go_backwards=go_backwards,
             time_major=not self.batch_first,
-            unroll=True,
-            weights=[weight_ih, weight_hh, bias_ih + bias_hh],
+            unroll=unroll,
+            weights=get_lstm_weights(self, suffix),
         )
-        lstms.append(lstm)
+
+    get_layers = make_recurrent_layers(self, create_layer, lambda suffix: make_lstm_step(self, suffix))
 
     def func(input, hx=None):
-        x = input
-        hxs = []
-        cxs = []
-        for i in range(len(lstms)):
-            initial_state = (hx[0][i], hx[1][i]) if hx is not None else None
-            x, hxo, cxo = lstms[i](x, initial_state=initial_state)
-            hxs.append(hxo)
-            cxs.append(cxo)
-        hxs = tf.stack(hxs, axis=0)
-        cxs = tf.stack(cxs, axis=0)
+        initial_states = [[hx[0][i], hx[1][i]] for i in range(num_states)] if hx is not None else None
+        x, states = run_recurrent_layers(self, get_layers, input, initial_states, num_state_tensors=2)
+        hxs = tf.stack([h for h, c in states], axis=0)
+        cxs = tf.stack([c for h, c in states], axis=0)
         return x, (hxs, cxs)
     return func
+
+
+@converter(nn.GRUCell, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_GRUCell(self: nn.GRUCell, input, hx=None):
+    step = make_gru_step(self, '')
+    is_batched = input.dim() == 2
+
+    def func(input, hx=None):
+        if not is_batched:
+            input = _expand_dims(input, 0)
+            hx = _expand_dims(hx, 0) if hx is not None else None
+        states = [hx] if hx is not None else zero_states(input, self.hidden_size, 1)
+        h, = step(input, states)
+        if not is_batched:
+            h = _squeeze(h, 0)
+        return h
+    return func
+
+
+@converter(nn.LSTMCell, channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def converter_LSTMCell(self: nn.LSTMCell, input, hx=None):
+    step = make_lstm_step(self, '')
+    is_batched = input.dim() == 2
+
+    def func(input, hx=None):
+        if not is_batched:
+            input = _expand_dims(input, 0)
+            hx = (_expand_dims(hx[0], 0), _expand_dims(hx[1], 0)) if hx is not None else None
+        states = [hx[0], hx[1]] if hx is not None else zero_states(input, self.hidden_size, 2)
+        h, c = step(input, states)
+        if not is_batched:
+            h, c = _squeeze(h, 0), _squeeze(c, 0)
+        return h, c
+    return func
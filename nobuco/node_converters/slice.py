@@ -6,7 +6,9 @@ import numpy as np
 from nobuco.commons import ChannelOrder, ChannelOrderingStrategy
 from nobuco.converters.channel_ordering import set_channel_order, get_channel_order
 from nobuco.converters.node_converter import converter
-from nobuco.converters.tensor import perm_keras2pytorch, _permute, _flatten, permute_pytorch2keras, _ensure_iterable
+from nobuco.converters.fusion import CoalescedSetItem
+from nobuco.converters.tensor import perm_keras2pytorch, perm_pytorch2keras, is_identity_perm, _permute, _flatten, permute_pytorch2keras, _ensure_iterable, _transpose, _reshape, _shape_list, _expand_dims
+from nobuco.layers.weight import get_constant_value
 from nobuco.node_converters.boolean_mask import converter_masked_select
 
 
@@ -31,6 +33,144 @@ def slices_make_full(slices, n_dims):
     return slices_full
 
 
+def slices_expand_ellipsis(slices, n_dims):
+    # Identity checks, as slices may hold tensors
+    ellipsis_positions = [i for i, slc in enumerate(slices) if slc is Ellipsis]
+    if not ellipsis_positions:
+        return slices
+    i = ellipsis_positions[0]
+    n_pads = n_dims - len([slc for slc in slices if slc is not None and slc is not Ellipsis])
+    return slices[:i] + (slice(None),) * n_pads + slices[i + 1:]
+
+
+def static_slice_ranges(shape, slice_args):
+    """Returns (axis, start, stop, step) of every sliced axis, or None if the slices are not static.
+    `stop` is None if the slice runs to the end of an axis of unknown size.
+    """
+    ranges = []
+    for axis, (size, slice_spec) in enumerate(zip(shape, slice_args)):
+        if not isinstance(slice_spec, slice):
+            return None
+        if slice_spec == slice(None):
+            continue
+
+        if size is not None:
+            start, stop, step = slice_spec.indices(size)
+            if (start, stop, step) == (0, size, 1):
+                continue
+        else:
+            start, stop, step = slice_spec.start or 0, slice_spec.stop, slice_spec.step or 1
+            if step != 1 or start < 0 or (stop is not None and stop < 0):
+                return None
+        ranges.append((axis, start, stop, step))
+    return ranges
+
+
+def _axis_slice(axis, start, stop):
+    return (slice(None),) * axis + (slice(start, stop),)
+
+
+def _broadcast_to_slice(x, assigned_tensor, ranges):
+    box = [slice(None)] * len(x.shape)
+    box_shape = list(x.shape)
+    for axis, start, stop, step in ranges:
+        box[axis] = slice(start, stop, step)
+        box_shape[axis] = len(range(start, stop, step)) if stop is not None else None
+
+    if not tf.is_tensor(assigned_tensor):
+        assigned_tensor = tf.convert_to_tensor(assigned_tensor, dtype=x.dtype)
+    if None in box_shape:
+        if assigned_tensor.shape.rank != len(box_shape) or not assigned_tensor.shape.is_compatible_with(box_shape):
+            assigned_tensor = tf.broadcast_to(assigned_tensor, tf.shape(x[tuple(box)]))
+    elif assigned_tensor.shape != box_shape:
+        assigned_tensor = tf.broadcast_to(assigned_tensor, box_shape)
+    return assigned_tensor
+
+
+def slice_assign_static(sliced_tensor, assigned_tensor, ranges):
+    """Assign a tensor to a static slice of another tensor without building index grids.
+    Contiguous slices are written by concatenating the untouched parts around the assigned tensor,
+    strided ones by a `tf.where` with a static mask.
+    """
+    x = sliced_tensor
+    assigned_tensor = _broadcast_to_slice(x, assigned_tensor, ranges)
+
+    if all(step == 1 for _, _, _, step in ranges):
+        def assign_box(x, ranges):
+            (axis, start, stop, _), ranges = ranges[0], ranges[1:]
+            box = x[_axis_slice(axis, start, stop)]
+            value = assign_box(box, ranges) if ranges else assigned_tensor
+            parts = [x[_axis_slice(axis, None, start)], value]
+            if stop is not None:
+                parts.append(x[_axis_slice(axis, stop, None)])
+            parts = [part for part in parts if part.shape[axis] != 0]
+            return tf.concat(parts, axis=axis) if len(parts) > 1 else parts[0]
+        return assign_box(x, ranges)
+    else:
+        n_dims = len(x.shape)
+        value = assigned_tensor
+        mask = np.ones([1] * n_dims, dtype=bool)
+        for axis, start, stop, step in ranges:
+            size = x.shape[axis]
+            positions = np.arange(size)
+            axis_mask = np.zeros(size, dtype=bool)
+            axis_mask[start:stop:step] = True
+            # Spread the assigned values to their positions along the axis
+            indices = np.clip((positions - start) // step, 0, len(range(start, stop, step)) - 1)
+            value = tf.gather(value, indices, axis=axis)
+            mask = mask & axis_mask.reshape([size if i == axis else 1 for i in range(n_dims)])
+        return tf.where(mask, value, x)
+
+
+def slice_assign_static_multiple(sliced_tensor, assigned_tensors, ranges_list):
+    """Assign tensors to disjoint static slices of another tensor at once.
+    Writes into one axis are joined by a single concatenation, others by a single scatter with precomputed indices.
+    """
+    x = sliced_tensor
+    shape = x.shape
+    assigned_tensors = [_broadcast_to_slice(x, t, ranges) for t, ranges in zip(assigned_tensors, ranges_list)]
+
+    axes = sorted({axis for ranges in ranges_list for axis, _, _, _ in ranges})
+    if len(axes) == 1 and all(len(ranges) == 1 and ranges[0][3] == 1 for ranges in ranges_list):
+        axis = axes[0]
+        writes = sorted(zip([ranges[0] for ranges in ranges_list], assigned_tensors), key=lambda w: w[0][1])
+        parts = []
+        position = 0
+        for (_, start, stop, _), assigned_tensor in writes:
+            if start > position:
+                parts.append(x[_axis_slice(axis, position, start)])
+            parts.append(assigned_tensor)
+            position = stop
+        if position is not None and position != shape[axis]:
+            parts.append(x[_axis_slice(axis, position, None)])
+        return tf.concat(parts, axis=axis) if len(parts) > 1 else parts[0]
+
+    if any(shape[axis] is None for axis in axes):
+        for assigned_tensor, ranges in zip(assigned_tensors, ranges_list):
+            x = slice_assign_static(x, assigned_tensor, ranges)
+        return x
+
+    # Indexed axes go first, as tensor_scatter_nd_update expects
+    dims_left_out = [i_dim for i_dim in range(len(shape)) if i_dim not in axes]
+    perm = axes + dims_left_out
+    inverse_perm = list(np.argsort(perm))
+    left_out_shape = [shape[i_dim] if shape[i_dim] is not None else -1 for i_dim in dims_left_out]
+    assert left_out_shape.count(-1) <= 1
+
+    indices = []
+    updates = []
+    for assigned_tensor, ranges in zip(assigned_tensors, ranges_list):
+        axis_ranges = {axis: range(start, stop, step) for axis, start, stop, step in ranges}
+        grids = np.meshgrid(*[np.array(axis_ranges.get(axis, range(shape[axis]))) for axis in axes], indexing='ij')
+        indices.append(np.stack([grid.reshape(-1) for grid in grids], axis=-1))
+        update = _transpose(assigned_tensor, perm=perm)
+        updates.append(_reshape(update, [len(indices[-1])] + left_out_shape))
+
+    x = _transpose(x, perm=perm)
+    x = tf.tensor_scatter_nd_update(x, np.concatenate(indices, axis=0), tf.concat(updates, axis=0))
+    return _transpose(x, perm=inverse_perm)
+
+
 def slice_assign(sliced_tensor, assigned_tensor, *slice_args, verbose=0):
     """Assign a tensor to the slice of another tensor.
     No broadcast is performed.
@@ -90,10 +230,10 @@ def slice_assign(sliced_tensor, assigned_tensor, *slice_args, verbose=0):
     # reshaping the tensors
     # NOTE: the tensors are reshaped to allow for easier indexing with
     # tensor_scatter_nd_update
-    sliced_tensor_reshaped = tf.transpose(sliced_tensor, perm=scatted_nd_perm)
-    assigned_tensor_reshaped = tf.transpose(assigned_tensor, perm=scatted_nd_perm)
+    sliced_tensor_reshaped = _transpose(sliced_tensor, perm=scatted_nd_perm)
+    assigned_tensor_reshaped = _transpose(assigned_tensor, perm=scatted_nd_perm)
     left_out_shape = [shape[i_dim] for i_dim in dims_left_out]
-    assigned_tensor_reshaped = tf.reshape(assigned_tensor_reshaped, [-1] + left_out_shape)
+    assigned_tensor_reshaped = _reshape(assigned_tensor_reshaped, [-1] + left_out_shape)
     # creating the indices
     mesh_ranges = tf.meshgrid(*corresponding_ranges, indexing='ij')
     update_indices = tf.stack([
@@ -107,21 +247,104 @@ def slice_assign(sliced_tensor, assigned_tensor, *slice_args, verbose=0):
         indices=update_indices,
         updates=assigned_tensor_reshaped,
     )
-    sliced_tensor_updated = tf.transpose(
+    sliced_tensor_updated = _transpose(
         sliced_tensor_reshaped,
         perm=inverse_scatter_nd_perm,
     )
     return sliced_tensor_updated
 
 
-@converter(channel_ordering_strategy=ChannelOrderingStrategy.FORCE_PYTORCH_ORDER)
+def gather_adjacent_axes(x, indices, first_axis):
+    """Gathers along adjacent axes by merging them into one and linearizing the indices"""
+    shape = _shape_list(x)
+    axes = range(first_axis, first_axis + len(indices))
+    linear_indices = indices[0]
+    for axis, index in zip(axes[1:], indices[1:]):
+        linear_indices = linear_indices * shape[axis] + index
+    merged_size = np.prod([shape[axis] for axis in axes])
+    x = _reshape(x, shape[:first_axis] + [merged_size] + shape[first_axis + len(indices):])
+    return tf.gather(x, linear_indices, axis=first_axis)
+
+
+def gather_nd_axes(x, indices, axes, broadcast_shape):
+    """Gathers along arbitrary axes, the result has the broadcast index dimensions first"""
+    n_dims = len(x.shape)
+    other_axes = [axis for axis in range(n_dims) if axis not in axes]
+    x = _transpose(x, perm=axes + other_axes)
+    indices = [tf.broadcast_to(index, broadcast_shape) for index in indices]
+    return tf.gather_nd(x, tf.stack(indices, axis=-1))
+
+
+@converter(channel_ordering_strategy=ChannelOrderingStrategy.MANUAL)
 def getitem_indexed(self, *slices):
-    slices = _flatten(slices)
-    slices = torch.broadcast_tensors(*slices)
-    slices_combined = torch.stack(slices, dim=-1).numpy()
+    """Indexing with integer tensors.
+    Index tensors along a single axis or adjacent axes become one `tf.gather` on a compact index,
+    others a `tf.gather_nd` with the indexed axes moved first, as pytorch does.
+    Indices are taken from the graph, so they may be dynamic.
+    Negative indices are wrapped unless the index is a constant without any.
+    """
+    n_dims = self.dim()
+    slices = slices_make_full(slices_expand_ellipsis(tuple(_flatten(slices)), n_dims), n_dims)
+
+    # Pytorch applies integer and None indices first, index tensors then select along the remaining axes
+    index_positions = [i for i, slc in enumerate(slices) if isinstance(slc, torch.Tensor)]
+    index_tensors = [slices[i] for i in index_positions]
+    index_axes = []
+    axis = 0
+    for slc in slices:
+        if isinstance(slc, torch.Tensor):
+            index_axes.append(axis)
+        if not isinstance(slc, int):
+            axis += 1
+    input_axes = [len([slc for slc in slices[:i] if slc is not None]) for i in index_positions]
+    broadcast_shape = list(torch.broadcast_shapes(*[index.shape for index in index_tensors]))
+    is_adjacent = index_axes == list(range(index_axes[0], index_axes[-1] + 1))
+
+    basic_slices = tuple(slice(None) if isinstance(slc, torch.Tensor) else slc for slc in slices)
+    has_basic_slices = any(not isinstance(slc, slice) or slc != slice(None) for slc in basic_slices)
+    keeps_rank = all(isinstance(slc, slice) for slc in basic_slices)
 
     def func(self, *slices):
-        return tf.gather_nd(self, slices_combined)
+        x = self
+        slices = slices_make_full(slices_expand_ellipsis(tuple(_flatten(slices)), n_dims), n_dims)
+
+        indices = []
+        for position, input_axis in zip(index_positions, input_axes):
+            index = slices[position]
+            index_value = get_constant_value(index)
+            if get_channel_order(index) == ChannelOrder.TENSORFLOW:
+                index = _permute(perm_keras2pytorch(len(index.shape)))(index)
+            if index_value is None or (index_value < 0).any():
+                if get_channel_order(self) == ChannelOrder.TENSORFLOW:
+                    input_axis = perm_pytorch2keras(n_dims).index(input_axis)
+                index = tf.where(index < 0, index + tf.cast(tf.shape(self)[input_axis], index.dtype), index)
+            indices.append(index)
+
+        if len(indices) == 1 and len(indices[0].shape) <= 1 and keeps_rank and get_channel_order(x) == ChannelOrder.TENSORFLOW:
+            # Output has the same rank, keep the channel order
+            if has_basic_slices:
+                x = x.__getitem__(tuple(permute_pytorch2keras(basic_slices)))
+            x = tf.gather(x, indices[0], axis=perm_pytorch2keras(n_dims).index(index_axes[0]))
+            return set_channel_order(x, ChannelOrder.TENSORFLOW)
+
+        if get_channel_order(x) == ChannelOrder.TENSORFLOW:
+            x = _permute(perm_keras2pytorch(n_dims))(x)
+        if has_basic_slices:
+            x = x.__getitem__(basic_slices)
+
+        if len(indices) == 1:
+            x = tf.gather(x, indices[0], axis=index_axes[0])
+        elif is_adjacent and all(x.shape[axis] is not None for axis in index_axes):
+            x = gather_adjacent_axes(x, indices, index_axes[0])
+        else:
+            x = gather_nd_axes(x, indices, index_axes, broadcast_shape)
+            if is_adjacent:
+                # Indexed dimensions stay in place
+                n_broadcast = len(broadcast_shape)
+                first_axis = index_axes[0]
+                perm = [n_broadcast + i for i in range(first_axis)] + list(range(n_broadcast)) + list(range(n_broadcast + first_axis, len(x.shape)))
+                x = _transpose(x, perm=perm)
+        return set_channel_order(x, ChannelOrder.PYTORCH)
     return func
 
 
@@ -131,11 +354,10 @@ def converter_getitem(self, *slices):
 
     slices = _flatten(slices)
 
-    if isinstance(slices[0], torch.Tensor):
-        if slices[0].dtype == torch.bool:
-            return converter_masked_select(self, slices[0])
-        elif slices[0].dtype == torch.int64:
-            return getitem_indexed.convert(self, slices)
+    if isinstance(slices[0], torch.Tensor) and slices[0].dtype == torch.bool:
+        return converter_masked_select(self, slices[0])
+    elif any(isinstance(slc, torch.Tensor) and not slc.dtype.is_floating_point and slc.dtype != torch.bool for slc in slices):
+        return getitem_indexed.convert(self, slices)
 
     def is_light(slices):
         return all(isinstance(slc, slice) for slc in slices)
@@ -168,14 +390,72 @@ def converter_getitem(self, *slices):
     return func
 
 
+def prepare_slice_assignment(sliced_tensor, slice_args, assigned_tensor, n_dims):
+    """Brings slices to the full form in the sliced tensor's channel order.
+    Integer indices become unit slices, and the assigned tensor gets back the dimensions they remove.
+    """
+    slice_args = slices_expand_ellipsis(tuple(_ensure_iterable(slice_args)), n_dims)
+    slice_args = slices_make_full(slice_args, n_dims)
+    is_tensorflow_order = get_channel_order(sliced_tensor) == ChannelOrder.TENSORFLOW
+
+    int_axes = [i for i, slice_spec in enumerate(slice_args) if isinstance(slice_spec, int)]
+    if int_axes:
+        slice_args = tuple(slice(s, s + 1 if s != -1 else None) if isinstance(s, int) else s for s in slice_args)
+
+    # Lower-rank tensors broadcast against trailing axes in pytorch order, so they are brought to full rank in that order first
+    if tf.is_tensor(assigned_tensor) and 0 < assigned_tensor.shape.rank < n_dims:
+        x = assigned_tensor
+        rank = x.shape.rank
+        if is_tensorflow_order and not is_identity_perm(perm_keras2pytorch(rank)):
+            x = _transpose(x, perm=perm_keras2pytorch(rank))
+        # Missing leading dimensions, as in broadcasting
+        for _ in range(n_dims - len(int_axes) - rank):
+            x = _expand_dims(x, axis=0)
+        for axis in int_axes:
+            x = _expand_dims(x, axis=axis)
+        if is_tensorflow_order:
+            x = _transpose(x, perm=perm_pytorch2keras(n_dims))
+        assigned_tensor = x
+
+    if is_tensorflow_order:
+        slice_args = permute_pytorch2keras(slice_args)
+    return slice_args, assigned_tensor
+
+
 @converter(torch.Tensor.__setitem__, channel_ordering_strategy=ChannelOrderingStrategy.MINIMUM_TRANSPOSITIONS)
 def converter_setitem(sliced_tensor, assigned_tensor, *slice_args):
     n_dims = sliced_tensor.dim()
 
     def func(sliced_tensor, slice_args, assigned_tensor):
-        if get_channel_order(sliced_tensor) == ChannelOrder.TENSORFLOW:
-            slice_args = _flatten(slice_args)
-            slice_args = slices_make_full(slice_args, n_dims)
-            slice_args = permute_pytorch2keras(slice_args)
+        slice_args, assigned_tensor = prepare_slice_assignment(sliced_tensor, slice_args, assigned_tensor, n_dims)
+
+        ranges = static_slice_ranges(sliced_tensor.shape, slice_args)
+        if ranges is not None:
+            if not ranges:
+                return tf.broadcast_to(tf.cast(assigned_tensor, sliced_tensor.dtype), tf.shape(sliced_tensor))
+            return slice_assign_static(sliced_tensor, assigned_tensor, ranges)
         return slice_assign(sliced_tensor, assigned_tensor, *slice_args)
     return func
+
+
+@converter(CoalescedSetItem, channel_ordering_strategy=ChannelOrderingStrategy.MINIMUM_TRANSPOSITIONS)
+def converter_CoalescedSetItem(self: CoalescedSetItem, sliced_tensor, *assigned_tensors):
+    n_dims = sliced_tensor.dim()
+
+    def func(sliced_tensor, *assigned_tensors):
+        slices_list = []
+        prepared_tensors = []
+        for key, assigned_tensor in zip(self.keys, assigned_tensors):
+            slice_args, assigned_tensor = prepare_slice_assignment(sliced_tensor, key, assigned_tensor, n_dims)
+            slices_list.append(slice_args)
+            prepared_tensors.append(assigned_tensor)
+
+        ranges_list = [static_slice_ranges(sliced_tensor.shape, slice_args) for slice_args in slices_list]
+        if all(ranges for ranges in ranges_list):
+            return slice_assign_static_multiple(sliced_tensor, prepared_tensors, ranges_list)
+
+        x = sliced_tensor
+        for slice_args, assigned_tensor in zip(slices_list, prepared_tensors):
+            x = slice_assign(x, assigned_tensor, *slice_args)
+        return x
+    return func
@@ -14,7 +14,7 @@ from nobuco.converters.channel_ordering import set_channel_order, get_channel_or
 from nobuco.converters.node_converter import converter
 from nobuco.converters.tensor import dims_pytorch2keras, perm_keras2pytorch, \
     _dim_make_positive, dim_pytorch2keras, _permute, _flatten, perm_pytorch2keras, perm_compose, \
-    is_identity_perm, permute_pytorch2keras, perm_identity
+    is_identity_perm, permute_pytorch2keras, perm_identity, _transpose, _reshape, _squeeze, _expand_dims
 
 
 def _permute_inner(perm_original, allow_lazy=True):
@@ -23,11 +23,11 @@ def _permute_inner(perm_original, allow_lazy=True):
 
         if allow_lazy:
             if input_channel_order == ChannelOrder.TENSORFLOW and list(perm_original) == perm_pytorch2keras(len(perm_original)):
-                x = tf.identity(x)
+                x = _relabel(x)
                 x = set_channel_order(x, ChannelOrder.PYTORCH)
                 return x
             elif input_channel_order == ChannelOrder.PYTORCH and list(perm_original) == perm_keras2pytorch(len(perm_original)):
-                x = tf.identity(x)
+                x = _relabel(x)
                 x = set_channel_order(x, ChannelOrder.TENSORFLOW)
                 return x
 
@@ -40,12 +40,20 @@ def _permute_inner(perm_original, allow_lazy=True):
         if is_identity_perm(perm):
             return x
         else:
-            x = tf.transpose(x, perm)
+            x = _transpose(x, perm)
             x = set_channel_order(x, input_channel_order)
             return x
     return func
 
 
+def _relabel(x):
+    # Same data, so the tensor is still a transpose of whatever it was derived from
+    relabeled = tf.identity(x)
+    if hasattr(x, 'transpose_origin'):
+        relabeled.transpose_origin = x.transpose_origin
+    return relabeled
+
+
 @converter(torch.Tensor.permute, channel_ordering_strategy=ChannelOrderingStrategy.MANUAL)
 def converter_t_permute(self, *dims):
     def func(self, *dims):
@@ -95,7 +103,7 @@ def converter_moveaxis(input: Tensor, source: _size, destination: _size):
 def converter_reshape(self, *shape):
     def func(self, *shape):
         shape = _flatten(shape)
-        return tf.reshape(self, tuple(shape))
+        return _reshape(self, tuple(shape))
     return func
 
 
@@ -103,7 +111,7 @@ def converter_reshape(self, *shape):
 def converter_reshape(input, *shape):
     def func(input, *shape):
         shape = _flatten(shape)
-        return tf.reshape(input, shape)
+        return _reshape(input, shape)
     return func
 
 
@@ -224,7 +232,7 @@ def converter_flatten(self, start_dim=0, end_dim=-1):
         else:
             end_shape = []
 
-        return tf.reshape(self, (*start_shape, -1, *end_shape))
+        return _reshape(self, (*start_shape, -1, *end_shape))
     return func
 
 
@@ -254,7 +262,7 @@ def converter_squeeze(input: Tensor, dim):
         if get_channel_order(x) == ChannelOrder.TENSORFLOW:
             perm = perm_keras2pytorch(n_dims)
             x = _permute(perm)(x)
-        x = tf.squeeze(x, axis=dim)
+        x = _squeeze(x, axis=dim)
         x = set_channel_order(x, ChannelOrder.PYTORCH)
         return x
     return func
@@ -268,7 +276,7 @@ def converter_unsqueeze(input, dim):
         if get_channel_order(x) == ChannelOrder.TENSORFLOW:
             perm = perm_keras2pytorch(n_dims)
             x = _permute(perm)(x)
-        x = tf.expand_dims(x, axis=dim)
+        x = _expand_dims(x, axis=dim)
         x = set_channel_order(x, ChannelOrder.PYTORCH)
         return x
     return func
@@ -82,6 +82,15 @@ def clone_torch_tensors_recursively(obj, annotate=True):
             return obj
 
     replace_dict = {id(c): replace_func(c) for c in collected}
+
+    if annotate:
+        # Modules are deep-copied as a whole, their parameters should keep the identifiers too (e.g. to recognize tied parameters)
+        for module in collect_recursively(obj, nn.Module):
+            for param in module.parameters():
+                if id(param) not in replace_dict:
+                    cloned = deepcopy(param)
+                    set_torch_tensor_id(cloned, get_torch_tensor_identifier(param))
+                    replace_dict[id(param)] = cloned
     return deepcopy(obj, memo=replace_dict)
 
 
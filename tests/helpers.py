@@ -0,0 +1,59 @@
+import contextlib
+import io
+import os
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+import numpy as np
+import torch
+
+import nobuco
+from nobuco import ChannelOrder
+
+
+def convert(module, args, **kwargs):
+    """Converts the module with pytorch channel order on both ends, returns the Keras model and the conversion log"""
+    kwargs.setdefault('inputs_channel_order', ChannelOrder.PYTORCH)
+    kwargs.setdefault('outputs_channel_order', ChannelOrder.PYTORCH)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        keras_model = nobuco.pytorch_to_keras(module, args, **kwargs)
+    return keras_model, log.getvalue()
+
+
+def flatten(obj):
+    if isinstance(obj, (list, tuple)):
+        return [el for o in obj for el in flatten(o)]
+    return [obj]
+
+
+def run_pytorch(module, args):
+    with torch.no_grad():
+        outputs = module(*args)
+    return [o.numpy() for o in flatten(outputs)]
+
+
+def to_keras_input(tensor, channel_order=ChannelOrder.PYTORCH):
+    """Input array in the layout the Keras model was converted for"""
+    array = tensor.numpy()
+    if channel_order == ChannelOrder.TENSORFLOW and array.ndim > 2:
+        array = array.transpose([0, *range(2, array.ndim), 1])
+    return array
+
+
+def run_keras(keras_model, args, inputs_channel_order=ChannelOrder.PYTORCH):
+    outputs = keras_model([to_keras_input(a, inputs_channel_order) for a in flatten(args)])
+    return [o.numpy() for o in flatten(outputs)]
+
+
+def assert_same_outputs(module, keras_model, args, atol=1e-4, inputs_channel_order=ChannelOrder.PYTORCH):
+    """Compares the outputs of the module and of the Keras model converted with pytorch output channel order"""
+    outputs_pt = run_pytorch(module, args)
+    outputs_tf = run_keras(keras_model, args, inputs_channel_order)
+    assert len(outputs_pt) == len(outputs_tf)
+    for output_pt, output_tf in zip(outputs_pt, outputs_tf):
+        assert output_pt.shape == output_tf.shape
+        np.testing.assert_allclose(output_tf, output_pt, atol=atol, rtol=0)
+
+
+def layer_kinds(keras_model):
+    return [getattr(layer, 'symbol', type(layer).__name__) for layer in keras_model.layers]
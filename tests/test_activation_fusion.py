@@ -0,0 +1,44 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class ConvActivations(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 8, 3, stride=2)
+        self.conv_transpose = nn.ConvTranspose2d(8, 4, 2, stride=2)
+        self.linear = nn.Linear(4, 6)
+
+    def forward(self, x):
+        y = F.relu(self.conv(x))
+        y = torch.sigmoid(self.conv_transpose(y))
+        return torch.tanh(self.linear(y.permute(0, 2, 3, 1)))
+
+
+@pytest.mark.parametrize('fuse_activation', [False, True])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_activation_fusion(fuse_activation, inputs_channel_order):
+    module = ConvActivations().eval()
+    x = torch.randn(2, 3, 9, 9)
+    keras_model, log = convert(module, [x], fuse_activation=fuse_activation, inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+    activations = [layer.get_config()['activation'] for layer in keras_model.layers if type(layer).__name__ in ('Conv2D', 'Conv2DTranspose', 'Dense')]
+    if fuse_activation:
+        assert sorted(activations) == ['relu', 'sigmoid', 'tanh']
+    else:
+        assert activations == ['linear'] * 3
+
+
+def test_activation_fusion_dynamic_shapes():
+    module = ConvActivations().eval()
+    x = torch.randn(2, 3, 9, 9)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, None)})
+    for shape in [(1, 3, 5, 5), (3, 3, 12, 7)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
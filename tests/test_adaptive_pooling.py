@@ -0,0 +1,74 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+POOLS = [nn.AdaptiveAvgPool2d, nn.AdaptiveMaxPool2d]
+
+CASES = [
+    ((8, 8), 1),
+    ((7, 5), (1, 1)),
+    ((8, 8), 2),
+    ((12, 12), (2, 3)),
+    ((12, 18), 6),
+    ((7, 7), 3),
+    ((13, 17), 6),
+    ((10, 9), (2, None)),
+    ((10, 9), (1, 4)),
+    ((9, 10), (5, 4)),
+    ((5, 5), 7),
+]
+
+DYNAMIC_OUTPUT_SIZES = [1, (1, 1), 2, (3, 5), (None, 1), (1, 4), (2, None)]
+
+
+class AdaptivePool(nn.Module):
+    def __init__(self, pool_class, output_size):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 3, 1)
+        self.pool = pool_class(output_size)
+
+    def forward(self, x):
+        return self.pool(self.conv(x))
+
+
+@pytest.mark.parametrize('pool_class', POOLS)
+@pytest.mark.parametrize('input_size,output_size', CASES)
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_adaptive_pool(pool_class, input_size, output_size, inputs_channel_order):
+    module = AdaptivePool(pool_class, output_size).eval()
+    x = torch.randn(2, 3, *input_size)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('pool_class', POOLS)
+@pytest.mark.parametrize('output_size', DYNAMIC_OUTPUT_SIZES)
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_adaptive_pool_dynamic_shapes(pool_class, output_size, inputs_channel_order):
+    module = AdaptivePool(pool_class, output_size).eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, None, None)})
+    for shape in [(2, 3, 8, 8), (1, 3, 13, 7), (3, 3, 6, 17)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('pool_class', POOLS)
+def test_adaptive_pool_partially_dynamic_shape(pool_class):
+    module = AdaptivePool(pool_class, (3, 4)).eval()
+    x = torch.randn(2, 3, 9, 8)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, 8)})
+    for shape in [(2, 3, 9, 8), (1, 3, 14, 8)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
+
+
+def test_global_adaptive_pool_is_reduction():
+    module = AdaptivePool(nn.AdaptiveAvgPool2d, 1).eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, None)})
+    assert 'Global reduction' in log
+    assert 'AveragePooling2D' not in [type(layer).__name__ for layer in keras_model.layers]
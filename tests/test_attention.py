@@ -0,0 +1,178 @@
+import pytest
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+EMBED_DIM, NUM_HEADS = 32, 4
+
+
+class Attention(nn.Module):
+    """Multi-head attention with packed (self), key/value packed or separate projections inputs"""
+
+    def __init__(self, packing, masks=(), batch_first=True, need_weights=True, average_attn_weights=True, **kwargs):
+        super().__init__()
+        self.attention = nn.MultiheadAttention(EMBED_DIM, NUM_HEADS, batch_first=batch_first, **kwargs)
+        self.packing = packing
+        self.masks = masks
+        self.need_weights = need_weights
+        self.average_attn_weights = average_attn_weights
+
+    def forward(self, query, key_value, *masks):
+        key = query if self.packing == 'qkv' else key_value
+        value = key if self.packing in ('qkv', 'q_kv') else key_value * 2
+        kwargs = {}
+        for name, mask in zip(self.masks, masks):
+            kwargs[name.rstrip('!')] = mask > 0.5 if name.endswith('!') else mask
+        output, weights = self.attention(query, key, value, need_weights=self.need_weights, average_attn_weights=self.average_attn_weights, **kwargs)
+        return output if weights is None else (output, weights)
+
+
+def make_inputs(packing, masks, batch_first=True, batched=True, batch=2, target_len=5, source_len=7):
+    if packing == 'qkv':
+        source_len = target_len
+
+    def shape(length):
+        if not batched:
+            return (length, EMBED_DIM)
+        return (batch, length, EMBED_DIM) if batch_first else (length, batch, EMBED_DIM)
+
+    inputs = [torch.randn(shape(target_len)), torch.randn(shape(source_len))]
+    for name in masks:
+        if name == 'attn_mask':
+            inputs.append(torch.randn(target_len, source_len))
+        elif name == 'attn_mask!':
+            inputs.append((torch.rand(target_len, source_len) > 0.7).float())
+        elif name == 'key_padding_mask':
+            inputs.append(torch.randn(batch, source_len) if batched else torch.randn(source_len))
+        elif name == 'key_padding_mask!':
+            mask = torch.zeros(batch, source_len)
+            mask[:, -2:] = 1
+            inputs.append(mask if batched else mask[0])
+    return inputs
+
+
+MASKS = [(), ('attn_mask',), ('attn_mask!',), ('key_padding_mask',), ('key_padding_mask!',), ('attn_mask', 'key_padding_mask')]
+
+
+@pytest.mark.parametrize('packing', ['qkv', 'q_kv', 'q_k_v'])
+@pytest.mark.parametrize('batch_first', [True, False])
+@pytest.mark.parametrize('masks', MASKS)
+def test_multihead_attention(packing, batch_first, masks):
+    module = Attention(packing, masks, batch_first=batch_first).eval()
+    inputs = make_inputs(packing, masks, batch_first=batch_first)
+    keras_model, log = convert(module, inputs)
+    # The reference is computed off pytorch's inference fast path, which yields NaNs for self-attention with float masks.
+    # Dropout is 0, training mode doesn't change the outputs otherwise
+    module.train()
+    assert_same_outputs(module, keras_model, inputs)
+
+
+@pytest.mark.parametrize('need_weights, average_attn_weights', [(False, True), (True, False)])
+@pytest.mark.parametrize('kwargs', [dict(bias=False), dict(add_bias_kv=True), dict(add_zero_attn=True), dict(kdim=16, vdim=24)])
+def test_multihead_attention_options(need_weights, average_attn_weights, kwargs):
+    module = Attention('q_k_v', need_weights=need_weights, average_attn_weights=average_attn_weights, **kwargs).eval()
+    query = torch.randn(2, 5, EMBED_DIM)
+    key = torch.randn(2, 7, kwargs.get('kdim', EMBED_DIM))
+    value = torch.randn(2, 7, kwargs.get('vdim', EMBED_DIM))
+
+    class SeparateInputs(nn.Module):
+        def __init__(self, attention):
+            super().__init__()
+            self.attention = attention
+
+        def forward(self, query, key, value):
+            output, weights = self.attention.attention(query, key, value, need_weights=need_weights, average_attn_weights=average_attn_weights)
+            return output if weights is None else (output, weights)
+
+    module = SeparateInputs(module).eval()
+    keras_model, log = convert(module, [query, key, value])
+    assert_same_outputs(module, keras_model, [query, key, value])
+
+
+@pytest.mark.parametrize('packing', ['qkv', 'q_kv', 'q_k_v'])
+@pytest.mark.parametrize('masks', [(), ('attn_mask',), ('key_padding_mask!',)])
+def test_multihead_attention_unbatched(packing, masks):
+    module = Attention(packing, masks).eval()
+    inputs = make_inputs(packing, masks, batched=False)
+    keras_model, log = convert(module, inputs)
+    assert_same_outputs(module, keras_model, inputs)
+
+
+@pytest.mark.parametrize('packing', ['qkv', 'q_kv'])
+@pytest.mark.parametrize('batch_first', [True, False])
+def test_multihead_attention_dynamic_shapes(packing, batch_first):
+    module = Attention(packing, need_weights=False, batch_first=batch_first).eval()
+    query, key_value = make_inputs(packing, (), batch_first=batch_first)
+    dynamic_shape = (None, None, EMBED_DIM)
+    keras_model, log = convert(module, [query, key_value], input_shapes={query: dynamic_shape, key_value: dynamic_shape})
+    for batch, length in [(1, 3), (3, 11)]:
+        inputs = make_inputs(packing, (), batch_first=batch_first, batch=batch, target_len=length, source_len=length + 2)
+        assert_same_outputs(module, keras_model, inputs)
+
+
+class PatchAttention(nn.Module):
+    """Self-attention over the pixels of a feature map, as in vision transformers"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, EMBED_DIM, 3, padding=1)
+        self.attention = nn.MultiheadAttention(EMBED_DIM, NUM_HEADS, batch_first=True)
+
+    def forward(self, x):
+        x = self.conv(x)
+        n, c, h, w = x.shape
+        tokens = x.flatten(2).transpose(1, 2)
+        tokens = self.attention(tokens, tokens, tokens, need_weights=False)[0]
+        return tokens.transpose(1, 2).reshape(n, c, h, w)
+
+
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_multihead_attention_over_feature_map(inputs_channel_order):
+    module = PatchAttention().eval()
+    x = torch.randn(2, 3, 4, 5)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+
+class ScaledDotProductAttention(nn.Module):
+    def __init__(self, mask=None, **kwargs):
+        super().__init__()
+        self.mask = mask
+        self.kwargs = kwargs
+
+    def forward(self, query, key, value, *mask):
+        kwargs = dict(self.kwargs)
+        if self.mask == 'float':
+            kwargs['attn_mask'] = mask[0]
+        elif self.mask == 'bool':
+            kwargs['attn_mask'] = mask[0] > 0.3
+        return F.scaled_dot_product_attention(query * 1, key, value, **kwargs)
+
+
+SDPA_SHAPES = [((2, 4, 5, 8), (2, 4, 7, 8), 6), ((3, 5, 8), (3, 5, 8), 8), ((2, 4, 7, 8), (2, 4, 5, 8), 8)]
+SDPA_OPTIONS = [({}, None), ({'is_causal': True}, None), ({}, 'float'), ({}, 'bool')]
+
+
+@pytest.mark.parametrize('query_shape, key_shape, value_dim', SDPA_SHAPES)
+@pytest.mark.parametrize('kwargs, mask', SDPA_OPTIONS)
+def test_scaled_dot_product_attention(query_shape, key_shape, value_dim, kwargs, mask):
+    module = ScaledDotProductAttention(mask, **kwargs).eval()
+    inputs = [torch.randn(query_shape), torch.randn(key_shape), torch.randn(*key_shape[:-1], value_dim)]
+    if mask is not None:
+        inputs.append(torch.rand(query_shape[-2], key_shape[-2]))
+    keras_model, log = convert(module, inputs)
+    assert_same_outputs(module, keras_model, inputs)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'is_causal': True}])
+def test_scaled_dot_product_attention_dynamic_shapes(kwargs):
+    module = ScaledDotProductAttention(**kwargs).eval()
+    inputs = [torch.randn(2, 4, 5, 8) for _ in range(3)]
+    keras_model, log = convert(module, inputs, input_shapes={tensor: (None, 4, None, 8) for tensor in inputs})
+    for batch, length in [(1, 3), (3, 9)]:
+        assert_same_outputs(module, keras_model, [torch.randn(batch, 4, length, 8) for _ in range(3)])
@@ -0,0 +1,79 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from helpers import convert, assert_same_outputs
+
+
+class ConvBatchNorm(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 8, 3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(8)
+        self.conv2 = nn.Conv2d(8, 8, 3, padding=1, groups=4)
+        self.bn2 = nn.BatchNorm2d(8)
+        self.conv3 = nn.Conv2d(8, 8, 1)
+        self.bn3 = nn.BatchNorm2d(8)
+        self.linear = nn.Linear(8, 5)
+        self.bn4 = nn.BatchNorm1d(5)
+        for bn in (self.bn1, self.bn2, self.bn3, self.bn4):
+            bn.running_mean.uniform_(-1, 1)
+            bn.running_var.uniform_(0.5, 2)
+            bn.weight.data.uniform_(0.5, 2)
+            bn.bias.data.uniform_(-1, 1)
+
+    def forward(self, x):
+        y = F.relu(self.bn1(self.conv1(x)))
+        y = self.bn2(self.conv2(y))
+        # Not foldable, the convolution's output has another consumer
+        z = self.conv3(y)
+        y = self.bn3(z) + z
+        return self.bn4(self.linear(y.mean(dim=(2, 3))))
+
+
+class SharedBatchNormWeight(nn.Module):
+    """Two batch norms sharing only their weight, each folded into its own convolution"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 8, 3, padding=1)
+        self.conv2 = nn.Conv2d(3, 8, 3, padding=1)
+        self.bn1 = nn.BatchNorm2d(8)
+        self.bn2 = nn.BatchNorm2d(8)
+        self.bn2.weight = self.bn1.weight
+        for bn in (self.bn1, self.bn2):
+            bn.running_mean.normal_()
+            bn.running_var.uniform_(0.5, 2)
+            bn.bias.data.normal_()
+
+    def forward(self, x):
+        return self.bn1(self.conv1(x)) + self.bn2(self.conv2(x))
+
+
+@pytest.mark.parametrize('fold_batch_norm', [False, True])
+def test_batch_norm_folding(fold_batch_norm):
+    module = ConvBatchNorm().eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], fold_batch_norm=fold_batch_norm)
+    assert_same_outputs(module, keras_model, [x])
+    assert ('Conv2d+BatchNorm2d' in log) == fold_batch_norm
+    assert ('Linear+BatchNorm1d' in log) == fold_batch_norm
+    num_batch_norms = sum('batch_normalization' in layer.name for layer in keras_model.layers)
+    assert num_batch_norms == (1 if fold_batch_norm else 4)
+
+
+def test_batch_norm_folding_dynamic_shapes():
+    module = ConvBatchNorm().eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], fold_batch_norm=True, input_shapes={x: (None, 3, None, None)})
+    for shape in [(1, 3, 5, 7), (3, 3, 10, 4)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
+
+
+@pytest.mark.parametrize('fold_batch_norm', [False, True])
+def test_batch_norm_folding_shared_weight(fold_batch_norm):
+    module = SharedBatchNormWeight().eval()
+    x = torch.randn(2, 3, 9, 9)
+    keras_model, log = convert(module, [x], fold_batch_norm=fold_batch_norm)
+    assert_same_outputs(module, keras_model, [x])
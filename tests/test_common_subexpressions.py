@@ -0,0 +1,41 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs, layer_kinds
+
+
+class CommonSubexpressions(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 8, 3, padding=1)
+        self.dropout = nn.Dropout(0.5)
+
+    def forward(self, x):
+        y = self.conv(x)
+        a = F.interpolate(y, scale_factor=2, mode='nearest') + F.interpolate(y, scale_factor=2, mode='nearest')
+        b = y.permute(0, 2, 3, 1) * y.permute(0, 2, 3, 1)
+        return a.mean(dim=1, keepdim=True), b, self.dropout(y) + self.dropout(y)
+
+
+@pytest.mark.parametrize('merge_common_subexpressions', [False, True])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_common_subexpression_elimination(merge_common_subexpressions, inputs_channel_order):
+    module = CommonSubexpressions().eval()
+    x = torch.randn(1, 3, 8, 8)
+    keras_model, log = convert(module, [x], merge_common_subexpressions=merge_common_subexpressions, inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+    assert ('Merged' in log) == merge_common_subexpressions
+    assert layer_kinds(keras_model).count('UpSampling2D') == (1 if merge_common_subexpressions else 2)
+
+
+def test_common_subexpression_elimination_dynamic_shapes():
+    module = CommonSubexpressions().eval()
+    x = torch.randn(1, 3, 8, 8)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, None)})
+    assert 'Merged' in log
+    for shape in [(2, 3, 5, 7), (1, 3, 12, 4)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
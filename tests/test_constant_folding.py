@@ -0,0 +1,35 @@
+import pytest
+import torch
+from torch import nn
+
+from helpers import convert, assert_same_outputs, layer_kinds
+
+
+class InputIndependent(nn.Module):
+    def forward(self, image, flow):
+        _, _, h, w = flow.shape
+        lin_h = torch.linspace(0., h - 1., steps=h)[:, None].repeat(1, w)
+        lin_w = torch.linspace(0., w - 1., steps=w)[None, :].repeat(h, 1)
+        grid = torch.stack([lin_h, lin_w], dim=0)[None, ...]
+        return (grid - flow) * image[:, :2]
+
+
+@pytest.mark.parametrize('constants_to_variables', [False, True])
+@pytest.mark.parametrize('fold_constants_max_bytes', [None, 64 * 1024])
+def test_constant_folding(constants_to_variables, fold_constants_max_bytes):
+    module = InputIndependent().eval()
+    image, flow = torch.randn(1, 3, 16, 16), torch.randn(1, 2, 16, 16)
+    keras_model, log = convert(module, [image, flow], constants_to_variables=constants_to_variables, fold_constants_max_bytes=fold_constants_max_bytes)
+    assert_same_outputs(module, keras_model, [image, flow])
+    assert ('input-independent' in log) == (fold_constants_max_bytes is not None)
+    if fold_constants_max_bytes is not None:
+        assert not any('linspace' in kind or 'range' in kind for kind in layer_kinds(keras_model))
+
+
+def test_constant_folding_dynamic_batch():
+    module = InputIndependent().eval()
+    image, flow = torch.randn(1, 3, 16, 16), torch.randn(1, 2, 16, 16)
+    keras_model, log = convert(module, [image, flow], input_shapes={image: (None, 3, 16, 16), flow: (None, 2, 16, 16)})
+    assert 'input-independent' in log
+    for batch_size in [2, 5]:
+        assert_same_outputs(module, keras_model, [torch.randn(batch_size, 3, 16, 16), torch.randn(batch_size, 2, 16, 16)])
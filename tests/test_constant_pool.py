@@ -0,0 +1,34 @@
+import pytest
+import torch
+from torch import nn
+
+from helpers import convert, assert_same_outputs
+
+
+class IdenticalBuffers(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.register_buffer('a', torch.randn(4, 12))
+        self.register_buffer('b', self.a.clone())
+        self.register_buffer('c', torch.randn(4, 12))
+
+    def forward(self, x):
+        return x * self.a + x * self.b - self.c
+
+
+@pytest.mark.parametrize('merge_common_subexpressions', [False, True])
+def test_identical_constants_shared(merge_common_subexpressions):
+    module = IdenticalBuffers().eval()
+    x = torch.randn(2, 4, 12)
+    keras_model, log = convert(module, [x], merge_common_subexpressions=merge_common_subexpressions, report_constant_pool=True)
+    assert_same_outputs(module, keras_model, [x])
+    assert 'Constant pool: 1 constant(s) shared, 192.0 B saved' in log
+    assert len(keras_model.weights) == 2
+
+
+def test_constant_pool_summary_on_request():
+    module = IdenticalBuffers().eval()
+    x = torch.randn(2, 4, 12)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 4, 12)})
+    assert 'Constant pool' not in log
+    assert_same_outputs(module, keras_model, [torch.randn(5, 4, 12)])
@@ -0,0 +1,45 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class FunctionalConv2d(nn.Module):
+    def __init__(self, conv: nn.Conv2d):
+        super().__init__()
+        self.conv = conv
+
+    def forward(self, x):
+        conv = self.conv
+        return F.conv2d(x, conv.weight, conv.bias, stride=conv.stride, padding=conv.padding, dilation=conv.dilation)
+
+
+CONV_PARAMS = [(3, 2, 1, 1), (3, 1, 1, 1), (7, 2, 3, 1), (4, 2, 1, 1), (3, 1, 2, 2), (5, 3, 2, 1), (2, 1, 1, 1)]
+
+
+@pytest.mark.parametrize('kernel_size, stride, padding, dilation', CONV_PARAMS)
+@pytest.mark.parametrize('padding_mode', ['zeros', 'reflect'])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_conv_padding(kernel_size, stride, padding, dilation, padding_mode, inputs_channel_order):
+    module = nn.Conv2d(4, 6, kernel_size, stride, padding, dilation, padding_mode=padding_mode).eval()
+    x = torch.randn(1, 4, 16, 16)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('kernel_size, stride, padding, dilation', CONV_PARAMS)
+@pytest.mark.parametrize('functional', [False, True])
+@pytest.mark.parametrize('trace_size', [16, 15])
+def test_conv_padding_dynamic_shapes(kernel_size, stride, padding, dilation, functional, trace_size):
+    module = nn.Conv2d(4, 6, kernel_size, stride, padding, dilation).eval()
+    if functional:
+        module = FunctionalConv2d(module).eval()
+    x = torch.randn(1, 4, trace_size, trace_size)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 4, None, None)})
+    # Padding folded for one parity of the traced size must not be reused for the other
+    for size in [16, 15, 13, 20]:
+        assert_same_outputs(module, keras_model, [torch.randn(2, 4, size, size + 1)])
@@ -0,0 +1,37 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from helpers import convert, assert_same_outputs, layer_kinds
+
+
+class DeadBranch(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 8, 3, padding=1)
+        self.unused = nn.Conv2d(8, 16, 3, padding=1)
+
+    def forward(self, x):
+        y = self.conv(x)
+        self.unused(y).sum(dim=1)
+        return F.relu(y)
+
+
+@pytest.mark.parametrize('eliminate_dead_nodes', [False, True])
+def test_dead_node_pruning(eliminate_dead_nodes):
+    module = DeadBranch().eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], eliminate_dead_nodes=eliminate_dead_nodes)
+    assert_same_outputs(module, keras_model, [x])
+    assert ('Pruned' in log) == eliminate_dead_nodes
+    assert layer_kinds(keras_model).count('Conv2D') == 1
+
+
+def test_dead_node_pruning_dynamic_shapes():
+    module = DeadBranch().eval()
+    x = torch.randn(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, None)})
+    assert 'Pruned' in log
+    for shape in [(1, 3, 5, 9), (3, 3, 11, 6)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
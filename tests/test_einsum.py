@@ -0,0 +1,108 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+CASES = [
+    ('bhqd,bhkd->bhqk', [(2, 4, 5, 8), (2, 4, 6, 8)]),
+    ('bhqk,bhkd->bhqd', [(2, 4, 5, 6), (2, 4, 6, 8)]),
+    ('bqhd,bkhd->bhqk', [(2, 5, 4, 8), (2, 6, 4, 8)]),
+    ('bhqk,bkhd->bqhd', [(2, 4, 5, 6), (2, 6, 4, 8)]),
+    ('ij,jk->ik', [(3, 4), (4, 5)]),
+    ('ij,kj->ik', [(3, 4), (5, 4)]),
+    ('ji,jk->ik', [(4, 3), (4, 5)]),
+    ('ij,jk', [(3, 4), (4, 5)]),
+    ('ij,jk->ki', [(3, 4), (4, 5)]),
+    ('i,j->ij', [(3,), (4,)]),
+    ('bi,bj->bij', [(2, 3), (2, 4)]),
+    ('i,i->', [(5,), (5,)]),
+    ('ij->ji', [(3, 4)]),
+    ('ij->j', [(3, 4)]),
+    ('ijk->', [(2, 3, 4)]),
+    ('ii->i', [(3, 3)]),
+    ('ij,ij->ij', [(3, 4), (3, 4)]),
+    ('...ij,...jk->...ik', [(2, 3, 4, 5), (2, 3, 5, 6)]),
+    ('...ij,jk->...ik', [(2, 3, 4, 5), (5, 6)]),
+    ('bnd,de->bne', [(2, 7, 8), (8, 16)]),
+    ('bcxy,oc->boxy', [(2, 3, 4, 5), (6, 3)]),
+    ('bhqd,hd->bhq', [(2, 4, 5, 8), (4, 8)]),
+    ('abi,bj->aij', [(2, 3, 4), (3, 5)]),
+    ('ijk,jkl->il', [(2, 3, 4), (3, 4, 5)]),
+    ('ab,bc,cd->ad', [(10, 2), (2, 30), (30, 3)]),
+    ('ab,bc,cd,de->ae', [(8, 16), (16, 2), (2, 16), (16, 8)]),
+    ('abc,bd,ce->ade', [(3, 4, 5), (4, 6), (5, 7)]),
+    ('bij,bjk,bkl->bil', [(2, 3, 4), (2, 4, 5), (2, 5, 6)]),
+]
+
+
+def case_id(case):
+    return case[0]
+
+
+class Einsum(nn.Module):
+    def __init__(self, equation, list_form=False):
+        super().__init__()
+        self.equation = equation
+        self.list_form = list_form
+
+    def forward(self, *operands):
+        operands = [operand * 1 for operand in operands]
+        if self.list_form:
+            return torch.einsum(self.equation, operands)
+        return torch.einsum(self.equation, *operands)
+
+
+class ConvEinsum(nn.Module):
+    """Einsum over the channels of a feature map, e.g. a 1x1 convolution or a bilinear pooling"""
+
+    def __init__(self, equation):
+        super().__init__()
+        self.equation = equation
+        self.conv = nn.Conv2d(3, 4, 1)
+        self.weight = nn.Parameter(torch.randn(6, 4))
+
+    def forward(self, x):
+        return torch.einsum(self.equation, self.conv(x), self.weight)
+
+
+@pytest.mark.parametrize('case', CASES, ids=case_id)
+def test_einsum(case):
+    equation, shapes = case
+    operands = [torch.randn(shape) for shape in shapes]
+    for list_form in [False, True]:
+        module = Einsum(equation, list_form).eval()
+        keras_model, log = convert(module, operands)
+        assert_same_outputs(module, keras_model, operands)
+
+
+@pytest.mark.parametrize('case', [case for case in CASES if all(labels.startswith('b') and len(labels) > 2 for labels in case[0].split('->')[0].split(','))], ids=case_id)
+def test_einsum_dynamic_shapes(case):
+    equation, shapes = case
+    module = Einsum(equation).eval()
+    operands = [torch.randn(shape) for shape in shapes]
+    # Dynamic batch, and a dynamic second axis where it's a free label of the first operand
+    input_shapes = {operands[0]: (None, None, *shapes[0][2:])}
+    for operand, shape in zip(operands[1:], shapes[1:]):
+        input_shapes[operand] = (None, *shape[1:])
+    free = equation[1] not in equation.split('->')[0].split(',')[1]
+    if not free:
+        input_shapes[operands[0]] = (None, *shapes[0][1:])
+    keras_model, log = convert(module, operands, input_shapes=input_shapes)
+    for batch, size in [(1, shapes[0][1]), (3, shapes[0][1] + 2)]:
+        inputs = [torch.randn(batch, size if free else shapes[0][1], *shapes[0][2:])]
+        inputs += [torch.randn(batch, *shape[1:]) for shape in shapes[1:]]
+        assert_same_outputs(module, keras_model, inputs)
+
+
+@pytest.mark.parametrize('equation', ['bcxy,oc->boxy', 'bcxy,oc->bxyo', 'bcxy,oc->bo'])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_einsum_of_feature_map(equation, inputs_channel_order):
+    module = ConvEinsum(equation).eval()
+    x = torch.randn(2, 3, 5, 7)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, None, None)})
+    for shape in [(2, 3, 5, 7), (1, 3, 8, 4)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
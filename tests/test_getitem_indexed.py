@@ -0,0 +1,77 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+idx = torch.tensor([3, 0, 2, 2])
+idx2d = torch.tensor([[1, 0], [3, 2]])
+rows = torch.tensor([0, 1, 1])
+cols = torch.tensor([2, 0, 3])
+
+CASES = {
+    'leading_axis': lambda x: x[torch.tensor([1, 0, 1])],
+    'channel_axis': lambda x: x[:, idx],
+    'channel_axis_2d_index': lambda x: x[:, idx2d],
+    'last_axis': lambda x: x[..., idx],
+    'spatial_axis': lambda x: x[:, :, idx],
+    'negative': lambda x: x[:, torch.tensor([-1, 0, -3])],
+    'adjacent_leading': lambda x: x[rows, cols],
+    'adjacent_middle': lambda x: x[:, rows, cols],
+    'adjacent_three': lambda x: x[rows, cols, rows],
+    'non_adjacent': lambda x: x[:, rows, :, cols],
+    'int_between': lambda x: x[:, 0, :, idx],
+    'leading_int': lambda x: x[0, idx],
+    'with_slices': lambda x: x[1:, idx, 1:4],
+    'with_none': lambda x: x[None, :, idx][0],
+    'computed': lambda x: x[:, (x[0, :, 0, 0] > 0).to(torch.int64) * 3],
+    'computed_negative': lambda x: x[:, :, (x[0, 0, 0, :] > 0).to(torch.int64) - 2],
+    'computed_2d': lambda x: x[:, :, (x[0, 0] > 0).to(torch.int64)],
+}
+
+
+class IndexedGetItem(nn.Module):
+    def __init__(self, case):
+        super().__init__()
+        self.case = case
+        self.conv = nn.Conv2d(4, 4, 1)
+
+    def forward(self, x):
+        return CASES[self.case](self.conv(x)) * 2
+
+
+@pytest.mark.parametrize('case', CASES)
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_getitem_indexed(case, inputs_channel_order):
+    module = IndexedGetItem(case).eval()
+    x = torch.randn(2, 4, 5, 6)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    for _ in range(3):
+        assert_same_outputs(module, keras_model, [torch.randn(2, 4, 5, 6)], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('case', ['channel_axis', 'last_axis', 'negative', 'adjacent_middle', 'non_adjacent', 'computed_negative'])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_getitem_indexed_dynamic_shapes(case, inputs_channel_order):
+    module = IndexedGetItem(case).eval()
+    x = torch.randn(2, 4, 5, 6)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 4, None, 6)})
+    for shape in [(1, 4, 5, 6), (3, 4, 8, 6)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
+
+
+class NegativeComputedIndex(nn.Module):
+    def forward(self, x):
+        index = (x[0, 0, :2] > 0).to(torch.int64) * -1
+        return x[:, index] * 2
+
+
+def test_getitem_negative_index_only_known_at_runtime():
+    module = NegativeComputedIndex().eval()
+    # Traced with non-negative indices, run with negative ones
+    x = -torch.rand(2, 3, 4)
+    keras_model, log = convert(module, [x])
+    assert_same_outputs(module, keras_model, [torch.rand(2, 3, 4)])
@@ -0,0 +1,66 @@
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class FunctionalGroupedConv2d(nn.Module):
+    def __init__(self, conv: nn.Conv2d):
+        super().__init__()
+        self.conv = conv
+
+    def forward(self, x):
+        conv = self.conv
+        return F.conv2d(x, conv.weight, conv.bias, stride=conv.stride, padding=conv.padding, groups=conv.groups)
+
+
+GROUPED_CONVS = [
+    # in_channels, out_channels, kernel_size, stride, padding, groups
+    (8, 8, 3, 1, 1, 4),
+    (8, 16, 3, 2, 1, 2),
+    (6, 12, 1, 1, 0, 3),
+    # Depthwise
+    (8, 8, 3, 1, 1, 8),
+    (4, 8, 5, 2, 2, 4),
+]
+
+
+def make_modules(in_channels, out_channels, kernel_size, stride, padding, groups):
+    conv2d = nn.Conv2d(in_channels, out_channels, kernel_size, stride, padding, groups=groups)
+    return [conv2d.eval(), FunctionalGroupedConv2d(conv2d).eval()]
+
+
+@pytest.mark.parametrize('params', GROUPED_CONVS)
+@pytest.mark.parametrize('block_diagonal', [False, True])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_grouped_convolution(params, block_diagonal, inputs_channel_order):
+    x = torch.randn(2, params[0], 9, 9)
+    for module in make_modules(*params):
+        keras_model, log = convert(module, [x], grouped_conv_block_diagonal=block_diagonal, inputs_channel_order=inputs_channel_order)
+        assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+        convs = [layer for layer in keras_model.layers if type(layer).__name__ in ('Conv2D', 'DepthwiseConv2D')]
+        assert len(convs) == 1
+        if type(convs[0]).__name__ == 'Conv2D':
+            assert convs[0].groups == (1 if block_diagonal else params[5])
+
+
+@pytest.mark.parametrize('params', GROUPED_CONVS)
+def test_grouped_convolution_dynamic_shapes(params):
+    x = torch.randn(2, params[0], 9, 9)
+    for module in make_modules(*params):
+        keras_model, log = convert(module, [x], input_shapes={x: (None, params[0], None, None)})
+        for size in [7, 12]:
+            assert_same_outputs(module, keras_model, [torch.randn(1, params[0], size, size + 1)])
+
+
+def test_grouped_conv1d():
+    module = nn.Conv1d(6, 9, 3, padding=1, groups=3).eval()
+    x = torch.randn(2, 6, 11)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 6, None)})
+    for length in [11, 4]:
+        assert_same_outputs(module, keras_model, [torch.randn(3, 6, length)])
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+import torch
+import torch.nn.functional as F
+from tensorflow import keras
+from torch import nn
+
+import nobuco
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs, layer_kinds
+
+
+CASES = [
+    dict(scale_factor=2),
+    dict(scale_factor=(2, 3)),
+    dict(scale_factor=1),
+    dict(scale_factor=1.5),
+    dict(scale_factor=0.5),
+    dict(size=(14, 18)),
+    dict(size=(9, 11)),
+    dict(size=(4, 5)),
+    dict(scale_factor=2, mode='nearest-exact'),
+    dict(size=(9, 11), mode='nearest-exact'),
+    dict(scale_factor=2, mode='bilinear'),
+    dict(scale_factor=1.5, mode='bilinear'),
+    dict(scale_factor=0.7, mode='bilinear'),
+    dict(size=(9, 11), mode='bilinear'),
+    dict(scale_factor=1.5, mode='bilinear', recompute_scale_factor=True),
+    dict(scale_factor=2, mode='bilinear', align_corners=True),
+    dict(size=(13, 4), mode='bilinear', align_corners=True),
+    dict(size=(1, 1), mode='bilinear', align_corners=True),
+]
+
+DYNAMIC_CASES = [
+    dict(scale_factor=2),
+    dict(scale_factor=1.5),
+    dict(size=(9, 11)),
+    dict(scale_factor=2, mode='nearest-exact'),
+    dict(scale_factor=2, mode='bilinear'),
+    dict(size=(9, 11), mode='bilinear'),
+    dict(scale_factor=2, mode='bilinear', align_corners=True),
+    dict(size=(13, 4), mode='bilinear', align_corners=True),
+]
+
+
+def case_id(kwargs):
+    return ','.join(f'{k}={v}' for k, v in kwargs.items())
+
+
+class Interpolate(nn.Module):
+    def __init__(self, kwargs):
+        super().__init__()
+        self.kwargs = kwargs
+        self.conv = nn.Conv2d(3, 3, 1)
+
+    def forward(self, x):
+        return F.interpolate(self.conv(x), **self.kwargs)
+
+
+class InterpolateDynamicSize(nn.Module):
+    def __init__(self, mode, align_corners=None):
+        super().__init__()
+        self.mode = mode
+        self.align_corners = align_corners
+        self.conv = nn.Conv2d(3, 3, 1)
+
+    def forward(self, x):
+        x = self.conv(x)
+        _, _, h, w = nobuco.shape(x)
+        return F.interpolate(x, size=(h * 2, w + 3), mode=self.mode, align_corners=self.align_corners)
+
+
+@pytest.mark.parametrize('kwargs', CASES, ids=case_id)
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_interpolate(kwargs, inputs_channel_order):
+    module = Interpolate(kwargs).eval()
+    x = torch.randn(2, 3, 7, 9)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert 'Lambda' not in layer_kinds(keras_model)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('kwargs', DYNAMIC_CASES, ids=case_id)
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_interpolate_dynamic_shapes(kwargs, inputs_channel_order):
+    module = Interpolate(kwargs).eval()
+    x = torch.randn(2, 3, 7, 9)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, None, None)})
+    assert 'Lambda' not in layer_kinds(keras_model)
+    for shape in [(2, 3, 7, 9), (1, 3, 5, 12)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('mode,align_corners', [('nearest', None), ('nearest-exact', None), ('bilinear', False), ('bilinear', True)])
+def test_interpolate_size_computed_at_runtime(mode, align_corners):
+    module = InterpolateDynamicSize(mode, align_corners).eval()
+    x = torch.randn(1, 3, 7, 9)
+    keras_model, log = convert(module, [x], input_shapes={x: (1, 3, None, None)})
+    for shape in [(1, 3, 7, 9), (1, 3, 5, 12)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)])
+
+
+@pytest.mark.parametrize('kwargs', [dict(scale_factor=1.5), dict(scale_factor=2, mode='bilinear', align_corners=True)], ids=case_id)
+def test_interpolate_saves_to_h5(kwargs, tmp_path):
+    module = Interpolate(kwargs).eval()
+    x = torch.randn(2, 3, 7, 9)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 3, None, None)})
+    path = os.path.join(tmp_path, 'model.h5')
+    keras_model.save(path)
+    loaded = keras.models.load_model(path, compile=False)
+    assert_same_outputs(module, loaded, [torch.randn(1, 3, 5, 12)])
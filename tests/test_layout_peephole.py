@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs, run_keras, layer_kinds
+
+
+class ReshapeChains(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 16, 3, padding=1)
+        self.linear = nn.Linear(16, 4)
+        self.conv2 = nn.Conv2d(4, 4, 1)
+
+    def forward(self, x):
+        b, _, h, w = x.shape
+        y = self.linear(self.conv(x).permute(0, 2, 3, 1))
+        y = y.reshape(b, -1).reshape(b, h, w, 4).flatten(1).view(b, h, w, 4)
+        y = y.unsqueeze(0).squeeze(0)
+        y = y.permute(0, 3, 1, 2)
+        z = y.clone()
+        z[:, 1:3] = self.conv2(y)[:, 1:3]
+        return F.relu(z) + y.transpose(2, 3)
+
+
+class TransposeChains(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 8, 3, padding=1)
+        self.conv2 = nn.Conv2d(8, 8, 1)
+        self.linear = nn.Linear(8, 8)
+
+    def forward(self, x):
+        y = self.linear(self.conv(x).transpose(2, 3))
+        return self.linear(self.conv2(y))
+
+
+def num_layout_ops(keras_model):
+    return sum(kind in ('compat.v1.transpose', 'reshape', 'compat.v1.squeeze', 'expand_dims') for kind in layer_kinds(keras_model))
+
+
+@pytest.mark.parametrize('module_class', [ReshapeChains, TransposeChains])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_layout_folding(module_class, inputs_channel_order):
+    module = module_class().eval()
+    x = torch.rand(2, 3, 8, 8)
+    outputs = {}
+    num_ops = {}
+    for optimize_layout in [False, True]:
+        keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, optimize_layout=optimize_layout)
+        assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+        outputs[optimize_layout] = run_keras(keras_model, [x], inputs_channel_order)
+        num_ops[optimize_layout] = num_layout_ops(keras_model)
+
+    # Folding moves the same data, results are bit-identical
+    for output_unoptimized, output_optimized in zip(outputs[False], outputs[True]):
+        np.testing.assert_array_equal(output_unoptimized, output_optimized)
+    assert num_ops[True] < num_ops[False]
+
+
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_layout_folding_dynamic_batch(inputs_channel_order):
+    module = TransposeChains().eval()
+    x = torch.rand(2, 3, 8, 8)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, 8, 8)})
+    for batch_size in [1, 5]:
+        assert_same_outputs(module, keras_model, [torch.rand(batch_size, 3, 8, 8)], inputs_channel_order=inputs_channel_order)
+
+
+class SqueezeReshaped(nn.Module):
+    def forward(self, x):
+        return x.reshape(2, -1, 5).squeeze(1) * 2
+
+
+def test_squeeze_dynamic_axis():
+    module = SqueezeReshaped().eval()
+    x = torch.rand(2, 1, 5)
+    keras_model, log = convert(module, [x], input_shapes={x: (2, None, 5)})
+    assert_same_outputs(module, keras_model, [x])
@@ -0,0 +1,104 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+C, H, W = 12, 5, 7
+
+
+def make_norm(name, affine):
+    return {
+        'layer_norm_w': lambda: nn.LayerNorm([W], elementwise_affine=affine),
+        'layer_norm_hw': lambda: nn.LayerNorm([H, W], elementwise_affine=affine),
+        'layer_norm_chw': lambda: nn.LayerNorm([C, H, W], elementwise_affine=affine),
+        'group_norm': lambda: nn.GroupNorm(3, C, affine=affine),
+        'group_norm_single_group': lambda: nn.GroupNorm(1, C, affine=affine),
+        'instance_group_norm': lambda: nn.GroupNorm(C, C, affine=affine),
+    }[name]()
+
+
+class Normalized(nn.Module):
+    def __init__(self, norm, conv_first=True):
+        super().__init__()
+        self.conv = nn.Conv2d(C, C, 3, padding=1) if conv_first else None
+        self.norm = norm
+        # Non-trivial affine parameters
+        for param in norm.parameters():
+            param.data = torch.randn_like(param)
+
+    def forward(self, x):
+        if self.conv is not None:
+            x = self.conv(x)
+        return self.norm(x)
+
+
+def num_norm_weights(module, keras_model):
+    conv_weights = 0 if module.conv is None else 2
+    return len(keras_model.weights) - conv_weights
+
+
+NORMS = ['layer_norm_w', 'layer_norm_hw', 'layer_norm_chw', 'group_norm', 'group_norm_single_group', 'instance_group_norm']
+
+
+@pytest.mark.parametrize('norm', NORMS)
+@pytest.mark.parametrize('affine', [True, False])
+@pytest.mark.parametrize('conv_first', [True, False])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_normalization(norm, affine, conv_first, inputs_channel_order):
+    module = Normalized(make_norm(norm, affine), conv_first).eval()
+    x = torch.randn(2, C, H, W)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+    # Affine parameters are variables of the model, not constants baked into the graph
+    assert num_norm_weights(module, keras_model) == (2 if affine else 0)
+
+
+@pytest.mark.parametrize('norm', ['layer_norm_w', 'group_norm'])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_normalization_dynamic_shapes(norm, inputs_channel_order):
+    module = Normalized(make_norm(norm, True)).eval()
+    x = torch.randn(2, C, H, W)
+    spatial = (None, W) if norm == 'layer_norm_w' else (None, None)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, C, *spatial)})
+    for batch, height, width in [(1, 3, W), (3, 8, W)]:
+        if norm == 'group_norm':
+            width += 2
+        assert_same_outputs(module, keras_model, [torch.randn(batch, C, height, width)], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('norm, shape', [
+    (nn.LayerNorm(C), (2, 9, C)),
+    (nn.LayerNorm([9, C]), (2, 9, C)),
+    (nn.LayerNorm(C), (4, C)),
+    (nn.GroupNorm(4, C), (2, C, 9)),
+    (nn.GroupNorm(4, C), (3, C)),
+])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_normalization_of_other_ranks(norm, shape, inputs_channel_order):
+    module = Normalized(norm, conv_first=False).eval()
+    x = torch.randn(shape)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+    assert num_norm_weights(module, keras_model) == 2
+
+
+class SharedNorm(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.norm = nn.LayerNorm(C)
+        self.norm.weight.data = torch.randn(C)
+
+    def forward(self, x, y):
+        return self.norm(x), self.norm(y * 2)
+
+
+def test_normalization_module_reused():
+    module = SharedNorm().eval()
+    x, y = torch.randn(2, 9, C), torch.randn(2, 4, C)
+    keras_model, log = convert(module, [x, y])
+    assert_same_outputs(module, keras_model, [x, y])
+    assert len(keras_model.weights) == 2
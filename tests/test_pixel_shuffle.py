@@ -0,0 +1,47 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class SubPixelConv(nn.Module):
+    def __init__(self, factor):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 3 * factor ** 2, 3, padding=1)
+        self.shuffle = nn.PixelShuffle(factor)
+        self.unshuffle = nn.PixelUnshuffle(factor)
+
+    def forward(self, x):
+        y = self.shuffle(self.conv(x))
+        return y, self.unshuffle(y * 2)
+
+
+@pytest.mark.parametrize('factor', [1, 2, 3])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_pixel_shuffle(factor, inputs_channel_order):
+    module = SubPixelConv(factor).eval()
+    x = torch.randn(2, 3, 6, 5)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('factor', [2, 3])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_pixel_shuffle_dynamic_shapes(factor, inputs_channel_order):
+    module = SubPixelConv(factor).eval()
+    x = torch.randn(2, 3, 6, 5)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, None, None)})
+    for shape in [(1, 3, 4, 7), (3, 3, 9, 2)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_pixel_unshuffle_of_input(inputs_channel_order):
+    module = nn.PixelUnshuffle(2).eval()
+    x = torch.randn(2, 3, 8, 6)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 3, None, None)})
+    for shape in [(2, 3, 8, 6), (1, 3, 4, 10)]:
+        assert_same_outputs(module, keras_model, [torch.randn(shape)], inputs_channel_order=inputs_channel_order)
@@ -0,0 +1,38 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+POOL_PARAMS = [(3, 2, 1), (3, 1, 1), (2, 2, 0), (3, 2, 0), (5, 3, 2), (4, 2, 2)]
+
+
+def make_pools(kernel_size, stride, padding, ceil_mode):
+    pools = [nn.MaxPool2d(kernel_size, stride, padding, ceil_mode=ceil_mode)]
+    for count_include_pad in [True, False]:
+        for divisor_override in [None, 3]:
+            pools.append(nn.AvgPool2d(kernel_size, stride, padding, ceil_mode=ceil_mode, count_include_pad=count_include_pad, divisor_override=divisor_override))
+    return pools
+
+
+@pytest.mark.parametrize('kernel_size, stride, padding', POOL_PARAMS)
+@pytest.mark.parametrize('ceil_mode', [False, True])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_pool_padding(kernel_size, stride, padding, ceil_mode, inputs_channel_order):
+    x = torch.randn(1, 4, 15, 16)
+    for module in make_pools(kernel_size, stride, padding, ceil_mode):
+        keras_model, log = convert(module.eval(), [x], inputs_channel_order=inputs_channel_order)
+        assert_same_outputs(module, keras_model, [x], atol=1e-5, inputs_channel_order=inputs_channel_order)
+
+
+@pytest.mark.parametrize('kernel_size, stride, padding', POOL_PARAMS)
+@pytest.mark.parametrize('ceil_mode', [False, True])
+def test_pool_padding_dynamic_shapes(kernel_size, stride, padding, ceil_mode):
+    x = torch.randn(1, 4, 16, 16)
+    for module in make_pools(kernel_size, stride, padding, ceil_mode):
+        keras_model, log = convert(module.eval(), [x], input_shapes={x: (None, 4, None, None)})
+        for size in [16, 15, 13, 7]:
+            assert_same_outputs(module, keras_model, [torch.randn(2, 4, size, size + 3)], atol=1e-5)
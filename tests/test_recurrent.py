@@ -0,0 +1,69 @@
+import pytest
+import torch
+from torch import nn
+
+from helpers import convert, assert_same_outputs
+
+
+class Recurrent(nn.Module):
+    def __init__(self, cls, **kwargs):
+        super().__init__()
+        self.rnn = cls(8, 16, **kwargs)
+
+    def forward(self, x, *hx):
+        return self.rnn(x, *hx)
+
+
+RNN_CONFIGS = [
+    {},
+    {'bidirectional': True, 'num_layers': 2},
+    {'batch_first': True, 'bidirectional': True},
+    {'bias': False, 'num_layers': 2},
+]
+
+
+def make_inputs(cls, config, num_steps, batch_size, with_hx):
+    x = torch.randn(batch_size, num_steps, 8) if config.get('batch_first') else torch.randn(num_steps, batch_size, 8)
+    if not with_hx:
+        return [x]
+    num_states = config.get('num_layers', 1) * (2 if config.get('bidirectional') else 1)
+    if cls is nn.GRU:
+        return [x, torch.randn(num_states, batch_size, 16)]
+    return [x, (torch.randn(num_states, batch_size, 16), torch.randn(num_states, batch_size, 16))]
+
+
+def is_unrolled(keras_model):
+    return any(getattr(layer, 'unroll', False) for layer in keras_model.layers)
+
+
+@pytest.mark.parametrize('cls', [nn.GRU, nn.LSTM])
+@pytest.mark.parametrize('config', RNN_CONFIGS)
+@pytest.mark.parametrize('num_steps', [8, 40])
+@pytest.mark.parametrize('with_hx', [False, True])
+def test_recurrent(cls, config, num_steps, with_hx):
+    module = Recurrent(cls, **config).eval()
+    inputs = make_inputs(cls, config, num_steps, 3, with_hx)
+    keras_model, log = convert(module, inputs)
+    assert_same_outputs(module, keras_model, inputs)
+    assert is_unrolled(keras_model) == (num_steps <= 16)
+
+
+@pytest.mark.parametrize('cls', [nn.GRU, nn.LSTM])
+@pytest.mark.parametrize('rnn_unroll_max_steps', [0, 4, 64])
+def test_recurrent_unroll_max_steps(cls, rnn_unroll_max_steps):
+    module = Recurrent(cls).eval()
+    inputs = make_inputs(cls, {}, 8, 2, False)
+    keras_model, log = convert(module, inputs, rnn_unroll_max_steps=rnn_unroll_max_steps)
+    assert_same_outputs(module, keras_model, inputs)
+    assert is_unrolled(keras_model) == (8 <= rnn_unroll_max_steps)
+
+
+@pytest.mark.parametrize('cls', [nn.GRU, nn.LSTM])
+@pytest.mark.parametrize('config', RNN_CONFIGS)
+def test_recurrent_dynamic_shapes(cls, config):
+    module = Recurrent(cls, **config).eval()
+    x, = make_inputs(cls, config, 5, 2, False)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, None, 8)})
+    assert not is_unrolled(keras_model)
+    for num_steps, batch_size in [(30, 2), (3, 4), (1, 1)]:
+        assert_same_outputs(module, keras_model, make_inputs(cls, config, num_steps, batch_size, False))
@@ -0,0 +1,67 @@
+import pytest
+import torch
+from torch import nn
+
+from helpers import convert, assert_same_outputs, flatten
+from test_recurrent import Recurrent, RNN_CONFIGS, make_inputs
+
+
+class Cell(nn.Module):
+    def __init__(self, cls, **kwargs):
+        super().__init__()
+        self.cell = cls(8, 16, **kwargs)
+
+    def forward(self, x, *hx):
+        return self.cell(x, *hx)
+
+
+def make_cell_inputs(cls, batch_shape, with_hx):
+    x = torch.randn(*batch_shape, 8)
+    if not with_hx:
+        return [x]
+    if cls is nn.GRUCell:
+        return [x, torch.randn(*batch_shape, 16)]
+    return [x, (torch.randn(*batch_shape, 16), torch.randn(*batch_shape, 16))]
+
+
+@pytest.mark.parametrize('cls', [nn.GRU, nn.LSTM])
+@pytest.mark.parametrize('config', RNN_CONFIGS)
+@pytest.mark.parametrize('with_hx', [False, True])
+def test_single_step(cls, config, with_hx):
+    module = Recurrent(cls, **config).eval()
+    inputs = make_inputs(cls, config, 1, 3, with_hx)
+    keras_model, log = convert(module, inputs)
+    assert_same_outputs(module, keras_model, inputs)
+    assert not any(type(layer).__name__ in ('GRU', 'LSTM') for layer in keras_model.layers)
+
+
+@pytest.mark.parametrize('cls', [nn.GRU, nn.LSTM])
+@pytest.mark.parametrize('with_hx', [False, True])
+def test_single_step_dynamic_batch(cls, with_hx):
+    module = Recurrent(cls, batch_first=True, num_layers=2).eval()
+    inputs = make_inputs(cls, {'batch_first': True, 'num_layers': 2}, 1, 3, with_hx)
+    x, *hxs = flatten(inputs)
+    input_shapes = {x: (None, 1, 8), **{hx: (2, None, 16) for hx in hxs}}
+    keras_model, log = convert(module, inputs, input_shapes=input_shapes)
+    for batch_size in [1, 6]:
+        assert_same_outputs(module, keras_model, make_inputs(cls, {'batch_first': True, 'num_layers': 2}, 1, batch_size, with_hx))
+
+
+@pytest.mark.parametrize('cls', [nn.GRUCell, nn.LSTMCell])
+@pytest.mark.parametrize('bias', [False, True])
+@pytest.mark.parametrize('batch_shape', [(3,), ()])
+@pytest.mark.parametrize('with_hx', [False, True])
+def test_cell(cls, bias, batch_shape, with_hx):
+    module = Cell(cls, bias=bias).eval()
+    inputs = make_cell_inputs(cls, batch_shape, with_hx)
+    keras_model, log = convert(module, inputs)
+    assert_same_outputs(module, keras_model, inputs)
+
+
+@pytest.mark.parametrize('cls', [nn.GRUCell, nn.LSTMCell])
+def test_cell_dynamic_batch(cls):
+    module = Cell(cls).eval()
+    x, = make_cell_inputs(cls, (3,), False)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 8)})
+    for batch_size in [1, 7]:
+        assert_same_outputs(module, keras_model, make_cell_inputs(cls, (batch_size,), False))
@@ -0,0 +1,82 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class SetItems(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(4, 4, 1)
+
+    def forward(self, x):
+        x = self.conv(x)
+        buffer = torch.zeros_like(x)
+        for i in range(4):
+            buffer[:, i] = x[:, i] * (i + 1)
+        buffer[:, :, 0:2, 0:2] = 1.0
+        return buffer
+
+
+class BroadcastSetItems(nn.Module):
+    """Disjoint writes of lower-rank values, coalesced into one scatter or concatenation"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(4, 6, 1)
+        self.row = nn.Parameter(torch.randn(8))
+        self.plane = nn.Parameter(torch.randn(8, 8))
+
+    def forward(self, x):
+        x = self.conv(x)
+        buffer = x.clone()
+        buffer[:, :, 1:3] = self.row
+        buffer[:, :, 5:7, 2:4] = 2.0
+        buffer[:, 4] = self.plane
+        return buffer
+
+
+class BroadcastChannelWrites(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(4, 6, 1)
+        self.plane = nn.Parameter(torch.randn(8, 8))
+
+    def forward(self, x):
+        x = self.conv(x)
+        buffer = x.clone()
+        buffer[:, 0:2] = self.plane
+        buffer[:, 3] = self.plane * 2
+        return buffer
+
+
+@pytest.mark.parametrize('coalesce_setitem', [False, True])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_setitem_coalescing(coalesce_setitem, inputs_channel_order):
+    module = SetItems().eval()
+    x = torch.randn(2, 4, 8, 8)
+    keras_model, log = convert(module, [x], coalesce_setitem=coalesce_setitem, inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+    assert ('__setitem__+__setitem__' in log) == coalesce_setitem
+
+
+def test_setitem_coalescing_dynamic_batch():
+    module = SetItems().eval()
+    x = torch.randn(2, 4, 8, 8)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, 4, 8, 8)})
+    assert '__setitem__+__setitem__' in log
+    for batch_size in [1, 5]:
+        assert_same_outputs(module, keras_model, [torch.randn(batch_size, 4, 8, 8)])
+
+
+@pytest.mark.parametrize('module_class', [BroadcastSetItems, BroadcastChannelWrites])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_setitem_coalescing_broadcast(module_class, inputs_channel_order):
+    module = module_class().eval()
+    x = torch.randn(2, 4, 8, 8)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert '__setitem__+__setitem__' in log
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
@@ -0,0 +1,55 @@
+import pytest
+import torch
+from torch import nn
+
+from nobuco import ChannelOrder
+
+from helpers import convert, assert_same_outputs
+
+
+class SliceAssignment(nn.Module):
+    """Assigns `value(y)` to `y[key]`, where `y` is a conv output, so that it's channel-last for tensorflow-ordered inputs"""
+
+    def __init__(self, key, value):
+        super().__init__()
+        self.conv = nn.Conv2d(4, 6, 1)
+        self.key = key
+        self.value = value
+
+    def forward(self, x):
+        y = self.conv(x)
+        y[self.key] = self.value(y)
+        return y
+
+
+CASES = {
+    'box': ((slice(None), slice(1, 4), slice(2, 5)), lambda y: y[:, :3, :3] * 2),
+    'strided': ((slice(None), slice(None), slice(0, 6, 2)), lambda y: torch.tanh(y[:, :, 1:4])),
+    'width_row': ((slice(None), slice(None), slice(1, 3)), lambda y: y[0, 0, 0].clone()),
+    'spatial_plane': ((slice(None), slice(2, 5)), lambda y: y[0, 0].clone()),
+    'channel_column': ((slice(None), slice(1, 4), slice(None), slice(0, 2)), lambda y: y[0, :3, :1, 0:1].clone()),
+    'int_index': ((slice(None), 2), lambda y: y[:, 0] + 1),
+    'int_index_row': ((slice(None), 2, 3), lambda y: y[0, 0, 0].clone()),
+    'scalar': ((slice(None), slice(1, 3), slice(None, None, 3)), lambda y: 7.0),
+    'tail': ((Ellipsis, slice(5, None)), lambda y: y[..., :1].clone()),
+}
+
+
+@pytest.mark.parametrize('case', CASES.keys())
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_slice_assignment(case, inputs_channel_order):
+    module = SliceAssignment(*CASES[case]).eval()
+    x = torch.randn(2, 4, 8, 8)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order)
+    assert_same_outputs(module, keras_model, [x], inputs_channel_order=inputs_channel_order)
+    assert not any('scatter' in getattr(layer, 'symbol', '') for layer in keras_model.layers)
+
+
+@pytest.mark.parametrize('case', ['box', 'spatial_plane', 'int_index', 'tail'])
+@pytest.mark.parametrize('inputs_channel_order', [ChannelOrder.PYTORCH, ChannelOrder.TENSORFLOW])
+def test_slice_assignment_dynamic_shapes(case, inputs_channel_order):
+    module = SliceAssignment(*CASES[case]).eval()
+    x = torch.randn(2, 4, 8, 8)
+    keras_model, log = convert(module, [x], inputs_channel_order=inputs_channel_order, input_shapes={x: (None, 4, None, 8)})
+    for batch_size, height in [(1, 8), (3, 11)]:
+        assert_same_outputs(module, keras_model, [torch.randn(batch_size, 4, height, 8)], inputs_channel_order=inputs_channel_order)
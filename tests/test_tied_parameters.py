@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from helpers import convert, assert_same_outputs
+
+
+class TiedLanguageModel(nn.Module):
+    def __init__(self, vocab_size=50, dim=16):
+        super().__init__()
+        self.embedding = nn.Embedding(vocab_size, dim)
+        self.linear1 = nn.Linear(dim, dim)
+        self.linear2 = nn.Linear(dim, dim)
+        self.linear2.weight = self.linear1.weight
+        self.head = nn.Linear(dim, vocab_size)
+        self.head.weight = self.embedding.weight
+
+    def forward(self, tokens):
+        h = self.embedding(tokens)
+        h = self.linear2(F.relu(self.linear1(h)))
+        return self.head(h)
+
+
+class FunctionalTiedHead(nn.Module):
+    def __init__(self, vocab_size=50, dim=16):
+        super().__init__()
+        self.embedding = nn.Embedding(vocab_size, dim)
+        self.head_weight = self.embedding.weight
+        self.head_bias = nn.Parameter(torch.randn(vocab_size))
+
+    def forward(self, tokens):
+        return F.linear(self.embedding(tokens), self.head_weight, self.head_bias)
+
+
+class SharedBatchNormWeight(nn.Module):
+    """Batch norms sharing only their weight, running statistics and biases differ"""
+
+    def __init__(self):
+        super().__init__()
+        self.bn1 = nn.BatchNorm2d(8)
+        self.bn2 = nn.BatchNorm2d(8)
+        self.bn2.weight = self.bn1.weight
+        for bn in (self.bn1, self.bn2):
+            bn.running_mean.normal_()
+            bn.running_var.uniform_(0.5, 2)
+            bn.bias.data.normal_()
+
+    def forward(self, x):
+        return self.bn1(x) + self.bn2(x * 2)
+
+
+class IdenticalUntied(nn.Module):
+    """Bitwise-identical parameters that are not the same tensor"""
+
+    def __init__(self):
+        super().__init__()
+        self.linear1 = nn.Linear(8, 8)
+        self.linear2 = nn.Linear(8, 8)
+        self.linear2.load_state_dict(self.linear1.state_dict())
+
+    def forward(self, x):
+        return self.linear1(x) + self.linear2(x * 2)
+
+
+def num_variable_elements(keras_model):
+    return sum(int(np.prod(w.shape)) for w in keras_model.weights)
+
+
+def tokens(*shape):
+    return torch.randint(0, 50, shape)
+
+
+def test_tied_embedding_and_head():
+    module = TiedLanguageModel().eval()
+    x = tokens(2, 7)
+    keras_model, log = convert(module, [x])
+    assert_same_outputs(module, keras_model, [x])
+    assert 'embedding.weight = head.weight -> tied_embedding_weight shared by 2 ops' in log
+    assert 'linear1.weight = linear2.weight -> tied_linear1_weight shared by 2 ops' in log
+    num_params = sum(p.numel() for p in module.parameters())
+    assert num_variable_elements(keras_model) == num_params
+
+
+def test_tied_embedding_and_head_dynamic_shapes():
+    module = TiedLanguageModel().eval()
+    x = tokens(2, 7)
+    keras_model, log = convert(module, [x], input_shapes={x: (None, None)})
+    for shape in [(1, 3), (4, 11)]:
+        assert_same_outputs(module, keras_model, [tokens(*shape)])
+
+
+def test_tied_functional_head():
+    module = FunctionalTiedHead().eval()
+    x = tokens(3, 5)
+    keras_model, log = convert(module, [x])
+    assert_same_outputs(module, keras_model, [x])
+    assert 'head_weight = embedding.weight -> tied_head_weight shared by 2 ops' in log
+    assert num_variable_elements(keras_model) == sum(p.numel() for p in module.parameters())
+
+
+@pytest.mark.parametrize('fold_batch_norm', [False, True])
+def test_shared_batch_norm_weight_not_bound(fold_batch_norm):
+    module = SharedBatchNormWeight().eval()
+    x = torch.randn(2, 8, 5, 5)
+    keras_model, log = convert(module, [x], fold_batch_norm=fold_batch_norm)
+    assert_same_outputs(module, keras_model, [x])
+    assert 'bn1.weight = bn2.weight -> not shared' in log
+
+
+def test_identical_parameters_not_bound():
+    module = IdenticalUntied().eval()
+    x = torch.randn(3, 8)
+    keras_model, log = convert(module, [x])
+    assert_same_outputs(module, keras_model, [x])
+    assert 'Tied parameters' not in log
+    assert len({id(w) for w in keras_model.weights}) == 4